@@ -0,0 +1,405 @@
+"""Vectorized versions of the intersection tests in shapes.py.
+
+Every function here takes shapes as plain NumPy arrays (a "struct of arrays")
+instead of Python objects and returns one result per pair: a boolean mask for
+the *_intersect tests, and coordinates for the *_intersection functions.
+Points are arrays whose last axis holds the x- and y-coordinates, so a batch of
+n points has the shape (n, 2). The usual NumPy broadcasting rules apply: to
+test every shape in one batch against every shape in another, add an axis to
+one side, e.g. circle_circle_intersect(c1[:, None], r1[:, None], c2, r2).
+
+The arithmetic deliberately follows the scalar functions step by step, so that
+a batch call gives the same answers as calling the scalar function on each
+pair in turn.
+
+Points in polar coordinates are kept as two arrays, r and theta, and can be
+converted either way in bulk. The polar tests at the end are batch versions
+of those in polar.py."""
+from array import array
+
+import numpy as np
+
+INF = float('inf')
+
+
+def pack_points(points):
+    """ Returns an (n, 2) array of the x, y coordinates of the given Point
+    objects """
+    return np.array([p.cartesian_pair() for p in points], dtype=float).reshape(-1, 2)
+
+def pack_lines(lines):
+    """ Returns the (points, slopes) arrays describing the given Line objects.
+    Each line is represented by one point on it and its slope, exactly like
+    the Line class itself."""
+    points = np.array([(l.x, l.y) for l in lines], dtype=float).reshape(-1, 2)
+    slopes = np.array([l.slope for l in lines], dtype=float)
+    return points, slopes
+
+def pack_circles(circles):
+    """ Returns the (centers, radii) arrays describing the given Circle
+    objects """
+    centers = pack_points([c.center for c in circles])
+    radii = np.array([c.radius for c in circles], dtype=float)
+    return centers, radii
+
+def pack_segments(segments):
+    """ Returns the (starts, ends) arrays holding the endpoints of the given
+    LineSegment objects """
+    starts = pack_points([s.endpoint1 for s in segments])
+    ends = pack_points([s.endpoint2 for s in segments])
+    return starts, ends
+
+def pack_polar_points(points):
+    """ Returns the (r, theta) arrays of the polar coordinates of the given
+    Point objects """
+    pairs = np.array([p.polar_pair() for p in points], dtype=float).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+def polar_to_cartesian(r, theta):
+    """ Returns an (n, 2) array of the x, y coordinates of points given in
+    polar coordinates """
+    r = np.asarray(r, dtype=float)
+    theta = np.asarray(theta, dtype=float)
+    return np.stack((r * np.cos(theta), r * np.sin(theta)), axis=-1)
+
+def cartesian_to_polar(points):
+    """ Returns the (r, theta) arrays of the polar coordinates of an (n, 2)
+    array of points """
+    points = np.asarray(points, dtype=float)
+    x, y = points[..., 0], points[..., 1]
+    return np.sqrt(x**2 + y**2), np.arctan2(y, x)
+
+def pack_polygons(polygons):
+    """ Returns (coords, offsets) for the given Polygon objects: an (n, 2)
+    array of all their vertices one polygon after another, and an array of
+    len(polygons) + 1 indices into it, so that the vertices of polygon i are
+    coords[offsets[i]:offsets[i + 1]] """
+    offsets = np.zeros(len(polygons) + 1, dtype=np.intp)
+    offsets[1:] = np.cumsum([len(p.vertices) for p in polygons])
+    # Polygons already keep their coordinates in a flat array of doubles
+    coords = array('d')
+    for p in polygons:
+        coords.extend(p.coords)
+    return np.frombuffer(coords, dtype=float).reshape(-1, 2), offsets
+
+
+def segment_slopes(starts, ends):
+    """ Returns the slope of each segment, using float('inf') for vertical
+    segments just like LineSegment does """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    dx = ends[..., 0] - starts[..., 0]
+    dy = ends[..., 1] - starts[..., 1]
+    vertical = dx == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = dy / np.where(vertical, 1.0, dx)
+    return np.where(vertical, INF, slopes)
+
+def line_line_intersection(points1, slopes1, points2, slopes2):
+    """ Returns an array of the points where each pair of lines intersect.
+    Pairs of parallel lines, which never intersect, get NaN coordinates."""
+    points1 = np.asarray(points1, dtype=float)
+    points2 = np.asarray(points2, dtype=float)
+    slopes1 = np.asarray(slopes1, dtype=float)
+    slopes2 = np.asarray(slopes2, dtype=float)
+    x1, y1 = points1[..., 0], points1[..., 1]
+    x2, y2 = points2[..., 0], points2[..., 1]
+
+    vertical1 = slopes1 == INF
+    vertical2 = slopes2 == INF
+    # Swap in a harmless slope for vertical lines so the general case does
+    # not produce warnings; those entries are replaced below anyway
+    a = np.where(vertical1, 0.0, slopes1)
+    b = np.where(vertical2, 0.0, slopes2)
+    c = a * (0 - x1) + y1
+    d = b * (0 - x2) + y2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (d - c) / (a - b)
+        y = a * x + c
+    # If either line is vertical, simply find the value of y on the other
+    x = np.where(vertical1, x1, np.where(vertical2, x2, x))
+    y = np.where(vertical1, b * (x1 - x2) + y2,
+                 np.where(vertical2, a * (x2 - x1) + y1, y))
+
+    parallel = slopes1 == slopes2
+    x = np.where(parallel, np.nan, x)
+    y = np.where(parallel, np.nan, y)
+    return np.stack([x, y], axis=-1)
+
+def point_between_endpoints(points, starts, ends):
+    """ Batch version of LineSegment.point_between_endpoints. Points with NaN
+    coordinates are never between the endpoints."""
+    points = np.asarray(points, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    px, py = points[..., 0], points[..., 1]
+    x1, y1 = starts[..., 0], starts[..., 1]
+    x2, y2 = ends[..., 0], ends[..., 1]
+
+    in_y = (py >= np.minimum(y1, y2)) & (py <= np.maximum(y1, y2))
+    in_x = (px >= np.minimum(x1, x2)) & (px <= np.maximum(x1, x2))
+    # Vertical segments only check the y range
+    return np.where(x1 == x2, in_y, in_x & in_y)
+
+def points_in_circles(points, centers, radii):
+    """ Batch version of Circle.point_in_circle """
+    points = np.asarray(points, dtype=float)
+    centers = np.asarray(centers, dtype=float)
+    dx = points[..., 0] - centers[..., 0]
+    dy = points[..., 1] - centers[..., 1]
+    return np.sqrt(dx**2 + dy**2) <= np.asarray(radii, dtype=float)
+
+
+def line_line_intersect(slopes1, slopes2):
+    """ Returns whether each pair of lines intersect. As with the scalar
+    version, only the slopes matter: lines intersect unless parallel."""
+    return np.asarray(slopes1, dtype=float) != np.asarray(slopes2, dtype=float)
+
+def line_linesegment_intersect(points, slopes, starts, ends):
+    """ Returns whether each line intersects the corresponding segment """
+    segment_points = np.asarray(starts, dtype=float)
+    inter = line_line_intersection(points, slopes, segment_points,
+                                   segment_slopes(starts, ends))
+    return point_between_endpoints(inter, starts, ends)
+
+def line_circle_intersect(points, slopes, centers, radii):
+    """ Returns whether each line intersects the corresponding circle, using
+    the same discriminant test as the scalar version """
+    points = np.asarray(points, dtype=float)
+    slopes = np.asarray(slopes, dtype=float)
+    centers = np.asarray(centers, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    x, y = points[..., 0], points[..., 1]
+    cx, cy = centers[..., 0], centers[..., 1]
+
+    vertical = slopes == INF
+    m = np.where(vertical, 0.0, slopes)
+    new_x = x + 1
+    new_y = m * (new_x - x) + y
+    dx = x - new_x
+    dy = y - new_y
+    dr = np.sqrt(dx**2 + dy**2)
+    D = (new_x - cx) * (y - cy) - (x - cx) * (new_y - cy)
+    discriminant = radii**2 * dr**2 - D**2
+
+    return np.where(vertical, np.abs(x - cx) <= radii, discriminant >= 0)
+
+def circle_circle_intersect(centers1, radii1, centers2, radii2):
+    """ Returns whether each pair of circles intersect, i.e. whether the
+    distance between their centers is at most the sum of their radii """
+    centers1 = np.asarray(centers1, dtype=float)
+    centers2 = np.asarray(centers2, dtype=float)
+    dx = centers1[..., 0] - centers2[..., 0]
+    dy = centers1[..., 1] - centers2[..., 1]
+    return np.sqrt(dx**2 + dy**2) <= np.asarray(radii1, dtype=float) + \
+            np.asarray(radii2, dtype=float)
+
+def circle_linesegment_intersect(centers, radii, starts, ends):
+    """ Returns whether each segment intersects the corresponding circle.
+    Like the scalar version, this finds where the line through the segment
+    meets the perpendicular through the center, the nearest point of the line
+    to the center. The segment intersects the circle if that point is in the
+    circle and on the segment, or if either endpoint is in the circle."""
+    centers = np.asarray(centers, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    slopes = segment_slopes(starts, ends)
+    with np.errstate(divide='ignore'):
+        perpendicular = np.where(slopes == 0, INF, -1 / slopes)
+    nearest = line_line_intersection(starts, slopes, centers, perpendicular)
+    return points_in_circles(nearest, centers, radii) & \
+            (point_between_endpoints(nearest, starts, ends) |
+             points_in_circles(starts, centers, radii) |
+             points_in_circles(ends, centers, radii))
+
+def linesegment_linesegment_intersect(starts1, ends1, starts2, ends2):
+    """ Returns whether each pair of segments intersect """
+    starts1 = np.asarray(starts1, dtype=float)
+    starts2 = np.asarray(starts2, dtype=float)
+    inter = line_line_intersection(starts1, segment_slopes(starts1, ends1),
+                                   starts2, segment_slopes(starts2, ends2))
+    return point_between_endpoints(inter, starts1, ends1) & \
+            point_between_endpoints(inter, starts2, ends2)
+
+
+# Batch versions of the *_intersection functions, which return where shapes
+# meet rather than whether they do. Pairs that meet at a single point give a
+# (..., 2) array of coordinates with NaN where there is no point. Pairs that
+# can meet at up to two points give a (points, counts) tuple: points has the
+# shape (..., 2, 2), holding the first and second point of each pair with
+# NaN for the ones that are missing, and counts says how many there are.
+
+def _two_points(x1, y1, x2, y2, counts):
+    """ Stacks two sets of coordinates into a (..., 2, 2) array, blanking
+    out the points beyond each pair's count """
+    first = np.stack([x1, y1], axis=-1)
+    second = np.stack([x2, y2], axis=-1)
+    first = np.where((counts >= 1)[..., None], first, np.nan)
+    second = np.where((counts >= 2)[..., None], second, np.nan)
+    return np.stack([first, second], axis=-2)
+
+def linesegment_linesegment_intersection(starts1, ends1, starts2, ends2):
+    """ Returns the point where each pair of segments cross, NaN if they
+    don't """
+    starts1 = np.asarray(starts1, dtype=float)
+    starts2 = np.asarray(starts2, dtype=float)
+    inter = line_line_intersection(starts1, segment_slopes(starts1, ends1),
+                                   starts2, segment_slopes(starts2, ends2))
+    hit = point_between_endpoints(inter, starts1, ends1) & \
+            point_between_endpoints(inter, starts2, ends2)
+    return np.where(hit[..., None], inter, np.nan)
+
+def line_circle_intersection(points, slopes, centers, radii):
+    """ Returns (points, counts) for where each line crosses the outline of
+    the corresponding circle """
+    points = np.asarray(points, dtype=float)
+    slopes = np.asarray(slopes, dtype=float)
+    centers = np.asarray(centers, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    x, y = points[..., 0], points[..., 1]
+    cx, cy = centers[..., 0], centers[..., 1]
+
+    vertical = slopes == INF
+    m = np.where(vertical, 0.0, slopes)
+    norm = np.sqrt(1 + m**2)
+    dx = np.where(vertical, 0.0, 1 / norm)
+    dy = np.where(vertical, 1.0, m / norm)
+    # The point on the line nearest the center, and from there the distance
+    # along the line to where it meets the circle
+    t = (cx - x) * dx + (cy - y) * dy
+    fx, fy = x + t * dx, y + t * dy
+    h2 = radii**2 - ((cx - fx)**2 + (cy - fy)**2)
+    counts = np.where(h2 < 0, 0, np.where(h2 == 0, 1, 2))
+    h = np.sqrt(np.maximum(h2, 0.0))
+    return (_two_points(fx - h * dx, fy - h * dy, fx + h * dx, fy + h * dy, counts),
+            counts)
+
+def circle_linesegment_intersection(centers, radii, starts, ends):
+    """ Returns (points, counts) for where each segment crosses the outline
+    of the corresponding circle """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    both, counts = line_circle_intersection(starts, segment_slopes(starts, ends),
+                                            centers, radii)
+    first, second = both[..., 0, :], both[..., 1, :]
+    keep_first = point_between_endpoints(first, starts, ends)
+    keep_second = point_between_endpoints(second, starts, ends)
+    # Move the second point forward when the first one is off the segment
+    first = np.where(keep_first[..., None], first, second)
+    counts = keep_first.astype(int) + keep_second.astype(int)
+    return (_two_points(first[..., 0], first[..., 1],
+                        second[..., 0], second[..., 1], counts),
+            counts)
+
+def circle_circle_intersection(centers1, radii1, centers2, radii2):
+    """ Returns (points, counts) for where the outlines of each pair of
+    circles cross """
+    centers1 = np.asarray(centers1, dtype=float)
+    centers2 = np.asarray(centers2, dtype=float)
+    r1 = np.asarray(radii1, dtype=float)
+    r2 = np.asarray(radii2, dtype=float)
+    x1, y1 = centers1[..., 0], centers1[..., 1]
+    x2, y2 = centers2[..., 0], centers2[..., 1]
+
+    d = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    apart = (d == 0) | (d > r1 + r2) | (d < np.abs(r1 - r2))
+    safe_d = np.where(d == 0, 1.0, d)
+    # a is the distance from the first center to the chord joining the two
+    # points, and h is half the length of that chord
+    a = (r1**2 - r2**2 + d**2) / (2 * safe_d)
+    h = np.sqrt(np.maximum(r1**2 - a**2, 0.0))
+    ux, uy = (x2 - x1) / safe_d, (y2 - y1) / safe_d
+    mx, my = x1 + a * ux, y1 + a * uy
+    counts = np.where(apart, 0, np.where(h == 0, 1, 2))
+    return (_two_points(mx - h * uy, my + h * ux, mx + h * uy, my - h * ux, counts),
+            counts)
+
+
+def polar_distance(r1, theta1, r2, theta2):
+    """ Batch version of polar.polar_distance """
+    r1 = np.asarray(r1, dtype=float)
+    r2 = np.asarray(r2, dtype=float)
+    squared = r1 * r1 + r2 * r2 - 2 * r1 * r2 * np.cos(
+        np.asarray(theta1, dtype=float) - np.asarray(theta2, dtype=float))
+    return np.sqrt(np.maximum(squared, 0.0))
+
+def points_in_sectors(r, theta, starts, ends, r_min=0.0, r_max=INF):
+    """ Batch version of polar.in_sector """
+    r = np.asarray(r, dtype=float)
+    theta = np.asarray(theta, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    # Negative ranges point the opposite way
+    theta = np.where(r < 0, theta + np.pi, theta)
+    r = np.abs(r)
+    tau = 2 * np.pi
+    in_angle = (ends - starts >= tau) | \
+            (np.mod(theta - starts, tau) <= np.mod(ends - starts, tau))
+    return (r >= r_min) & (r <= r_max) & ((r == 0) | in_angle)
+
+
+# Metrics of many polygons at once, packed by pack_polygons. Each vertex is
+# paired with the one after it in its own polygon, the last one wrapping round
+# to the first, and the terms for each edge are summed per polygon.
+
+def _polygon_edges(coords, offsets):
+    """ Returns the polygon each vertex belongs to, and the coordinates of
+    each vertex and of the one after it """
+    coords = np.asarray(coords, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    following = np.arange(1, len(coords) + 1)
+    ends = offsets[1:][counts > 0]
+    following[ends - 1] = offsets[:-1][counts > 0]
+    return owner, coords, coords[following]
+
+def _sums(owner, values, size):
+    return np.bincount(owner, weights=values, minlength=size)
+
+def _perimeters(owner, start, end, size):
+    lengths = np.sqrt((end[:, 0] - start[:, 0])**2 + (end[:, 1] - start[:, 1])**2)
+    return _sums(owner, lengths, size)
+
+def _signed_areas(owner, start, end, size):
+    cross = start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]
+    return cross, _sums(owner, cross, size) / 2
+
+def _centroids(owner, start, end, size, cross, areas):
+    counts = np.bincount(owner, minlength=size)
+    flat = areas == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cx = _sums(owner, (start[:, 0] + end[:, 0]) * cross, size) / (6 * areas)
+        cy = _sums(owner, (start[:, 1] + end[:, 1]) * cross, size) / (6 * areas)
+        # Polygons without area fall back to the mean of their vertices
+        mx = _sums(owner, start[:, 0], size) / counts
+        my = _sums(owner, start[:, 1], size) / counts
+    return np.stack((np.where(flat, mx, cx), np.where(flat, my, cy)), axis=-1)
+
+def polygon_perimeters(coords, offsets):
+    """ Batch version of Polygon.perimeter """
+    owner, start, end = _polygon_edges(coords, offsets)
+    return _perimeters(owner, start, end, len(offsets) - 1)
+
+def polygon_areas(coords, offsets):
+    """ Batch version of Polygon.area """
+    owner, start, end = _polygon_edges(coords, offsets)
+    return np.abs(_signed_areas(owner, start, end, len(offsets) - 1)[1])
+
+def polygon_centroids(coords, offsets):
+    """ Batch version of Polygon.centroid, returning an (n, 2) array. The
+    centroid of a polygon without vertices is NaN. """
+    size = len(offsets) - 1
+    owner, start, end = _polygon_edges(coords, offsets)
+    cross, areas = _signed_areas(owner, start, end, size)
+    return _centroids(owner, start, end, size, cross, areas)
+
+def polygon_metrics(coords, offsets):
+    """ Returns (perimeters, areas, centroids), working out the edges of every
+    polygon only once """
+    size = len(offsets) - 1
+    owner, start, end = _polygon_edges(coords, offsets)
+    cross, areas = _signed_areas(owner, start, end, size)
+    return (_perimeters(owner, start, end, size), np.abs(areas),
+            _centroids(owner, start, end, size, cross, areas))
@@ -0,0 +1,915 @@
+"""Benchmarks for shapes.py and the modules built on it.
+
+The suite times every public function in shapes.py, plus the methods the
+intersection tests lean on, over seeded random shapes at several sizes, and
+can save the timings as JSON. A saved run can be compared with a later one to
+catch regressions:
+
+    python benchmarks.py run --output before.json
+    ... change something ...
+    python benchmarks.py run --output after.json
+    python benchmarks.py compare before.json after.json
+
+compare exits with status 1 if any benchmark got slower by more than the
+threshold (10% by default). Timings are the best of several repeats, but
+they are still wall-clock times: compare runs made on the same quiet machine.
+
+    python benchmarks.py load-test
+
+runs many concurrent clients against a service.IntersectionService and
+reports its throughput and latency next to calling intersect() on the event
+loop directly. Options set the number of clients, queries and the batching
+limits.
+
+    python benchmarks.py report
+
+prints the older side-by-side comparisons: the scalar intersection tests in
+shapes.py with the vectorized versions in batch.py, the sweep line in
+sweep.py with testing every pair of edges, the memory used by the compact
+point classes with the __dict__-based ones they replaced, the process pool
+in parallel.py with a single process, opening a memory-mapped shape file,
+the dispatch table behind intersect() with the isinstance chains it
+replaced, the point locator in locate.py with point_in_polygon, ticking
+a Scene with rebuilding a ShapeIndex every tick, repeated queries with
+and without a memo.PairCache, the fast paths for convex polygons with
+the general tests, testing huge polygons through their simplify.Pyramid
+with polygon_polygon_intersect, the polar tests in polar.py with
+converting every point to x and y, the bulk polygon metrics in batch.py
+with the Polygon methods, and nearest-neighbour queries on a
+nearest.NearestIndex with scanning every shape."""
+import argparse
+import asyncio
+import inspect
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import shapes
+import batch
+import parallel
+import polar
+import robust
+from service import IntersectionService
+import storage
+import sweep
+from index import ShapeIndex
+from locate import PolygonLocator
+from memo import PairCache
+from nearest import NearestIndex
+from scene import Scene, translated
+import simplify
+
+
+def random_point(rng, extent=100.0):
+    return shapes.Cartesian(rng.uniform(-extent, extent),
+                            rng.uniform(-extent, extent))
+
+def random_lines(rng, n):
+    lines = []
+    for i in range(n):
+        if rng.random() < 0.1:
+            lines.append(shapes.LineBySlope(random_point(rng), float('inf')))
+        else:
+            lines.append(shapes.LineBySlope(random_point(rng),
+                                            math.tan(rng.uniform(-1.5, 1.5))))
+    return lines
+
+def random_circles(rng, n, max_radius=5.0):
+    return [shapes.Circle(random_point(rng), rng.uniform(0.1, max_radius))
+            for i in range(n)]
+
+def random_segments(rng, n, max_length=10.0):
+    segments = []
+    for i in range(n):
+        p = random_point(rng)
+        q = shapes.Cartesian(p.x + rng.uniform(-max_length, max_length),
+                             p.y + rng.uniform(-max_length, max_length))
+        segments.append(shapes.LineSegment(p, q))
+    return segments
+
+def random_star_polygon(rng, n, cx=0.0, cy=0.0, radius=10.0):
+    """ Returns a simple polygon with n vertices around (cx, cy) """
+    angles = sorted(rng.uniform(0, 2 * math.pi) for i in range(n))
+    vertices = []
+    for angle in angles:
+        r = radius * rng.uniform(0.5, 1)
+        vertices.append(shapes.Cartesian(cx + r * math.cos(angle),
+                                         cy + r * math.sin(angle)))
+    return shapes.Polygon(*vertices)
+
+def random_polygons(rng, n, vertices=8, max_radius=10.0):
+    polygons = []
+    for i in range(n):
+        center = random_point(rng)
+        polygons.append(random_star_polygon(rng, vertices, center.x, center.y,
+                                            rng.uniform(1.0, max_radius)))
+    return polygons
+
+GENERATORS = {
+    'line': random_lines,
+    'linesegment': random_segments,
+    'circle': random_circles,
+    'polygon': random_polygons,
+}
+
+def random_points(rng, n):
+    return [random_point(rng) for i in range(n)]
+
+def random_shapes(rng, n):
+    """ Returns n shapes of every kind, in turn """
+    kinds = sorted(GENERATORS)
+    return [GENERATORS[kinds[i % len(kinds)]](rng, 1)[0] for i in range(n)]
+
+
+def timed(func, *args, **kwargs):
+    """ Returns the best of repeat (by default three) wall-clock timings of
+    func(*args) """
+    repeat = kwargs.pop('repeat', 3)
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def compare(name, scalar, vectorized, n):
+    scalar_time = timed(scalar)
+    vector_time = timed(vectorized)
+    print("{0:<36} n={1:<8} scalar={2:9.4f}s  batch={3:9.4f}s  x{4:.1f}".format(
+        name, n, scalar_time, vector_time, scalar_time / vector_time))
+
+
+def bench_circle_circle(rng, n):
+    a = random_circles(rng, n)
+    b = random_circles(rng, n)
+    centers1, radii1 = batch.pack_circles(a)
+    centers2, radii2 = batch.pack_circles(b)
+    compare("circle_circle_intersect",
+            lambda: [shapes.circle_circle_intersect(c1, c2)
+                     for c1, c2 in zip(a, b)],
+            lambda: batch.circle_circle_intersect(centers1, radii1,
+                                                  centers2, radii2),
+            n)
+
+def bench_linesegment_linesegment(rng, n):
+    a = random_segments(rng, n)
+    b = random_segments(rng, n)
+    starts1, ends1 = batch.pack_segments(a)
+    starts2, ends2 = batch.pack_segments(b)
+    compare("linesegment_linesegment_intersect",
+            lambda: [shapes.linesegment_linesegment_intersect(s1, s2)
+                     for s1, s2 in zip(a, b)],
+            lambda: batch.linesegment_linesegment_intersect(starts1, ends1,
+                                                            starts2, ends2),
+            n)
+
+def bench_line_circle(rng, n):
+    lines = random_segments(rng, n)
+    circles = random_circles(rng, n)
+    points, slopes = batch.pack_lines(lines)
+    centers, radii = batch.pack_circles(circles)
+    compare("line_circle_intersect",
+            lambda: [shapes.line_circle_intersect(l, c)
+                     for l, c in zip(lines, circles)],
+            lambda: batch.line_circle_intersect(points, slopes, centers, radii),
+            n)
+
+def bench_circle_linesegment(rng, n):
+    circles = random_circles(rng, n)
+    segments = random_segments(rng, n)
+    centers, radii = batch.pack_circles(circles)
+    starts, ends = batch.pack_segments(segments)
+    compare("circle_linesegment_intersect",
+            lambda: [shapes.circle_linesegment_intersect(c, s)
+                     for c, s in zip(circles, segments)],
+            lambda: batch.circle_linesegment_intersect(centers, radii, starts, ends),
+            n)
+
+def bench_polygon_polygon_sweep(rng, n):
+    # Disjoint polygons are the worst case for testing every pair of edges
+    poly1 = random_star_polygon(rng, n, 0, 0)
+    poly2 = random_star_polygon(rng, n, 25, 0)
+    edges1, edges2 = poly1.edges(), poly2.edges()
+    def nested_loops():
+        for edge1 in edges1:
+            for edge2 in edges2:
+                if shapes.linesegment_linesegment_intersect(edge1, edge2):
+                    return True
+        return False
+    # The first call also checks that both polygons are simple, which is
+    # cached for the calls after it
+    first = timed(shapes.polygon_polygon_intersect, poly1, poly2, repeat=1)
+    print("{0:<36} n={1:<8} nested={2:9.4f}s  sweep={3:9.4f}s  first={4:9.4f}s".format(
+        "polygon_polygon_intersect", n, timed(nested_loops),
+        timed(shapes.polygon_polygon_intersect, poly1, poly2), first))
+
+
+class DictCartesian(object):
+    """ Cartesian as it was before points used __slots__ """
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+    x = property(lambda self: self._x)
+    y = property(lambda self: self._y)
+
+class DictPolar(object):
+    """ Polar as it was before points used __slots__ and cached x and y """
+    def __init__(self, r, theta):
+        self._r = r
+        self._theta = theta
+    r = property(lambda self: self._r)
+    theta = property(lambda self: self._theta)
+    x = property(lambda self: self.r * math.cos(self.theta))
+    y = property(lambda self: self.r * math.sin(self.theta))
+
+def allocated(factory, n):
+    """ Returns the number of bytes allocated while creating n objects """
+    tracemalloc.start()
+    objects = [factory(i, i) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size
+
+def bench_point_memory(n):
+    def read_all(points):
+        total = 0.0
+        for i in range(5):
+            for p in points:
+                total += p.x + p.y
+        return total
+    for name, old, new in (("Cartesian", DictCartesian, shapes.Cartesian),
+                           ("Polar", DictPolar, shapes.Polar)):
+        old_points = [old(i, i) for i in range(n)]
+        new_points = [new(i, i) for i in range(n)]
+        print("{0:<36} n={1:<8} dict={2:7.1f}MB  slots={3:7.1f}MB  "
+              "read x5: dict={4:7.4f}s  slots={5:7.4f}s".format(
+            name, n, allocated(old, n) / 1e6, allocated(new, n) / 1e6,
+            timed(read_all, old_points), timed(read_all, new_points)))
+
+def bench_parallel(rng, n, workers=None):
+    workers = workers or os.cpu_count()
+    scene = random_circles(rng, n // 2) + random_segments(rng, n // 2)
+    print("{0:<36} n={1:<8} one process={2:9.4f}s  {3} workers={4:9.4f}s".format(
+        "parallel.intersecting_pairs", n,
+        timed(lambda: ShapeIndex(scene).pairs()), workers,
+        timed(lambda: parallel.intersecting_pairs(scene, workers=workers,
+                                                  chunk_size=2000))))
+
+def bench_storage(rng, n):
+    scene = random_circles(rng, n)
+    with tempfile.NamedTemporaryFile(suffix='.shapes') as f:
+        storage.write_shapes(f.name, scene)
+        size = os.path.getsize(f.name)
+        def open_and_read():
+            shape_file = storage.ShapeFile(f.name)
+            shape_file[n // 2]
+            shape_file.close()
+        print("{0:<36} n={1:<8} {2:7.1f}MB file opened in {3:9.6f}s".format(
+            "storage.ShapeFile", n, size / 1e6, timed(open_and_read)))
+
+def isinstance_dispatch(shape1, shape2):
+    """ How Polygon.intersect picked its function before the dispatch table """
+    if isinstance(shape2, shapes.LineSegment):
+        return shapes.linesegment_polygon_intersect
+    elif isinstance(shape2, shapes.Line):
+        return shapes.line_polygon_intersect
+    elif isinstance(shape2, shapes.Circle):
+        return shapes.circle_polygon_intersect
+    elif isinstance(shape2, shapes.Polygon):
+        return shapes.polygon_polygon_intersect
+
+def table_dispatch(shape1, shape2):
+    return shapes._intersect_cache[(type(shape1), type(shape2))]
+
+def bench_dispatch(rng, n):
+    polygon = random_star_polygon(rng, 4)
+    others = [polygon] * n
+    shapes.intersect_function(shapes.Polygon, shapes.Polygon)
+    def run(dispatch):
+        for other in others:
+            dispatch(polygon, other)
+    print("{0:<36} n={1:<8} isinstance={2:9.4f}s  table={3:9.4f}s".format(
+        "dispatch Polygon-Polygon", n, timed(run, isinstance_dispatch),
+        timed(run, table_dispatch)))
+
+def bench_point_in_polygon(rng, vertices, n, spiky=False):
+    if spiky:
+        # Long spikes, the worst case for the locator's bands
+        polygon = shapes.Polygon(*[shapes.Polar(10.0 if i % 2 else 0.5,
+                                                2 * math.pi * i / vertices)
+                                   for i in range(vertices)])
+    else:
+        polygon = random_star_polygon(rng, vertices)
+    points = [random_point(rng, 12.0) for i in range(n)]
+    def scalar():
+        return [shapes.point_in_polygon(p, polygon) for p in points]
+    def located():
+        return PolygonLocator(polygon).contains_many(points)
+    print("{0:<36} n={1:<8} scalar={2:9.4f}s  locator={3:9.4f}s".format(
+        "point_in_polygon ({0} {1})".format(vertices, "spiky" if spiky else "vertices"),
+        n, timed(scalar), timed(located)))
+
+def bench_scene(rng, n, moving, ticks=10):
+    shapes_ = random_circles(rng, n // 2) + random_segments(rng, n - n // 2)
+    moves = [[(rng.randrange(n), rng.uniform(-1, 1), rng.uniform(-1, 1))
+              for i in range(moving)] for t in range(ticks)]
+    def rebuild():
+        current = list(shapes_)
+        for tick in moves:
+            for key, dx, dy in tick:
+                current[key] = translated(current[key], dx, dy)
+            ShapeIndex(current).pairs()
+    def incremental():
+        scene = Scene(shapes_)
+        scene.tick()
+        for tick in moves:
+            for key, dx, dy in tick:
+                scene.move(key, dx, dy)
+            scene.tick()
+    print("{0:<36} n={1:<8} rebuild={2:9.4f}s  scene={3:9.4f}s".format(
+        "scene, {0} moving per tick".format(moving), n,
+        timed(rebuild), timed(incremental)))
+
+def bench_memo(rng, n, distinct):
+    polygons = random_polygons(rng, distinct, vertices=16, max_radius=50.0)
+    queries = [(rng.choice(polygons), rng.choice(polygons)) for i in range(n)]
+    def uncached():
+        return [shapes.intersect(a, b) for a, b in queries]
+    def cached():
+        cache = PairCache(shapes.intersect)
+        return [cache(a, b) for a, b in queries]
+    print("{0:<36} n={1:<8} uncached={2:9.4f}s  cached={3:9.4f}s".format(
+        "PairCache, {0} distinct polygons".format(distinct), n,
+        timed(uncached), timed(cached)))
+
+def random_convex_polygon(rng, n, cx=0.0, cy=0.0, radius=10.0):
+    """ Returns a convex polygon with n vertices on a circle around (cx, cy) """
+    angles = sorted(rng.uniform(0, 2 * math.pi) for i in range(n))
+    return shapes.Polygon(*[shapes.Cartesian(cx + radius * math.cos(a),
+                                             cy + radius * math.sin(a))
+                            for a in angles])
+
+def bench_convex(rng, n, pairs=200):
+    polygons = [random_convex_polygon(rng, n, rng.uniform(-30, 30),
+                                      rng.uniform(-30, 30)) for i in range(pairs + 1)]
+    def general():
+        # What polygon_polygon_intersect does for polygons that aren't convex
+        for poly1, poly2 in zip(polygons, polygons[1:]):
+            if n * n > shapes.SWEEP_THRESHOLD:
+                sweep.segments_intersect(poly1.edges(), poly2.edges())
+            else:
+                any(shapes.linesegment_linesegment_intersect(e1, e2)
+                    for e1 in poly1.edges() for e2 in poly2.edges())
+    def convex():
+        for poly1, poly2 in zip(polygons, polygons[1:]):
+            shapes.polygon_polygon_intersect(poly1, poly2)
+    for polygon in polygons:
+        polygon.edges()
+        polygon.is_convex()
+    print("{0:<36} n={1:<8} general={2:9.4f}s  convex={3:9.4f}s".format(
+        "polygon_polygon_intersect, convex", n, timed(general), timed(convex)))
+
+    points = [random_point(rng, 12.0) for i in range(10000)]
+    polygon = random_convex_polygon(rng, n)
+    coords = polygon.coords
+    print("{0:<36} n={1:<8} general={2:9.4f}s  convex={3:9.4f}s".format(
+        "point_in_polygon, convex", n,
+        timed(lambda: [shapes.xy_in_polygon(p.x, p.y, coords) for p in points]),
+        timed(lambda: [shapes.point_in_polygon(p, polygon) for p in points])))
+
+    circles = [shapes.Circle(p, 2.0) for p in points[:2000]]
+    edges = polygon.edges()
+    print("{0:<36} n={1:<8} general={2:9.4f}s  convex={3:9.4f}s".format(
+        "circle_polygon_intersect, convex", n,
+        timed(lambda: [any(shapes.circle_linesegment_intersect(c, e) for e in edges)
+                       for c in circles]),
+        timed(lambda: [shapes.circle_polygon_intersect(c, polygon) for c in circles])))
+
+def bench_simplify(rng, n, pairs=10):
+    polygons = [random_star_polygon(rng, n, rng.uniform(-15, 15), 0.0)
+                for i in range(pairs + 1)]
+    build = timed(lambda: [simplify.Pyramid(p) for p in polygons], repeat=1)
+    for polygon in polygons:
+        polygon.edges()
+        simplify.pyramid(polygon)
+    def direct():
+        for poly1, poly2 in zip(polygons, polygons[1:]):
+            shapes.polygon_polygon_intersect(poly1, poly2)
+    def pyramids():
+        for poly1, poly2 in zip(polygons, polygons[1:]):
+            simplify.polygons_intersect(poly1, poly2)
+    print("{0:<36} n={1:<8} direct={2:9.4f}s  pyramid={3:9.4f}s  build={4:9.4f}s".format(
+        "polygon_polygon_intersect, LOD", n, timed(direct), timed(pyramids), build))
+
+def bench_polar(rng, n):
+    coords = [(rng.uniform(0, 100), rng.uniform(-math.pi, math.pi))
+              for i in range(n)]
+    circle = shapes.Circle(shapes.Cartesian(30.0, 40.0), 20.0)
+    # Fresh points every time, as they would arrive from a sensor
+    def cartesian():
+        return [circle.point_in_circle(shapes.Polar(r, theta)) for r, theta in coords]
+    def native():
+        return [polar.in_circle(shapes.Polar(r, theta), circle) for r, theta in coords]
+    print("{0:<36} n={1:<8} cartesian={2:9.4f}s  polar={3:9.4f}s".format(
+        "point in circle, polar points", n, timed(cartesian), timed(native)))
+    r = [c[0] for c in coords]
+    theta = [c[1] for c in coords]
+    print("{0:<36} n={1:<8} scalar={2:9.4f}s  batch={3:9.4f}s".format(
+        "polar to cartesian", n,
+        timed(lambda: [shapes.Polar(*c).cartesian_pair() for c in coords]),
+        timed(batch.polar_to_cartesian, r, theta)))
+
+def bench_metrics(rng, n):
+    polygons = random_polygons(rng, n, vertices=16)
+    def scalar():
+        return [(p.perimeter(), p.area(), p.centroid()) for p in polygons]
+    def vectorized():
+        return batch.polygon_metrics(*batch.pack_polygons(polygons))
+    compare("perimeter, area, centroid", scalar, vectorized, n)
+
+def _bounded_shapes(rng, n):
+    """ Returns n shapes of every kind but lines, which an index can't prune """
+    return [shape for shape in random_shapes(rng, n * 4 // 3 + 4)
+            if not isinstance(shape, shapes.LineBySlope)][:n]
+
+def bench_nearest(rng, n, queries=100):
+    items = _bounded_shapes(rng, n)
+    points = random_points(rng, queries)
+    start = time.perf_counter()
+    index = NearestIndex(items)
+    build = time.perf_counter() - start
+    def scan():
+        return [min((shapes.distance(p, s), i) for i, s in enumerate(items))
+                for p in points]
+    def indexed():
+        return [index.nearest(p) for p in points]
+    print("{0:<36} n={1:<8} scan={2:9.4f}s  index={3:9.4f}s  build={4:9.4f}s".format(
+        "nearest shape, {0} queries".format(queries), n, timed(scan, repeat=1),
+        timed(indexed), build))
+
+
+# The suite. Each benchmark is a setup function taking (rng, n): it builds
+# its inputs and returns a function that does n operations, which is what
+# gets timed.
+
+BENCHMARKS = {}
+
+# Functions in shapes.py that only change the module's own state, which
+# there is no point timing
+NOT_BENCHMARKED = ('register_intersect', 'register_intersection',
+                   'register_distance', 'reset_bbox_stats')
+
+def benchmark(name):
+    """ Decorator adding a setup function to the suite under the given name """
+    def add(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return add
+
+# The pair functions also take points as their first argument
+_PAIR_GENERATORS = dict(GENERATORS, point=random_points)
+
+def _pair_benchmark(func, kind1, kind2):
+    def setup(rng, n):
+        a = _PAIR_GENERATORS[kind1](rng, n)
+        b = _PAIR_GENERATORS[kind2](rng, n)
+        return lambda: [func(s1, s2) for s1, s2 in zip(a, b)]
+    return setup
+
+# Every pair of shape types has an *_intersect, an *_intersection and a
+# *_distance function
+for _name, _func in sorted(vars(shapes).items()):
+    _kinds = _name.rsplit('_', 1)[0].split('_')
+    if _name.endswith(('_intersect', '_intersection', '_distance')) and \
+            len(_kinds) == 2 and all(kind in _PAIR_GENERATORS for kind in _kinds):
+        benchmark(_name)(_pair_benchmark(_func, _kinds[0], _kinds[1]))
+
+def _dispatch_benchmark(func):
+    def setup(rng, n):
+        a = random_shapes(rng, n)
+        b = random_shapes(rng, n + 1)[1:]
+        return lambda: [func(s1, s2) for s1, s2 in zip(a, b)]
+    return setup
+
+benchmark('intersect')(_dispatch_benchmark(shapes.intersect))
+benchmark('intersection')(_dispatch_benchmark(shapes.intersection))
+benchmark('distance')(_dispatch_benchmark(shapes.distance))
+
+@benchmark('intersect_function')
+def setup_intersect_function(rng, n):
+    types = [type(shape) for shape in random_shapes(rng, n + 1)]
+    pairs = list(zip(types, types[1:]))
+    return lambda: [shapes.intersect_function(t1, t2) for t1, t2 in pairs]
+
+@benchmark('intersection_function')
+def setup_intersection_function(rng, n):
+    types = [type(shape) for shape in random_shapes(rng, n + 1)]
+    pairs = list(zip(types, types[1:]))
+    return lambda: [shapes.intersection_function(t1, t2) for t1, t2 in pairs]
+
+@benchmark('bboxes_overlap')
+def setup_bboxes_overlap(rng, n):
+    boxes = [shape.bbox() for shape in random_shapes(rng, n + 1)]
+    pairs = list(zip(boxes, boxes[1:]))
+    return lambda: [shapes.bboxes_overlap(b1, b2) for b1, b2 in pairs]
+
+@benchmark('point_in_polygon')
+def setup_point_in_polygon(rng, n):
+    polygon = random_star_polygon(rng, 64)
+    points = [random_point(rng, 12.0) for i in range(n)]
+    return lambda: [shapes.point_in_polygon(p, polygon) for p in points]
+
+@benchmark('xy_in_polygon')
+def setup_xy_in_polygon(rng, n):
+    coords = random_star_polygon(rng, 64).coords
+    points = [random_point(rng, 12.0).cartesian_pair() for i in range(n)]
+    return lambda: [shapes.xy_in_polygon(x, y, coords) for x, y in points]
+
+@benchmark('circle_in_polygon')
+def setup_circle_in_polygon(rng, n):
+    polygon = random_star_polygon(rng, 64, radius=100.0)
+    circles = random_circles(rng, n)
+    return lambda: [shapes.circle_in_polygon(c, polygon) for c in circles]
+
+@benchmark('polygon_in_polygon')
+def setup_polygon_in_polygon(rng, n):
+    outer = random_star_polygon(rng, 64, radius=100.0)
+    polygons = random_polygons(rng, n)
+    return lambda: [shapes.polygon_in_polygon(p, outer) for p in polygons]
+
+@benchmark('convex_hull')
+def setup_convex_hull(rng, n):
+    point_sets = [[random_point(rng) for j in range(32)] for i in range(n)]
+    return lambda: [shapes.convex_hull(points) for points in point_sets]
+
+@benchmark('circle_convex_polygon_overlap')
+def setup_circle_convex_polygon_overlap(rng, n):
+    circles = random_circles(rng, n)
+    polygons = [random_convex_polygon(rng, 16, p.x, p.y, 10.0)
+                for p in (random_point(rng) for i in range(n))]
+    return lambda: [shapes.circle_convex_polygon_overlap(c, p)
+                    for c, p in zip(circles, polygons)]
+
+@benchmark('polygon_polygon_intersect (convex)')
+def setup_convex_polygon_polygon(rng, n):
+    polygons = [random_convex_polygon(rng, 16, p.x, p.y, 10.0)
+                for p in (random_point(rng, 30.0) for i in range(n + 1))]
+    return lambda: [shapes.polygon_polygon_intersect(p1, p2)
+                    for p1, p2 in zip(polygons, polygons[1:])]
+
+@benchmark('Polygon.edges')
+def setup_polygon_edges(rng, n):
+    # Fresh polygons, since the edges are cached after the first call
+    vertices = [p.vertices for p in random_polygons(rng, n)]
+    return lambda: [shapes.Polygon(*v).edges() for v in vertices]
+
+@benchmark('Polygon.bbox')
+def setup_polygon_bbox(rng, n):
+    vertices = [p.vertices for p in random_polygons(rng, n)]
+    return lambda: [shapes.Polygon(*v).bbox() for v in vertices]
+
+@benchmark('Polygon.perimeter')
+def setup_polygon_perimeter(rng, n):
+    polygons = random_polygons(rng, n)
+    return lambda: [p.perimeter() for p in polygons]
+
+@benchmark('Polygon.area')
+def setup_polygon_area(rng, n):
+    polygons = random_polygons(rng, n)
+    return lambda: [p.area() for p in polygons]
+
+@benchmark('Polygon.centroid')
+def setup_polygon_centroid(rng, n):
+    polygons = random_polygons(rng, n)
+    return lambda: [p.centroid() for p in polygons]
+
+@benchmark('batch.polygon_areas')
+def setup_batch_polygon_areas(rng, n):
+    coords, offsets = batch.pack_polygons(random_polygons(rng, n))
+    return lambda: batch.polygon_areas(coords, offsets)
+
+@benchmark('LineSegment.length')
+def setup_linesegment_length(rng, n):
+    segments = random_segments(rng, n)
+    return lambda: [s.length() for s in segments]
+
+@benchmark('LineSegment.point_between_endpoints')
+def setup_point_between_endpoints(rng, n):
+    segments = random_segments(rng, n)
+    points = [random_point(rng) for i in range(n)]
+    return lambda: [s.point_between_endpoints(p) for s, p in zip(segments, points)]
+
+@benchmark('Circle.point_in_circle')
+def setup_point_in_circle(rng, n):
+    circles = random_circles(rng, n)
+    points = [random_point(rng) for i in range(n)]
+    return lambda: [c.point_in_circle(p) for c, p in zip(circles, points)]
+
+@benchmark('Point.distance_to_point')
+def setup_distance_to_point(rng, n):
+    points = [random_point(rng) for i in range(n + 1)]
+    return lambda: [p.distance_to_point(q) for p, q in zip(points, points[1:])]
+
+@benchmark('Polar.cartesian_pair')
+def setup_polar_cartesian_pair(rng, n):
+    coords = [(rng.uniform(0, 100), rng.uniform(-math.pi, math.pi))
+              for i in range(n)]
+    return lambda: [shapes.Polar(r, theta).cartesian_pair() for r, theta in coords]
+
+@benchmark('Cartesian.polar_pair')
+def setup_cartesian_polar_pair(rng, n):
+    coords = [(rng.uniform(-100, 100), rng.uniform(-100, 100)) for i in range(n)]
+    return lambda: [shapes.Cartesian(x, y).polar_pair() for x, y in coords]
+
+def _random_polar(rng, n):
+    return [shapes.Polar(rng.uniform(0, 100), rng.uniform(-math.pi, math.pi))
+            for i in range(n)]
+
+@benchmark('polar.distance')
+def setup_polar_distance(rng, n):
+    points = _random_polar(rng, n + 1)
+    return lambda: [polar.distance(p, q) for p, q in zip(points, points[1:])]
+
+@benchmark('polar.in_sector')
+def setup_polar_in_sector(rng, n):
+    points = _random_polar(rng, n)
+    return lambda: [polar.in_sector(p, 1.0, 2.5, 10.0, 80.0) for p in points]
+
+@benchmark('polar.in_circle')
+def setup_polar_in_circle(rng, n):
+    points = _random_polar(rng, n)
+    circles = random_circles(rng, n)
+    return lambda: [polar.in_circle(p, c) for p, c in zip(points, circles)]
+
+
+@benchmark('NearestIndex.nearest')
+def setup_nearest(rng, n):
+    index = NearestIndex(_bounded_shapes(rng, 10000))
+    points = random_points(rng, n)
+    return lambda: [index.nearest(p, k=5) for p in points]
+
+@benchmark('NearestIndex.within')
+def setup_within(rng, n):
+    index = NearestIndex(_bounded_shapes(rng, 10000))
+    points = random_points(rng, n)
+    return lambda: [index.within(p, 5.0) for p in points]
+
+# The exact tests from robust.py, timed on the same inputs as the ones they
+# replace so the cost of exactness shows up side by side
+for _name in ('line_linesegment_intersect', 'line_circle_intersect',
+              'circle_circle_intersect', 'circle_linesegment_intersect',
+              'linesegment_linesegment_intersect'):
+    _kinds = _name.rsplit('_', 1)[0].split('_')
+    benchmark('robust.' + _name)(_pair_benchmark(getattr(robust, _name),
+                                                 _kinds[0], _kinds[1]))
+
+@benchmark('robust.orient2d')
+def setup_orient2d(rng, n):
+    coords = []
+    for i in range(n):
+        ax, ay, bx, by = [rng.uniform(-100, 100) for j in range(4)]
+        # Half of the points nearly collinear, to exercise the exact path
+        t = rng.random()
+        if i % 2:
+            coords.append((ax, ay, bx, by, ax + t * (bx - ax), ay + t * (by - ay)))
+        else:
+            coords.append((ax, ay, bx, by, rng.uniform(-100, 100),
+                           rng.uniform(-100, 100)))
+    return lambda: [robust.orient2d(*c) for c in coords]
+
+@benchmark('simplify.douglas_peucker')
+def setup_douglas_peucker(rng, n):
+    polygon = random_star_polygon(rng, n)
+    return lambda: simplify.douglas_peucker(polygon, 0.5)
+
+@benchmark('simplify.visvalingam')
+def setup_visvalingam(rng, n):
+    polygon = random_star_polygon(rng, n)
+    return lambda: simplify.visvalingam(polygon, 0.5)
+
+@benchmark('simplify.polygons_intersect')
+def setup_polygons_intersect(rng, n):
+    # n vertices in all, with the pyramids built beforehand as they would be
+    # for polygons queried again and again
+    polygons = [random_star_polygon(rng, max(n // 10, 3), rng.uniform(-15, 15), 0.0)
+                for i in range(11)]
+    for polygon in polygons:
+        simplify.pyramid(polygon)
+    return lambda: [simplify.polygons_intersect(p1, p2)
+                    for p1, p2 in zip(polygons, polygons[1:])]
+
+def uncovered():
+    """ Returns the names of the public functions in shapes.py that the suite
+    does not time """
+    return sorted(name for name, func in vars(shapes).items()
+                  if inspect.isfunction(func) and not name.startswith('_')
+                  and name not in BENCHMARKS and name not in NOT_BENCHMARKED)
+
+def run_suite(sizes=(100, 1000, 10000), names=None, repeat=3, seed=233,
+              out=None):
+    """ Runs the named benchmarks, or all of them, at each size and returns
+    the results as a dictionary ready to be saved as JSON. Progress is
+    printed to out, if given."""
+    results = []
+    for name in sorted(names or BENCHMARKS):
+        setup = BENCHMARKS[name]
+        for n in sizes:
+            # Seeding from the name and size keeps each input the same from
+            # run to run, whichever benchmarks are picked
+            run = setup(random.Random("{0}:{1}:{2}".format(seed, name, n)), n)
+            seconds = timed(run, repeat=repeat)
+            results.append({'name': name, 'n': n, 'seconds': seconds,
+                            'per_op_ns': seconds / n * 1e9})
+            if out is not None:
+                out.write("{0:<40} n={1:<8} {2:10.6f}s {3:12.1f}ns/op\n".format(
+                    name, n, seconds, seconds / n * 1e9))
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare_runs(old, new, threshold=0.1):
+    """ Returns (name, n, old seconds, new seconds, verdict) for every
+    benchmark found in both runs. The verdict is 'slower' if the new time is
+    more than threshold times slower than the old one, 'faster' if it is
+    that much faster, and '' otherwise."""
+    old_times = dict(((r['name'], r['n']), r['seconds']) for r in old['results'])
+    rows = []
+    for r in new['results']:
+        key = (r['name'], r['n'])
+        if key not in old_times:
+            continue
+        before, after = old_times[key], r['seconds']
+        if after > before * (1 + threshold):
+            verdict = 'slower'
+        elif after * (1 + threshold) < before:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        rows.append((r['name'], r['n'], before, after, verdict))
+    rows.sort()
+    return rows
+
+
+# The load test for service.py. Every client awaits one query at a time, as
+# a request handler would.
+
+async def _load_clients(query, workload, clients):
+    """ Returns the latency of every query, and the longest time the event
+    loop was kept from running a heartbeat task due every millisecond """
+    latencies = []
+    async def client(share):
+        for shape1, shape2 in share:
+            start = time.perf_counter()
+            await query(shape1, shape2)
+            latencies.append(time.perf_counter() - start)
+    async def heartbeat():
+        worst = 0.0
+        while True:
+            due = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - due)
+            stalls[0] = worst
+    stalls = [0.0]
+    beat = asyncio.ensure_future(heartbeat())
+    await asyncio.sleep(0)
+    await asyncio.gather(*[client(workload[i::clients]) for i in range(clients)])
+    beat.cancel()
+    return latencies, stalls[0]
+
+async def _direct(shape1, shape2):
+    return shapes.intersect(shape1, shape2)
+
+def load_test(requests=20000, clients=200, max_batch=256, max_delay=0.002,
+              seed=233, out=sys.stdout):
+    """ Runs the workload through intersect() on the event loop and through
+    an IntersectionService, and returns (name, seconds, sorted latencies,
+    worst loop stall) for each """
+    rng = random.Random(seed)
+    scene = random_shapes(rng, 2000)
+    workload = [(rng.choice(scene), rng.choice(scene)) for i in range(requests)]
+
+    async def direct():
+        return await _load_clients(_direct, workload, clients) + (None,)
+
+    async def with_service():
+        async with IntersectionService(max_batch, max_delay) as service:
+            latencies, stall = await _load_clients(service.intersect, workload,
+                                                   clients)
+        return latencies, stall, service.stats()
+
+    results = []
+    for name, run in (("direct", direct), ("service", with_service)):
+        start = time.perf_counter()
+        latencies, stall, stats = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        results.append((name, elapsed, latencies, stall))
+        out.write("{0:<8} {1:>8} queries in {2:7.3f}s  {3:9.0f}/s  "
+                  "p50={4:8.3f}ms  p99={5:8.3f}ms  worst loop stall={6:8.3f}ms"
+                  "{7}\n".format(
+            name, requests, elapsed, requests / elapsed,
+            latencies[len(latencies) // 2] * 1e3,
+            latencies[int(len(latencies) * 0.99)] * 1e3, stall * 1e3,
+            "  mean batch={0:.1f}".format(stats['mean_batch']) if stats else ""))
+    return results
+
+def report():
+    rng = random.Random(233)
+    for n in (1000, 100000):
+        bench_circle_circle(rng, n)
+        bench_linesegment_linesegment(rng, n)
+        bench_line_circle(rng, n)
+        bench_circle_linesegment(rng, n)
+    for n in (8, 64, 512):
+        bench_polygon_polygon_sweep(rng, n)
+    bench_point_memory(100000)
+    bench_parallel(rng, 4000)
+    bench_storage(rng, 1000000)
+    bench_dispatch(rng, 1000000)
+    for vertices in (8, 64, 1024):
+        bench_point_in_polygon(rng, vertices, 20000)
+    bench_point_in_polygon(rng, 4000, 2000, spiky=True)
+    for moving in (10, 100, 1000):
+        bench_scene(rng, 5000, moving)
+    for distinct in (10, 100):
+        bench_memo(rng, 100000, distinct)
+    for n in (8, 64, 512):
+        bench_convex(rng, n)
+    for n in (1000, 20000):
+        bench_simplify(rng, n)
+    bench_polar(rng, 100000)
+    bench_metrics(rng, 100000)
+    for n in (1000, 100000):
+        bench_nearest(rng, n)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for pyShapes")
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', help="run the benchmark suite")
+    run.add_argument('names', nargs='*', help="benchmarks to run (default all)")
+    run.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--seed', type=int, default=233)
+    run.add_argument('--output', help="file to save the results to as JSON")
+    commands.add_parser('list', help="list the benchmarks in the suite")
+    compare_ = commands.add_parser('compare', help="compare two saved runs")
+    compare_.add_argument('old')
+    compare_.add_argument('new')
+    compare_.add_argument('--threshold', type=float, default=0.1)
+    commands.add_parser('report', help="print the side-by-side comparisons")
+    load = commands.add_parser('load-test', help="load test service.py")
+    load.add_argument('--requests', type=int, default=20000)
+    load.add_argument('--clients', type=int, default=200)
+    load.add_argument('--max-batch', type=int, default=256)
+    load.add_argument('--max-delay', type=float, default=0.002)
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for name in sorted(BENCHMARKS):
+            print(name)
+    elif args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare_runs(old, new, args.threshold)
+        for name, n, before, after, verdict in rows:
+            print("{0:<40} n={1:<8} {2:10.6f}s -> {3:10.6f}s  {4:+6.1f}%  {5}".format(
+                name, n, before, after, (after / before - 1) * 100, verdict))
+        if any(row[4] == 'slower' for row in rows):
+            return 1
+    elif args.command == 'report':
+        report()
+    elif args.command == 'load-test':
+        load_test(args.requests, args.clients, args.max_batch, args.max_delay)
+    else:
+        if args.command is None:
+            args = run.parse_args([])
+        unknown = [name for name in args.names if name not in BENCHMARKS]
+        if unknown:
+            parser.error("unknown benchmarks: " + ", ".join(unknown))
+        results = run_suite(args.sizes, args.names, args.repeat, args.seed,
+                            out=sys.stdout)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Converts shapes to and from flat arrays of coordinates.
+
+A shape is described by a kind code and a run of floats:
+
+    CIRCLE   center x, center y, radius
+    SEGMENT  x1, y1, x2, y2
+    LINE     x, y, slope (float('inf') for vertical lines)
+    POLYGON  x0, y0, x1, y1, ... for each vertex
+
+pack() lays out many shapes as three arrays: the kind codes, the offsets
+where each shape's floats start (with one extra entry marking the end), and
+all of the floats back to back. These arrays are much smaller and quicker to
+copy between processes, or to disk, than the shape objects themselves."""
+from array import array
+
+from shapes import Cartesian, Line, LineBySlope, LineSegment, Circle, Polygon
+
+CIRCLE, SEGMENT, LINE, POLYGON = 1, 2, 3, 4
+
+
+def encode(shape):
+    """ Returns the (kind, coordinates) pair describing a shape """
+    if isinstance(shape, LineSegment):
+        return SEGMENT, shape.endpoint1.cartesian_pair() + \
+                shape.endpoint2.cartesian_pair()
+    elif isinstance(shape, Line):
+        return LINE, (shape.x, shape.y, shape.slope)
+    elif isinstance(shape, Circle):
+        return CIRCLE, shape.center.cartesian_pair() + (shape.radius,)
+    elif isinstance(shape, Polygon):
+        return POLYGON, shape.coords
+    raise TypeError("Can't encode {0!r}".format(shape))
+
+def decode(kind, coords):
+    """ Returns a new shape built from a kind code and its coordinates """
+    if kind == CIRCLE:
+        return Circle(Cartesian(coords[0], coords[1]), coords[2])
+    elif kind == SEGMENT:
+        return LineSegment(Cartesian(coords[0], coords[1]),
+                           Cartesian(coords[2], coords[3]))
+    elif kind == LINE:
+        return LineBySlope(Cartesian(coords[0], coords[1]), coords[2])
+    elif kind == POLYGON:
+        return Polygon(*[Cartesian(coords[i], coords[i + 1])
+                         for i in range(0, len(coords), 2)])
+    raise ValueError("Unknown shape kind {0!r}".format(kind))
+
+
+def pack(shapes):
+    """ Returns the (kinds, offsets, coords) arrays describing the shapes """
+    kinds = array('B')
+    offsets = array('q', [0])
+    coords = array('d')
+    for shape in shapes:
+        kind, values = encode(shape)
+        kinds.append(kind)
+        coords.extend(values)
+        offsets.append(len(coords))
+    return kinds, offsets, coords
+
+def unpack(kinds, offsets, coords):
+    """ Returns the list of shapes described by packed arrays """
+    return [decode(kinds[i], coords[offsets[i]:offsets[i + 1]])
+            for i in range(len(kinds))]
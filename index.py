@@ -0,0 +1,114 @@
+"""A spatial index that finds intersecting shapes without testing every pair.
+
+ShapeIndex buckets shapes into a uniform grid by their axis-aligned bounding
+boxes. A query only looks at shapes sharing a grid cell with the query shape,
+discards those whose bounding boxes do not overlap, and runs the exact tests
+from shapes.py on whatever is left."""
+import math
+
+from shapes import bboxes_overlap
+
+
+def _is_bounded(box):
+    return all(not math.isinf(v) for v in box)
+
+
+class ShapeIndex(object):
+    """Bulk-loads a sequence of shapes into a uniform grid. Shapes are referred
+    to by their position in that sequence, so query() and pairs() return
+    indices into ShapeIndex.shapes.
+
+    cell_size is the side length of a grid cell. If not given, it is the
+    average size of the shapes' bounding boxes, which keeps the number of
+    cells each shape touches small."""
+    def __init__(self, shapes, cell_size=None):
+        self.shapes = list(shapes)
+        self._boxes = [shape.bbox() for shape in self.shapes]
+        self._cells = {}
+        # Lines cannot be put in grid cells; they are candidates for every query
+        self._unbounded = []
+
+        if cell_size is None:
+            cell_size = self._average_size()
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = float(cell_size)
+
+        for i, box in enumerate(self._boxes):
+            if _is_bounded(box):
+                for cell in self._cells_for(box):
+                    self._cells.setdefault(cell, []).append(i)
+            else:
+                self._unbounded.append(i)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def _average_size(self):
+        sizes = [max(box[2] - box[0], box[3] - box[1])
+                 for box in self._boxes if _is_bounded(box)]
+        size = sum(sizes) / len(sizes) if sizes else 0
+        return size if size > 0 else 1.0
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (int(math.floor(box[0] / size)), int(math.floor(box[1] / size)),
+                int(math.floor(box[2] / size)), int(math.floor(box[3] / size)))
+
+    def _cells_for(self, box):
+        x0, y0, x1, y1 = self._cell_range(box)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield (cx, cy)
+
+    def candidates(self, box):
+        """ Returns the set of indices of shapes whose bounding boxes overlap
+        the given bounding box. No exact tests are run."""
+        found = set(self._unbounded)
+        if _is_bounded(box):
+            x0, y0, x1, y1 = self._cell_range(box)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self._cells):
+                buckets = (self._cells.get(cell, ()) for cell in self._cells_for(box))
+            else:
+                # A query bigger than the occupied part of the grid is
+                # cheaper to answer by walking the occupied cells
+                buckets = (ids for (cx, cy), ids in self._cells.items()
+                           if x0 <= cx <= x1 and y0 <= cy <= y1)
+            for ids in buckets:
+                found.update(ids)
+        else:
+            found.update(range(len(self.shapes)))
+        return set(i for i in found if bboxes_overlap(box, self._boxes[i]))
+
+    def query(self, shape):
+        """ Returns a sorted list of the indices of all shapes in the index
+        that intersect the given shape """
+        return sorted(i for i in self.candidates(shape.bbox())
+                      if shape.intersect(self.shapes[i]))
+
+    def pairs(self):
+        """ Returns a sorted list of (i, j) index pairs, i < j, for every two
+        shapes in the index that intersect each other """
+        seen = set()
+        candidates = []
+        for ids in self._cells.values():
+            for a in range(len(ids)):
+                for b in range(a + 1, len(ids)):
+                    pair = (ids[a], ids[b])
+                    if pair not in seen:
+                        seen.add(pair)
+                        candidates.append(pair)
+        for i in self._unbounded:
+            for j in range(len(self.shapes)):
+                pair = (min(i, j), max(i, j))
+                if i != j and pair not in seen:
+                    seen.add(pair)
+                    candidates.append(pair)
+
+        found = []
+        for i, j in candidates:
+            if bboxes_overlap(self._boxes[i], self._boxes[j]) and \
+                    self.shapes[i].intersect(self.shapes[j]):
+                found.append((i, j))
+        found.sort()
+        return found
@@ -0,0 +1,197 @@
+"""Counts and times the intersection tests while a program runs.
+
+Nothing here costs anything until it is switched on. profiling() swaps every
+function in the intersect() and intersection() registries, and every
+*_intersect and *_intersection function in shapes.py, for a wrapper that
+records the call, and puts the originals back when it is done:
+
+    with instrument.profiling() as profile:
+        run_the_simulation()
+    print(profile.report())
+
+Calls are grouped by the operation and the types of the two shapes, e.g.
+('intersect', 'Circle', 'Polygon'), whether they came through intersect() or
+called a predicate directly. Only the outermost call is timed; the segment
+tests a polygon predicate makes on its edges are counted as that call's edge
+tests instead. Latencies are kept in a histogram of power-of-two buckets of
+nanoseconds, so recording costs the same however long the program runs.
+Calls to intersect() that the bounding box check rejects never reach a
+predicate; shapes.bbox_stats counts those.
+
+The wrappers keep a single call depth, so profile one thread at a time."""
+import time
+from contextlib import contextmanager
+
+import shapes
+
+# The profile being recorded into, if profiling is on
+_active = None
+
+
+class PairStats(object):
+    """The calls recorded for one operation on one pair of shape types"""
+    __slots__ = ('calls', 'edge_tests', 'seconds', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.edge_tests = 0
+        self.seconds = 0.0
+        # Bucket b counts calls that took from 2**(b-1) up to 2**b ns
+        self.histogram = {}
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.seconds += elapsed
+        bucket = int(elapsed * 1e9).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        """ Returns an upper bound, in seconds, on the latency below which the
+        given fraction of calls fell """
+        if not self.calls:
+            return 0.0
+        wanted = fraction * self.calls
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= wanted:
+                return 2**bucket / 1e9
+        return 2**max(self.histogram) / 1e9
+
+
+class Profile(object):
+    """Everything recorded while profiling, keyed on (operation, type name,
+    type name)"""
+    def __init__(self):
+        self.stats = {}
+        self._depth = 0
+        # The statistics of the outermost call in progress
+        self._outer = None
+
+    def _stats_for(self, operation, shape1, shape2):
+        key = (operation, type(shape1).__name__, type(shape2).__name__)
+        try:
+            return self.stats[key]
+        except KeyError:
+            stats = self.stats[key] = PairStats()
+            return stats
+
+    def clear(self):
+        """ Forgets everything recorded so far """
+        self.stats = {}
+
+    def as_dict(self):
+        """ Returns the statistics as a list of dicts, ready to be saved as
+        JSON """
+        rows = []
+        for (operation, type1, type2), stats in sorted(self.stats.items()):
+            rows.append({
+                'operation': operation, 'type1': type1, 'type2': type2,
+                'calls': stats.calls, 'edge_tests': stats.edge_tests,
+                'seconds': stats.seconds,
+                'histogram': dict((str(b), n) for b, n in
+                                  sorted(stats.histogram.items())),
+            })
+        return rows
+
+    def report(self):
+        """ Returns a table of the statistics, busiest pairs first """
+        lines = ["{0:<13} {1:<24} {2:>9} {3:>11} {4:>10} {5:>10} {6:>10}".format(
+            "operation", "types", "calls", "edge tests", "total s", "p50 us",
+            "p99 us")]
+        rows = sorted(self.stats.items(), key=lambda item: -item[1].seconds)
+        for (operation, type1, type2), stats in rows:
+            lines.append("{0:<13} {1:<24} {2:>9} {3:>11} {4:>10.4f} "
+                         "{5:>10.1f} {6:>10.1f}".format(
+                operation, type1 + "-" + type2, stats.calls, stats.edge_tests,
+                stats.seconds, stats.percentile(0.5) * 1e6,
+                stats.percentile(0.99) * 1e6))
+        return "\n".join(lines)
+
+
+def _wrap(func, operation, profile):
+    edge_test = 'linesegment' in func.__name__
+    clock = time.perf_counter
+
+    def instrumented(shape1, shape2):
+        if profile._depth:
+            if edge_test:
+                profile._outer.edge_tests += 1
+            return func(shape1, shape2)
+        stats = profile._stats_for(operation, shape1, shape2)
+        profile._outer = stats
+        profile._depth += 1
+        start = clock()
+        try:
+            return func(shape1, shape2)
+        finally:
+            stats.record(clock() - start)
+            profile._depth -= 1
+    instrumented.__name__ = func.__name__
+    instrumented.__doc__ = func.__doc__
+    instrumented.wrapped = func
+    return instrumented
+
+def _predicate_names():
+    for name in dir(shapes):
+        if name.endswith('_intersect'):
+            operation = 'intersect'
+        elif name.endswith('_intersection'):
+            operation = 'intersection'
+        else:
+            continue
+        # register_intersect and register_intersection end the same way but
+        # aren't predicates
+        if not name.startswith(('_', 'register_')) and \
+                callable(getattr(shapes, name)):
+            yield name, operation
+
+def enable(profile=None):
+    """ Starts recording into profile, or a new Profile, and returns it """
+    global _active
+    if _active is not None:
+        raise RuntimeError("Profiling is already on")
+    if profile is None:
+        profile = Profile()
+    for registry, operation in ((shapes._intersect_registry, 'intersect'),
+                                (shapes._intersection_registry, 'intersection')):
+        for pair, func in list(registry.items()):
+            registry[pair] = _wrap(func, operation, profile)
+    for name, operation in _predicate_names():
+        setattr(shapes, name, _wrap(getattr(shapes, name), operation, profile))
+    shapes._intersect_cache.clear()
+    shapes._intersection_cache.clear()
+    _active = profile
+    return profile
+
+def disable():
+    """ Stops recording and puts the original functions back. Returns the
+    profile that was being recorded into. """
+    global _active
+    if _active is None:
+        return None
+    for registry in (shapes._intersect_registry, shapes._intersection_registry):
+        for pair, func in list(registry.items()):
+            registry[pair] = getattr(func, 'wrapped', func)
+    for name, operation in _predicate_names():
+        func = getattr(shapes, name)
+        setattr(shapes, name, getattr(func, 'wrapped', func))
+    shapes._intersect_cache.clear()
+    shapes._intersection_cache.clear()
+    profile, _active = _active, None
+    return profile
+
+
+@contextmanager
+def profiling(profile=None):
+    """ Context manager that records into profile, or a new Profile, while
+    the block runs:
+
+        with profiling() as profile:
+            ...
+    """
+    profile = enable(profile)
+    try:
+        yield profile
+    finally:
+        disable()
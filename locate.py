@@ -0,0 +1,92 @@
+"""Fast repeated point-in-polygon queries against one polygon.
+
+shapes.point_in_polygon looks at every edge of the polygon, which is fine for
+a handful of points but slow for millions of them. PolygonLocator does some
+work up front instead: it cuts the polygon's bounding box into horizontal
+bands and files each edge under every band its y range overlaps. A ray cast
+from a point can only cross edges that span the point's y coordinate, and
+those are all filed under the point's band, so a query only looks at the few
+edges in one band rather than all of them.
+
+An edge is filed under every band it spans, so long edges are filed many
+times over. By default the number of bands is chosen from how far the edges
+span in y altogether, so that an edge is filed FILED_PER_EDGE times on
+average and the locator holds O(n) edges whatever the polygon's shape. The price falls
+on polygons like a star with long spikes, where most edges span much of the
+height: they get only a few bands, and a query looks at a large share of the
+edges, as point_in_polygon does. An explicit bands count is used as it is,
+and with long edges can cost O(n * bands) time and memory to build.
+
+The locator copies the polygon's coordinates when it is built, so it has to
+be rebuilt if the polygon's vertices change."""
+from array import array
+
+# By default, the number of bands is chosen so that each edge is filed under
+# about this many of them, on average
+FILED_PER_EDGE = 5
+
+
+class PolygonLocator(object):
+    """Answers point-in-polygon queries for one polygon. bands is the number
+    of horizontal bands to use. By default there are no more bands than
+    edges, and few enough that edges are filed no more than FILED_PER_EDGE
+    times on average. Points on the boundary count as inside, as they do
+    for shapes.point_in_polygon."""
+    def __init__(self, polygon, bands=None):
+        coords = polygon.coords
+        n = len(coords) // 2
+        self.bbox = polygon.bbox()
+        ymin, ymax = self.bbox[1], self.bbox[3]
+        if bands is None:
+            # An edge spanning h is filed under at most h / (height / bands)
+            # bands, plus the two at its ends
+            spans = sum(abs(coords[i + 1] - coords[i - 1]) for i in range(0, 2 * n, 2))
+            bands = int((FILED_PER_EDGE - 2) * n * (ymax - ymin) / spans) if spans else 1
+            bands = max(min(bands, n), 1)
+        elif bands < 1:
+            raise ValueError("bands must be at least 1")
+        self.bands = bands
+        # Multiplying by scale turns a y offset from ymin into a band number
+        self._scale = bands / (ymax - ymin) if n and ymax > ymin else 0.0
+        self._edges = [array('d') for _ in range(bands)]
+
+        if n == 0:
+            return
+        x1, y1 = coords[-2], coords[-1]
+        for i in range(0, 2 * n, 2):
+            x2, y2 = coords[i], coords[i + 1]
+            for band in range(self._band(min(y1, y2)), self._band(max(y1, y2)) + 1):
+                self._edges[band].extend((x1, y1, x2, y2))
+            x1, y1 = x2, y2
+
+    def _band(self, y):
+        return min(int((y - self.bbox[1]) * self._scale), self.bands - 1)
+
+    def contains_xy(self, x, y):
+        """ Returns true if (x, y) lies inside the polygon or on its boundary """
+        box = self.bbox
+        if x < box[0] or x > box[2] or y < box[1] or y > box[3]:
+            return False
+        edges = self._edges[self._band(y)]
+        inside = False
+        for i in range(0, len(edges), 4):
+            xj, yj, xi, yi = edges[i], edges[i + 1], edges[i + 2], edges[i + 3]
+            if min(xi, xj) <= x <= max(xi, xj) and min(yi, yj) <= y <= max(yi, yj) \
+                    and (xj - xi) * (y - yi) == (yj - yi) * (x - xi):
+                return True
+            if (yi > y) != (yj > y):
+                if x < xi + (y - yi) * (xj - xi) / (yj - yi):
+                    inside = not inside
+        return inside
+
+    def contains(self, point):
+        """ Returns true if the given Point object lies inside the polygon or
+        on its boundary """
+        x, y = point.cartesian_pair()
+        return self.contains_xy(x, y)
+
+    def contains_many(self, points):
+        """ Returns a list saying whether each of the given Point objects lies
+        inside the polygon """
+        contains_xy = self.contains_xy
+        return [contains_xy(*point.cartesian_pair()) for point in points]
@@ -0,0 +1,99 @@
+"""Remembers the answers to intersection queries that keep coming back.
+
+When the same pairs of shapes are tested again and again, as happens when a
+stream of queries runs against fixed reference geometry, a PairCache skips
+the work of all but the first test of each pair:
+
+    cached_intersect = PairCache(intersect)
+    cached_intersect(shape1, shape2)
+
+Pairs are looked up by value, using the == and hash() of the shapes, so an
+equal shape built afresh still finds the cached answer. The cache holds at
+most maxsize pairs, dropping the least recently used one to make room.
+
+Polygons are the one kind of shape that can change. A cached pair holding a
+polygon that has since changed no longer matches anything and is simply
+evicted in time, but calling invalidate() on the polygon before changing it
+frees the entries straight away."""
+from collections import OrderedDict
+
+from shapes import intersect
+
+
+class PairCache(object):
+    """Wraps func(shape1, shape2), by default intersect, in a bounded least
+    recently used cache keyed on the pair of shapes"""
+    def __init__(self, func=intersect, maxsize=4096):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.func = func
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = OrderedDict()
+        # The cached pairs each shape appears in, for invalidate()
+        self._pairs = {}
+
+    def __call__(self, shape1, shape2):
+        pair = (shape1, shape2)
+        results = self._results
+        try:
+            result = results[pair]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            results.move_to_end(pair)
+            return result
+
+        self.misses += 1
+        result = self.func(shape1, shape2)
+        results[pair] = result
+        self._pairs.setdefault(shape1, set()).add(pair)
+        self._pairs.setdefault(shape2, set()).add(pair)
+        if len(results) > self.maxsize:
+            self._forget(results.popitem(last=False)[0])
+            self.evictions += 1
+        return result
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, pair):
+        return pair in self._results
+
+    def _forget(self, pair):
+        for shape in pair:
+            pairs = self._pairs.get(shape)
+            if pairs is not None:
+                pairs.discard(pair)
+                if not pairs:
+                    del self._pairs[shape]
+
+    def invalidate(self, shape):
+        """ Drops every cached pair the given shape, or any shape equal to it,
+        appears in. Returns the number of pairs dropped. """
+        pairs = list(self._pairs.get(shape, ()))
+        for pair in pairs:
+            del self._results[pair]
+            self._forget(pair)
+        return len(pairs)
+
+    def clear(self):
+        """ Drops every cached pair. The statistics are kept. """
+        self._results.clear()
+        self._pairs.clear()
+
+    def stats(self):
+        """ Returns a dict of the hits, misses and evictions so far, and the
+        current and maximum size of the cache """
+        calls = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / calls if calls else 0.0,
+            'size': len(self._results),
+            'maxsize': self.maxsize,
+        }
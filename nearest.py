@@ -0,0 +1,145 @@
+"""Nearest-neighbour and within-distance queries over many shapes.
+
+NearestIndex bulk-loads shapes and points into a tree of bounding boxes,
+built like a k-d tree: each node splits its shapes in half at the median of
+their box centers, along the axis they are most spread out on, and keeps the
+box around all of them. The gap between a query's bounding box and a node's
+box is a lower bound on the distance from the query to anything under that
+node. nearest() visits nodes nearest first and stops as soon as the next box
+is further away than the k-th nearest shape found so far, and within() skips
+every node whose box is further away than the radius. shapes.distance() only
+runs on the shapes in the leaves that are reached, so a query on shapes that
+are spread out costs about log(n) node visits and a few exact distances.
+
+As with index.ShapeIndex, shapes are referred to by their position in the
+sequence the index was built from. Lines have no bounded box; they are
+measured against every query."""
+import heapq
+import math
+
+from shapes import distance
+from index import _is_bounded
+
+
+def _box_gap(box1, box2):
+    """ Returns the distance between two (xmin, ymin, xmax, ymax) boxes, or 0
+    if they overlap """
+    dx = max(box1[0] - box2[2], box2[0] - box1[2], 0.0)
+    dy = max(box1[1] - box2[3], box2[1] - box1[3], 0.0)
+    return math.sqrt(dx * dx + dy * dy)
+
+
+class NearestIndex(object):
+    """Bulk-loads a sequence of shapes, points or both. Leaves hold at most
+    leaf_size of them. nearest() and within() return (distance, index) pairs,
+    nearest first, where index is a position in NearestIndex.shapes."""
+    def __init__(self, shapes, leaf_size=8):
+        if leaf_size < 1:
+            raise ValueError("leaf_size must be at least 1")
+        self.shapes = list(shapes)
+        self.leaf_size = leaf_size
+        boxes = [shape.bbox() for shape in self.shapes]
+        self._unbounded = [i for i, box in enumerate(boxes) if not _is_bounded(box)]
+        # The shapes under node n are _order[_start[n]:_end[n]]. Leaves have
+        # no children, marked by _left[n] == -1.
+        self._order = [i for i, box in enumerate(boxes) if _is_bounded(box)]
+        self._boxes = []
+        self._start = []
+        self._end = []
+        self._left = []
+        self._right = []
+        if self._order:
+            self._build(boxes)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def _new_node(self, start, end, boxes):
+        members = [boxes[i] for i in self._order[start:end]]
+        self._boxes.append((min(b[0] for b in members), min(b[1] for b in members),
+                            max(b[2] for b in members), max(b[3] for b in members)))
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        return len(self._boxes) - 1
+
+    def _build(self, boxes):
+        order = self._order
+        stack = [self._new_node(0, len(order), boxes)]
+        while stack:
+            node = stack.pop()
+            start, end = self._start[node], self._end[node]
+            if end - start <= self.leaf_size:
+                continue
+            box = self._boxes[node]
+            axis = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+            order[start:end] = sorted(order[start:end],
+                                      key=lambda i: boxes[i][axis] + boxes[i][axis + 2])
+            middle = (start + end) // 2
+            self._left[node] = self._new_node(start, middle, boxes)
+            self._right[node] = self._new_node(middle, end, boxes)
+            stack.append(self._left[node])
+            stack.append(self._right[node])
+
+    def nearest(self, query, k=1):
+        """ Returns the k shapes nearest to the query, a shape or a point, as
+        a list of (distance, index) pairs """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        shapes = self.shapes
+        # The best k so far, as a heap of (-distance, -index) so that the
+        # furthest, and of equals the last added, is on top
+        best = []
+        def consider(i):
+            d = distance(query, shapes[i])
+            if len(best) < k:
+                heapq.heappush(best, (-d, -i))
+            elif (d, i) < (-best[0][0], -best[0][1]):
+                heapq.heapreplace(best, (-d, -i))
+
+        for i in self._unbounded:
+            consider(i)
+        if self._boxes:
+            query_box = query.bbox()
+            queue = [(_box_gap(query_box, self._boxes[0]), 0)]
+            while queue:
+                gap, node = heapq.heappop(queue)
+                if len(best) == k and gap > -best[0][0]:
+                    break
+                if self._left[node] == -1:
+                    for i in self._order[self._start[node]:self._end[node]]:
+                        consider(i)
+                else:
+                    for child in (self._left[node], self._right[node]):
+                        heapq.heappush(queue, (_box_gap(query_box, self._boxes[child]),
+                                               child))
+        return sorted((-d, -i) for d, i in best)
+
+    def within(self, query, radius):
+        """ Returns every shape no further than radius from the query, a
+        shape or a point, as a list of (distance, index) pairs """
+        shapes = self.shapes
+        found = []
+        def consider(i):
+            d = distance(query, shapes[i])
+            if d <= radius:
+                found.append((d, i))
+
+        for i in self._unbounded:
+            consider(i)
+        if self._boxes:
+            query_box = query.bbox()
+            stack = [0]
+            while stack:
+                node = stack.pop()
+                if _box_gap(query_box, self._boxes[node]) > radius:
+                    continue
+                if self._left[node] == -1:
+                    for i in self._order[self._start[node]:self._end[node]]:
+                        consider(i)
+                else:
+                    stack.append(self._left[node])
+                    stack.append(self._right[node])
+        found.sort()
+        return found
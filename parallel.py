@@ -0,0 +1,68 @@
+"""Finds intersecting shapes across several processes.
+
+intersecting_pairs splits the first collection into chunks and hands them to
+a process pool. Every worker builds a ShapeIndex over the second collection
+once, when it starts, and then answers queries for each chunk it is given.
+Shapes travel between processes as the packed coordinate arrays from
+codec.py rather than as pickled objects."""
+from concurrent.futures import ProcessPoolExecutor
+
+import codec
+from index import ShapeIndex
+
+# The index of the reference shapes, built once in each worker process
+_index = None
+
+
+def _init_worker(kinds, offsets, coords, cell_size):
+    global _index
+    _index = ShapeIndex(codec.unpack(kinds, offsets, coords), cell_size)
+
+def _query_chunk(start, kinds, offsets, coords, self_join):
+    """ Returns the intersecting (i, j) pairs for one chunk of shapes, where
+    i counts from start """
+    found = []
+    for k, shape in enumerate(codec.unpack(kinds, offsets, coords)):
+        i = start + k
+        for j in _index.query(shape):
+            if not self_join or j > i:
+                found.append((i, j))
+    return found
+
+def _chunks(packed, chunk_size):
+    """ Yields (start, kinds, offsets, coords) for consecutive runs of at most
+    chunk_size packed shapes """
+    kinds, offsets, coords = packed
+    for start in range(0, len(kinds), chunk_size):
+        stop = min(start + chunk_size, len(kinds))
+        first, last = offsets[start], offsets[stop]
+        chunk_offsets = offsets[start:stop + 1]
+        for k in range(len(chunk_offsets)):
+            chunk_offsets[k] -= first
+        yield start, kinds[start:stop], chunk_offsets, coords[first:last]
+
+
+def intersecting_pairs(shapes, others=None, workers=None, chunk_size=1000,
+                       cell_size=None):
+    """ Returns a sorted list of (i, j) pairs such that shapes[i] intersects
+    others[j]. Without others, the shapes are tested against each other and
+    each intersecting pair is reported once, with i < j.
+
+    workers is the number of processes, defaulting to the number of CPUs, and
+    chunk_size is how many shapes each task queries. cell_size is passed on
+    to the ShapeIndex each worker builds."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    self_join = others is None
+    packed = codec.pack(shapes)
+    reference = packed if self_join else codec.pack(others)
+
+    found = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=reference + (cell_size,)) as executor:
+        futures = [executor.submit(_query_chunk, *(chunk + (self_join,)))
+                   for chunk in _chunks(packed, chunk_size)]
+        for future in futures:
+            found.extend(future.result())
+    found.sort()
+    return found
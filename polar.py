@@ -0,0 +1,71 @@
+"""Tests on points in polar coordinates that never convert them to x and y.
+
+Radar and other sensors report what they see as a range and a bearing from
+where they stand, which is a Polar point. Working out its x and y costs a
+cosine and a sine; the functions here answer the usual questions straight
+from r and theta instead: how far apart two points are, whether a point is
+within a range of distances from the origin (an annulus), and whether it is
+inside a sector given by two bearings.
+
+Any Point can be passed. A Cartesian point works out its polar coordinates
+the first time they are asked for and keeps them, as a Polar point does with
+its cartesian ones.
+
+Angles are in radians, counter-clockwise from the positive x axis, as they
+are for Polar. A negative r points the opposite way from theta."""
+import math
+
+from shapes import INF
+
+TAU = 2 * math.pi
+
+
+def _polar(point):
+    """ Returns the polar coordinates of a point with r made positive """
+    r, theta = point.polar_pair()
+    if r < 0:
+        return -r, theta + math.pi
+    return r, theta
+
+def polar_distance(r1, theta1, r2, theta2):
+    """ Returns the distance between two points given in polar coordinates,
+    by the law of cosines. Points very close together lose some precision to
+    cancellation, where Point.distance_to_point would not. """
+    squared = r1 * r1 + r2 * r2 - 2 * r1 * r2 * math.cos(theta1 - theta2)
+    return math.sqrt(squared) if squared > 0 else 0.0
+
+def distance(point1, point2):
+    """ Returns the distance between two Point objects, worked out from their
+    polar coordinates """
+    return polar_distance(*(point1.polar_pair() + point2.polar_pair()))
+
+def angle_in_sector(theta, start, end):
+    """ Returns true if the angle theta lies in the sector running counter-
+    clockwise from start to end, edges included. A sector spanning a full
+    turn or more holds every angle. """
+    if end - start >= TAU:
+        return True
+    return (theta - start) % TAU <= (end - start) % TAU
+
+def in_annulus(point, r_min, r_max):
+    """ Returns true if the point is between r_min and r_max from the origin,
+    edges included """
+    return r_min <= abs(point.polar_pair()[0]) <= r_max
+
+def in_sector(point, start, end, r_min=0.0, r_max=INF):
+    """ Returns true if the point lies in the sector running counter-clockwise
+    from the bearing start to the bearing end, and between r_min and r_max
+    from the origin. The origin itself is in every sector that reaches it."""
+    r, theta = _polar(point)
+    if not r_min <= r <= r_max:
+        return False
+    return r == 0 or angle_in_sector(theta, start, end)
+
+def in_circle(point, circle):
+    """ Returns true if the point lies on or within the circle, like
+    Circle.point_in_circle, using the polar coordinates of the point and of
+    the circle's center """
+    r1, theta1 = point.polar_pair()
+    r2, theta2 = circle.center.polar_pair()
+    return r1 * r1 + r2 * r2 - 2 * r1 * r2 * math.cos(theta1 - theta2) <= \
+            circle.radius * circle.radius
@@ -0,0 +1,305 @@
+"""Intersection tests that give exact answers for floating point input.
+
+The tests in shapes.py work with slopes and compare computed points, so
+rounding can make them wrong for nearly vertical, nearly parallel or
+collinear segments, and for shapes that only just touch. The tests here ask
+only which side of a line a point lies on and how far apart things are, and
+make each of those decisions exactly:
+
+    1. The answer is worked out in floating point, along with a bound on how
+       far rounding could have moved it. If the answer is further from zero
+       than the bound, its sign is certainly right, and that is all the tests
+       need. Almost every call stops here.
+    2. Otherwise the same expression is worked out again with
+       fractions.Fraction, which represents every float exactly and never
+       rounds.
+
+filter_stats counts how many decisions each step made.
+
+Unlike shapes.py, these tests treat segments that overlap along a common
+line as intersecting.
+
+robust_mode() switches intersect(), Shape.intersect and the predicates in
+shapes.py over to these tests for the length of a with block. The polygon
+tests are built on the segment tests, so they become exact too, as do
+point_in_polygon and polygon_in_polygon. The sweep line tests pairs of
+segments exactly as well, but it still orders the segments it holds by
+heights and slopes worked out in floating point, so segments that nearly
+touch can be left out of the pairs it tests. The functions returning
+intersection points are unchanged."""
+from contextlib import contextmanager
+from fractions import Fraction
+
+import shapes
+from shapes import Line, LineSegment, Circle
+
+# Shewchuk's bound on the rounding error of a 2x2 determinant computed in
+# double precision, relative to the sum of the absolute values of its terms
+_EPSILON = 2.0 ** -53
+_DET_BOUND = (3 + 16 * _EPSILON) * _EPSILON
+# A relative bound for sums of squares and products of a handful of rounded
+# values, with a wide safety margin
+_NORM_BOUND = 16 * _EPSILON
+
+# How many decisions the float filter settled, and how many needed exact
+# arithmetic
+filter_stats = {'fast': 0, 'exact': 0}
+
+
+def reset_filter_stats():
+    """ Sets the counters in filter_stats back to zero """
+    filter_stats['fast'] = 0
+    filter_stats['exact'] = 0
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def orient2d(ax, ay, bx, by, cx, cy):
+    """ Returns 1 if c lies to the left of the line from a to b, -1 if it lies
+    to the right and 0 if the three points are collinear """
+    left = (ax - cx) * (by - cy)
+    right = (ay - cy) * (bx - cx)
+    det = left - right
+    # When the terms have different signs, or one is zero, nothing cancels
+    # and the sign of det is right whatever the rounding
+    if (left > 0) != (right > 0) or left == 0 or \
+            abs(det) > _DET_BOUND * (abs(left) + abs(right)):
+        filter_stats['fast'] += 1
+        return _sign(det)
+    filter_stats['exact'] += 1
+    ax, ay, bx, by, cx, cy = map(Fraction, (ax, ay, bx, by, cx, cy))
+    return _sign((ax - cx) * (by - cy) - (ay - cy) * (bx - cx))
+
+def _dot_sign(ax, ay, bx, by, cx, cy):
+    """ Returns the sign of (b - a) . (c - a), which is positive if c lies
+    ahead of a looking towards b """
+    first = (bx - ax) * (cx - ax)
+    second = (by - ay) * (cy - ay)
+    total = first + second
+    if (first > 0) == (second > 0) or second == 0 or \
+            abs(total) > _DET_BOUND * (abs(first) + abs(second)):
+        filter_stats['fast'] += 1
+        return _sign(total)
+    filter_stats['exact'] += 1
+    ax, ay, bx, by, cx, cy = map(Fraction, (ax, ay, bx, by, cx, cy))
+    return _sign((bx - ax) * (cx - ax) + (by - ay) * (cy - ay))
+
+def _line_side(line, x, y):
+    """ Returns the side of the line the point (x, y) lies on, as orient2d
+    would for two points along the line in order of increasing x (or y, for a
+    vertical line) """
+    if line.is_vertical():
+        return _sign(line.x - x)
+    first = y - line.y
+    second = line.slope * (x - line.x)
+    det = first - second
+    if (first > 0) != (second > 0) or first == 0 or \
+            abs(det) > _DET_BOUND * (abs(first) + abs(second)):
+        filter_stats['fast'] += 1
+        return _sign(det)
+    filter_stats['exact'] += 1
+    return _sign((Fraction(y) - Fraction(line.y)) -
+                 Fraction(line.slope) * (Fraction(x) - Fraction(line.x)))
+
+def _at_most(lhs, lhs_error, rhs, rhs_error, exact):
+    """ Returns whether lhs <= rhs, given floating point values of both sides
+    and bounds on their absolute errors. exact() works out the answer from
+    Fractions when the bounds leave it in doubt. """
+    if lhs + lhs_error < rhs - rhs_error:
+        filter_stats['fast'] += 1
+        return True
+    if lhs - lhs_error > rhs + rhs_error:
+        filter_stats['fast'] += 1
+        return False
+    filter_stats['exact'] += 1
+    return exact()
+
+def _within(x1, y1, x2, y2, r):
+    """ Returns whether the distance between two points is at most r """
+    d2 = (x2 - x1)**2 + (y2 - y1)**2
+    r2 = r * r
+    def exact():
+        fx1, fy1, fx2, fy2, fr = map(Fraction, (x1, y1, x2, y2, r))
+        return (fx2 - fx1)**2 + (fy2 - fy1)**2 <= fr * fr
+    return _at_most(d2, _NORM_BOUND * d2, r2, _NORM_BOUND * r2, exact)
+
+def _on_segment(x1, y1, x2, y2, x, y):
+    """ Returns whether a point collinear with a segment lies on it """
+    return min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2)
+
+
+def line_linesegment_intersect(line, segment):
+    """ Returns whether a line meets a segment: the endpoints are not both
+    strictly on the same side of it """
+    x1, y1 = segment.endpoint1.cartesian_pair()
+    x2, y2 = segment.endpoint2.cartesian_pair()
+    return _line_side(line, x1, y1) * _line_side(line, x2, y2) <= 0
+
+def line_circle_intersect(line, circle):
+    """ Returns whether a line comes within the radius of a circle's center """
+    cx, cy = circle.center.cartesian_pair()
+    r = circle.radius
+    if line.is_vertical():
+        return _within(line.x, cy, cx, cy, r)
+    # The squared distance from the center to the line is d**2 / (1 + m**2)
+    m = line.slope
+    first = cy - line.y
+    second = m * (cx - line.x)
+    d = first - second
+    d_error = _DET_BOUND * (abs(first) + abs(second))
+    lhs = d * d
+    lhs_error = 2 * abs(d) * d_error + d_error * d_error + _NORM_BOUND * lhs
+    rhs = r * r * (1 + m * m)
+    def exact():
+        fm, fr = Fraction(m), Fraction(r)
+        fd = (Fraction(cy) - Fraction(line.y)) - fm * (Fraction(cx) - Fraction(line.x))
+        return fd * fd <= fr * fr * (1 + fm * fm)
+    return _at_most(lhs, lhs_error, rhs, _NORM_BOUND * rhs, exact)
+
+def circle_circle_intersect(circle1, circle2):
+    """ Returns whether two circles overlap or touch """
+    x1, y1 = circle1.center.cartesian_pair()
+    x2, y2 = circle2.center.cartesian_pair()
+    r1, r2 = circle1.radius, circle2.radius
+    d2 = (x2 - x1)**2 + (y2 - y1)**2
+    r2_sum = (r1 + r2)**2
+    def exact():
+        fx1, fy1, fx2, fy2 = map(Fraction, (x1, y1, x2, y2))
+        return (fx2 - fx1)**2 + (fy2 - fy1)**2 <= (Fraction(r1) + Fraction(r2))**2
+    return _at_most(d2, _NORM_BOUND * d2, r2_sum, _NORM_BOUND * r2_sum, exact)
+
+def circle_linesegment_intersect(circle, segment):
+    """ Returns whether any point of a segment lies within the radius of a
+    circle's center """
+    cx, cy = circle.center.cartesian_pair()
+    r = circle.radius
+    x1, y1 = segment.endpoint1.cartesian_pair()
+    x2, y2 = segment.endpoint2.cartesian_pair()
+    if _within(x1, y1, cx, cy, r) or _within(x2, y2, cx, cy, r):
+        return True
+    # Otherwise the nearest point must lie strictly between the endpoints
+    if _dot_sign(x1, y1, x2, y2, cx, cy) <= 0 or \
+            _dot_sign(x2, y2, x1, y1, cx, cy) <= 0:
+        return False
+    # The distance from the center to the line through the segment is
+    # |cross| / length
+    left = (x1 - cx) * (y2 - cy)
+    right = (y1 - cy) * (x2 - cx)
+    cross = left - right
+    cross_error = _DET_BOUND * (abs(left) + abs(right))
+    lhs = cross * cross
+    lhs_error = 2 * abs(cross) * cross_error + cross_error * cross_error + \
+            _NORM_BOUND * lhs
+    rhs = r * r * ((x2 - x1)**2 + (y2 - y1)**2)
+    def exact():
+        fx1, fy1, fx2, fy2, fcx, fcy, fr = map(Fraction, (x1, y1, x2, y2, cx, cy, r))
+        fcross = (fx1 - fcx) * (fy2 - fcy) - (fy1 - fcy) * (fx2 - fcx)
+        return fcross * fcross <= fr * fr * ((fx2 - fx1)**2 + (fy2 - fy1)**2)
+    return _at_most(lhs, lhs_error, rhs, _NORM_BOUND * rhs, exact)
+
+def linesegment_linesegment_intersect(segment1, segment2):
+    """ Returns whether two segments share at least one point """
+    ax, ay = segment1.endpoint1.cartesian_pair()
+    bx, by = segment1.endpoint2.cartesian_pair()
+    cx, cy = segment2.endpoint1.cartesian_pair()
+    dx, dy = segment2.endpoint2.cartesian_pair()
+    d1 = orient2d(cx, cy, dx, dy, ax, ay)
+    d2 = orient2d(cx, cy, dx, dy, bx, by)
+    d3 = orient2d(ax, ay, bx, by, cx, cy)
+    d4 = orient2d(ax, ay, bx, by, dx, dy)
+    if d1 * d2 < 0 and d3 * d4 < 0:
+        return True
+    # Otherwise they can only meet where an endpoint lies on the other segment
+    return (d1 == 0 and _on_segment(cx, cy, dx, dy, ax, ay)) or \
+           (d2 == 0 and _on_segment(cx, cy, dx, dy, bx, by)) or \
+           (d3 == 0 and _on_segment(ax, ay, bx, by, cx, cy)) or \
+           (d4 == 0 and _on_segment(ax, ay, bx, by, dx, dy))
+
+def xy_in_polygon(x, y, coords):
+    """ Exact version of shapes.xy_in_polygon """
+    n = len(coords) // 2
+    if n == 0:
+        return False
+    inside = False
+    xj, yj = coords[-2], coords[-1]
+    for i in range(0, 2 * n, 2):
+        xi, yi = coords[i], coords[i + 1]
+        if (yi > y) != (yj > y):
+            side = orient2d(xi, yi, xj, yj, x, y)
+            if side == 0:
+                return True
+            # The ray to the right crosses an upward edge that has the point
+            # on its left, or a downward edge that has it on its right
+            if (side > 0) == (yj > yi):
+                inside = not inside
+        elif orient2d(xi, yi, xj, yj, x, y) == 0 and \
+                _on_segment(xi, yi, xj, yj, x, y):
+            return True
+        xj, yj = xi, yi
+    return inside
+
+def point_in_polygon(point, polygon):
+    """ Exact version of shapes.point_in_polygon """
+    x, y = point.cartesian_pair()
+    box = polygon.bbox()
+    if x < box[0] or x > box[2] or y < box[1] or y > box[3]:
+        return False
+    return xy_in_polygon(x, y, polygon.coords)
+
+
+# The pairs of shape types each exact test is registered for
+_PREDICATES = (
+    ('line_linesegment_intersect', Line, LineSegment),
+    ('line_circle_intersect', Line, Circle),
+    ('circle_circle_intersect', Circle, Circle),
+    ('circle_linesegment_intersect', Circle, LineSegment),
+    ('linesegment_linesegment_intersect', LineSegment, LineSegment),
+)
+# Helpers in shapes.py that the containment tests are built on
+_HELPERS = (
+    ('_orientation', orient2d),
+    ('xy_in_polygon', xy_in_polygon),
+    ('point_in_polygon', point_in_polygon),
+)
+
+# What robust_mode() replaced, while it is on
+_saved = None
+
+
+def enable():
+    """ Switches shapes.py over to the exact tests until disable() """
+    global _saved
+    if _saved is not None:
+        raise RuntimeError("Robust mode is already on")
+    replacements = [(name, globals()[name]) for name, _, _ in _PREDICATES]
+    replacements.extend(_HELPERS)
+    _saved = (dict(shapes._intersect_registry),
+              [(name, getattr(shapes, name)) for name, _ in replacements])
+    for name, func in replacements:
+        setattr(shapes, name, func)
+    for name, type1, type2 in _PREDICATES:
+        shapes.register_intersect(type1, type2, globals()[name])
+
+def disable():
+    """ Puts back the tests that enable() replaced. Pairs registered in the
+    meantime are forgotten. """
+    global _saved
+    if _saved is None:
+        return
+    registry, functions = _saved
+    shapes._intersect_registry.clear()
+    shapes._intersect_registry.update(registry)
+    shapes._intersect_cache.clear()
+    for name, func in functions:
+        setattr(shapes, name, func)
+    _saved = None
+
+@contextmanager
+def robust_mode():
+    """ Context manager running the block with the exact tests """
+    enable()
+    try:
+        yield
+    finally:
+        disable()
@@ -0,0 +1,261 @@
+"""A collection of shapes that move around, tracking which of them intersect.
+
+Scene keeps the bounding boxes of its shapes sorted by their endpoints along
+each axis (sort and sweep). When a shape moves, its endpoints are shifted
+along the sorted lists one swap at a time; every swap of one box's start
+with another box's end is exactly where two boxes begin or stop overlapping
+on that axis, so the set of overlapping boxes is kept up to date as a side
+effect. Shapes that move a little between ticks only make a few swaps.
+
+tick() then runs the exact tests only for the shapes that changed since the
+last tick, against the shapes their boxes overlap, and reports which pairs
+started or stopped intersecting. The cost of a tick depends on how much
+changed, not on how many shapes are in the scene."""
+import codec
+from shapes import bboxes_overlap, intersect
+
+
+def translated(shape, dx, dy):
+    """ Returns a copy of the shape moved by dx, dy. Lines come back as
+    LineBySlope objects and points as Cartesian ones."""
+    kind, coords = codec.encode(shape)
+    coords = list(coords)
+    if kind in (codec.CIRCLE, codec.LINE):
+        coords[0] += dx
+        coords[1] += dy
+    else:
+        for i in range(0, len(coords), 2):
+            coords[i] += dx
+            coords[i + 1] += dy
+    return codec.decode(kind, coords)
+
+def scaled(shape, factor):
+    """ Returns a copy of the shape grown or shrunk by factor around the center
+    of its bounding box, or around the center of a circle """
+    kind, coords = codec.encode(shape)
+    coords = list(coords)
+    if kind == codec.CIRCLE:
+        coords[2] *= factor
+    elif kind == codec.LINE:
+        raise TypeError("Lines have no size to scale")
+    elif coords:
+        box = shape.bbox()
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        for i in range(0, len(coords), 2):
+            coords[i] = cx + (coords[i] - cx) * factor
+            coords[i + 1] = cy + (coords[i + 1] - cy) * factor
+    return codec.decode(kind, coords)
+
+
+class _Endpoint(object):
+    """One end of a bounding box along one axis, and where it is in that
+    axis's sorted list"""
+    __slots__ = ('value', 'is_max', 'key', 'index')
+
+    def __init__(self, value, is_max, key):
+        self.value = value
+        self.is_max = is_max
+        self.key = key
+        self.index = None
+
+
+class Scene(object):
+    """Holds shapes under integer keys, which are handed out by add() and
+    never reused. Changes take effect in the broad phase straight away, but
+    the exact tests only run in tick().
+
+    Pairs of keys are always reported as (smaller, larger)."""
+    def __init__(self, shapes=()):
+        self._shapes = {}
+        self._boxes = {}
+        self._endpoints = {}
+        # For each axis, the endpoints sorted by (value, is_max). Starts sort
+        # before ends at the same value, so boxes that touch overlap.
+        self._axes = ([], [])
+        # Keys whose bounding boxes overlap, and keys whose shapes intersect
+        # as of the last tick
+        self._overlaps = {}
+        self._touching = {}
+        self._dirty = set()
+        self._next_key = 0
+
+        for shape in shapes:
+            key = self._new_key(shape)
+            for axis in (0, 1):
+                self._axes[axis].extend(self._endpoints[key][axis])
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def __contains__(self, key):
+        return key in self._shapes
+
+    def __iter__(self):
+        return iter(sorted(self._shapes))
+
+    def __getitem__(self, key):
+        return self._shapes[key]
+
+    def _new_key(self, shape):
+        key = self._next_key
+        self._next_key += 1
+        box = shape.bbox()
+        self._shapes[key] = shape
+        self._boxes[key] = box
+        self._endpoints[key] = ((_Endpoint(box[0], 0, key), _Endpoint(box[2], 1, key)),
+                                (_Endpoint(box[1], 0, key), _Endpoint(box[3], 1, key)))
+        self._overlaps[key] = set()
+        self._touching[key] = set()
+        self._dirty.add(key)
+        return key
+
+    def _rebuild(self):
+        """ Sorts both axes from scratch and finds every overlapping pair of
+        boxes with one sweep """
+        for items in self._axes:
+            items.sort(key=lambda e: (e.value, e.is_max))
+            for i, endpoint in enumerate(items):
+                endpoint.index = i
+        active = set()
+        for endpoint in self._axes[0]:
+            if endpoint.is_max:
+                active.discard(endpoint.key)
+            else:
+                for other in active:
+                    self._check(endpoint.key, other)
+                active.add(endpoint.key)
+
+    def _check(self, a, b):
+        if bboxes_overlap(self._boxes[a], self._boxes[b]):
+            self._overlaps[a].add(b)
+            self._overlaps[b].add(a)
+
+    def _separate(self, a, b):
+        self._overlaps[a].discard(b)
+        self._overlaps[b].discard(a)
+
+    def _settle(self, items, endpoint):
+        """ Moves an endpoint whose value changed to its place in the sorted
+        list, updating the overlaps for every box end it passes """
+        order = (endpoint.value, endpoint.is_max)
+        key = endpoint.key
+        i = endpoint.index
+        while i > 0 and (items[i - 1].value, items[i - 1].is_max) > order:
+            other = items[i - 1]
+            if other.key != key and other.is_max != endpoint.is_max:
+                if endpoint.is_max:
+                    # This box now ends before the other one starts
+                    self._separate(key, other.key)
+                else:
+                    self._check(key, other.key)
+            items[i] = other
+            other.index = i
+            i -= 1
+        while i < len(items) - 1 and (items[i + 1].value, items[i + 1].is_max) < order:
+            other = items[i + 1]
+            if other.key != key and other.is_max != endpoint.is_max:
+                if endpoint.is_max:
+                    self._check(key, other.key)
+                else:
+                    # This box now starts after the other one ends
+                    self._separate(key, other.key)
+            items[i] = other
+            other.index = i
+            i += 1
+        items[i] = endpoint
+        endpoint.index = i
+
+    def add(self, shape):
+        """ Adds a shape to the scene and returns its key """
+        key = self._new_key(shape)
+        for axis in (0, 1):
+            items = self._axes[axis]
+            for endpoint in self._endpoints[key][axis]:
+                endpoint.index = len(items)
+                items.append(endpoint)
+                self._settle(items, endpoint)
+        return key
+
+    def remove(self, key):
+        """ Removes the shape with the given key from the scene """
+        del self._shapes[key]
+        del self._boxes[key]
+        for axis in (0, 1):
+            items = self._axes[axis]
+            for endpoint in sorted(self._endpoints[key][axis],
+                                   key=lambda e: e.index, reverse=True):
+                del items[endpoint.index]
+                for i in range(endpoint.index, len(items)):
+                    items[i].index = i
+        del self._endpoints[key]
+        for other in self._overlaps.pop(key):
+            self._overlaps[other].discard(key)
+        self._dirty.add(key)
+
+    def update(self, key, shape):
+        """ Replaces the shape with the given key by a new one """
+        if key not in self._shapes:
+            raise KeyError(key)
+        box = shape.bbox()
+        self._shapes[key] = shape
+        self._boxes[key] = box
+        self._dirty.add(key)
+        for axis in (0, 1):
+            low, high = self._endpoints[key][axis]
+            moved_up = box[axis] > low.value
+            low.value, high.value = box[axis], box[axis + 2]
+            # Settle the end leading the way first. Otherwise a box moving
+            # further than its own size would stop the trailing end at the
+            # leading one, which is still where the box used to be.
+            for endpoint in ((high, low) if moved_up else (low, high)):
+                self._settle(self._axes[axis], endpoint)
+
+    def move(self, key, dx, dy):
+        """ Moves the shape with the given key by dx, dy """
+        self.update(key, translated(self._shapes[key], dx, dy))
+
+    def resize(self, key, factor):
+        """ Grows or shrinks the shape with the given key by factor """
+        self.update(key, scaled(self._shapes[key], factor))
+
+    def tick(self):
+        """ Runs the exact tests for every shape changed since the last tick
+        and returns (started, stopped): sorted lists of the pairs of keys
+        that started and stopped intersecting. Pairs with a removed shape
+        count as stopped."""
+        before = set()
+        tested = set()
+        after = set()
+        for key in self._dirty:
+            for other in self._touching.get(key, ()):
+                before.add((min(key, other), max(key, other)))
+            if key in self._shapes:
+                for other in self._overlaps[key]:
+                    pair = (min(key, other), max(key, other))
+                    if pair not in tested:
+                        tested.add(pair)
+                        if intersect(self._shapes[pair[0]], self._shapes[pair[1]]):
+                            after.add(pair)
+        for key in self._dirty:
+            if key not in self._shapes:
+                del self._touching[key]
+        self._dirty = set()
+
+        started = sorted(after - before)
+        stopped = sorted(before - after)
+        for a, b in stopped:
+            if a in self._touching:
+                self._touching[a].discard(b)
+            if b in self._touching:
+                self._touching[b].discard(a)
+        for a, b in started:
+            self._touching[a].add(b)
+            self._touching[b].add(a)
+        return started, stopped
+
+    def pairs(self):
+        """ Returns a sorted list of the pairs of keys whose shapes intersected
+        as of the last tick """
+        return sorted((a, b) for a, others in self._touching.items()
+                      for b in others if a < b)
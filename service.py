@@ -0,0 +1,144 @@
+"""Answers intersection queries from asyncio code without blocking the loop.
+
+Calling intersect() from a coroutine runs the test on the event loop, which
+stalls every other task until it returns. IntersectionService instead queues
+each query and hands queries to an executor in batches: a batch is sent as
+soon as it holds max_batch queries, or max_delay seconds after its first
+query arrived, whichever comes first. One executor job per batch keeps the
+cost of switching threads small, while max_delay caps how long a query can
+wait for others to join it.
+
+    async with IntersectionService(max_batch=256, max_delay=0.002) as service:
+        hit = await service.intersect(shape1, shape2)
+        points = await service.intersection(shape1, shape2)
+
+The default executor is a single worker thread. A ProcessPoolExecutor can be
+passed instead to use more cores, since shapes can be pickled."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from shapes import intersect, intersection
+
+
+def _run_batch(calls):
+    """ Runs a batch of (func, shape1, shape2) calls and returns (ok, value)
+    for each, so one failing call doesn't lose the others' answers """
+    results = []
+    for func, shape1, shape2 in calls:
+        try:
+            results.append((True, func(shape1, shape2)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class IntersectionService(object):
+    """Batches intersection queries made from coroutines on one event loop
+    and runs them in an executor"""
+    def __init__(self, max_batch=256, max_delay=0.002, executor=None):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_delay < 0:
+            raise ValueError("max_delay can't be negative")
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+        self._timer = None
+        self._running = set()
+        self._closed = False
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def intersect(self, shape1, shape2):
+        """ Returns whether two shapes intersect, like shapes.intersect """
+        return await self._submit(intersect, shape1, shape2)
+
+    async def intersection(self, shape1, shape2):
+        """ Returns the points where two shapes meet, like
+        shapes.intersection """
+        return await self._submit(intersection, shape1, shape2)
+
+    def _submit(self, func, shape1, shape2):
+        if self._closed:
+            raise RuntimeError("The service is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((future, (func, shape1, shape2)))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return future
+
+    def _flush(self):
+        """ Sends the queued queries to the executor as one batch """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        futures = [future for future, call in batch]
+        job = asyncio.get_running_loop().run_in_executor(
+            self._executor, _run_batch, [call for future, call in batch])
+        self._running.add(job)
+        job.add_done_callback(lambda job: self._resolve(job, futures))
+
+    def _resolve(self, job, futures):
+        self._running.discard(job)
+        if job.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        error = job.exception()
+        if error is not None:
+            # The executor itself failed, e.g. a worker process died
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, (ok, value) in zip(futures, job.result()):
+            # The caller may have given up waiting
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def flush(self):
+        """ Sends any queued queries straight away and waits until every
+        batch sent so far has been answered """
+        self._flush()
+        if self._running:
+            await asyncio.wait(list(self._running))
+
+    async def close(self):
+        """ Answers the queries already made, then stops accepting new ones.
+        An executor created by the service is shut down. """
+        self._closed = True
+        await self.flush()
+        if self._own_executor:
+            self._executor.shutdown()
+
+    def stats(self):
+        """ Returns a dict of how many queries and batches there have been,
+        and the size of the largest batch """
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'largest_batch': self.largest_batch,
+            'mean_batch': self.requests / self.batches if self.batches else 0.0,
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -1,13 +1,213 @@
 import math
+from array import array
 
-class Point(object):
+import sweep
+
+# Polygon pairs whose vertex counts multiply to more than this are tested with
+# a sweep line instead of comparing every pair of edges
+SWEEP_THRESHOLD = 64
+
+_set = object.__setattr__
+
+INF = float('inf')
+
+# How many times intersect() compared bounding boxes, and how many of those
+# comparisons showed the shapes were too far apart to intersect
+bbox_stats = {'checks': 0, 'rejects': 0}
+
+
+def reset_bbox_stats():
+    """ Sets the bounding box counters in bbox_stats back to zero """
+    bbox_stats['checks'] = 0
+    bbox_stats['rejects'] = 0
+
+def bboxes_overlap(box1, box2):
+    """ Returns true if two (xmin, ymin, xmax, ymax) boxes overlap or touch """
+    return box1[0] <= box2[2] and box2[0] <= box1[2] and \
+           box1[1] <= box2[3] and box2[1] <= box1[3]
+
+def _bboxes_may_intersect(shape1, shape2):
+    """ Returns False if the bounding boxes of two shapes are apart, in which
+    case the shapes can't intersect, and keeps count in bbox_stats """
+    bbox_stats['checks'] += 1
+    if bboxes_overlap(shape1.bbox(), shape2.bbox()):
+        return True
+    bbox_stats['rejects'] += 1
+    return False
+
+
+# intersect() and intersection() look up the function for a pair of shapes in
+# these registries, keyed on the pair of types. Lookups for subclasses fall
+# back along the method resolution order of both types, and whatever is found
+# is cached per pair of concrete types, so after the first call for a pair
+# dispatching costs a single dict lookup.
+_intersect_registry = {}
+_intersection_registry = {}
+_intersect_cache = {}
+_intersection_cache = {}
+# distance() works the same way, and also takes points
+_distance_registry = {}
+_distance_cache = {}
+
+
+def _swapped(func):
+    """ Returns a function taking func's two arguments in the other order """
+    def swapped(shape1, shape2):
+        return func(shape2, shape1)
+    swapped.__name__ = func.__name__
+    swapped.__doc__ = func.__doc__
+    return swapped
+
+def _register(registry, cache, type1, type2, func):
+    registry[(type1, type2)] = func
+    if type1 is not type2:
+        registry[(type2, type1)] = _swapped(func)
+    cache.clear()
+
+def _resolve(registry, cache, type1, type2, operation='intersect'):
+    for base1 in type1.__mro__:
+        for base2 in type2.__mro__:
+            func = registry.get((base1, base2))
+            if func is not None:
+                cache[(type1, type2)] = func
+                return func
+    raise TypeError("Don't know how to {0} {1} with {2}".format(
+        operation, type1.__name__, type2.__name__))
+
+def register_intersect(type1, type2, func):
+    """ Registers func(shape1, shape2) as the test for whether an instance of
+    type1 intersects an instance of type2. The reverse pair is registered too,
+    calling func with its arguments swapped. Registering a pair again
+    replaces the function, which is how a more specific function can be
+    given for one direction."""
+    _register(_intersect_registry, _intersect_cache, type1, type2, func)
+
+def register_intersection(type1, type2, func):
+    """ Registers func(shape1, shape2) as the function returning the points
+    where an instance of type1 and an instance of type2 meet. Works like
+    register_intersect."""
+    _register(_intersection_registry, _intersection_cache, type1, type2, func)
+
+def register_distance(type1, type2, func):
+    """ Registers func(shape1, shape2) as the function returning the distance
+    between an instance of type1 and an instance of type2. Works like
+    register_intersect."""
+    _register(_distance_registry, _distance_cache, type1, type2, func)
+
+def intersect_function(type1, type2):
+    """ Returns the function intersect() calls for a pair of types """
+    try:
+        return _intersect_cache[(type1, type2)]
+    except KeyError:
+        return _resolve(_intersect_registry, _intersect_cache, type1, type2)
+
+def intersection_function(type1, type2):
+    """ Returns the function intersection() calls for a pair of types """
+    try:
+        return _intersection_cache[(type1, type2)]
+    except KeyError:
+        return _resolve(_intersection_registry, _intersection_cache, type1, type2)
+
+def intersect(shape1, shape2):
+    """ Determines whether two shapes intersect on a plane """
+    if not _bboxes_may_intersect(shape1, shape2):
+        return False
+    try:
+        func = _intersect_cache[(type(shape1), type(shape2))]
+    except KeyError:
+        func = _resolve(_intersect_registry, _intersect_cache,
+                        type(shape1), type(shape2))
+    return func(shape1, shape2)
+
+def intersection(shape1, shape2):
+    """ Returns the points where two shapes meet, as a tuple of (x, y) pairs """
+    if not _bboxes_may_intersect(shape1, shape2):
+        return ()
+    try:
+        func = _intersection_cache[(type(shape1), type(shape2))]
+    except KeyError:
+        func = _resolve(_intersection_registry, _intersection_cache,
+                        type(shape1), type(shape2))
+    return func(shape1, shape2)
+
+def distance(shape1, shape2):
+    """ Returns the shortest distance between two shapes or points. Circles
+    and polygons count as the whole area inside them, so the distance is 0
+    when one shape lies inside another, even though they don't intersect."""
+    try:
+        func = _distance_cache[(type(shape1), type(shape2))]
+    except KeyError:
+        func = _resolve(_distance_registry, _distance_cache,
+                        type(shape1), type(shape2), 'measure the distance from')
+    return func(shape1, shape2)
+
+
+class Immutable(object):
+    """Base class for shapes that can't be changed once created. Subclasses
+    list their attributes in __slots__, so instances carry no __dict__, and
+    set them in __init__ through object.__setattr__."""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{0} objects are immutable".format(
+            type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{0} objects are immutable".format(
+            type(self).__name__))
+
+    def __setstate__(self, state):
+        # Used by pickle and copy, which would otherwise try to setattr
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            _set(self, name, value)
+
+
+class Shape(object):
+    """Base class for everything that can be tested for intersection. Shapes
+    provide bbox(); the functions testing pairs of them are registered with
+    register_intersect and register_intersection."""
+    __slots__ = ()
+
+    def intersect(self, obj):
+        """ Determines whether given object and self intersect on a plane """
+        return intersect(self, obj)
+
+    def intersection(self, obj):
+        """ Returns the points where the given object and self meet, as a
+        tuple of (x, y) pairs """
+        return intersection(self, obj)
+
+    def distance(self, obj):
+        """ Returns the shortest distance between the given object and self """
+        return distance(self, obj)
+
+    def _key(self):
+        """ Returns a tuple of the values that define the shape, which is what
+        == and hash() compare. Shapes that return None compare by identity."""
+        return None
+
+    def __eq__(self, other):
+        if not isinstance(other, Shape):
+            return NotImplemented
+        key = self._key()
+        if key is None:
+            return self is other
+        return key == other._key()
+
+    def __hash__(self):
+        key = self._key()
+        if key is None:
+            return object.__hash__(self)
+        return hash(key)
+
+
+class Point(Immutable):
     """Base Point class that is the parent to both Polar and Cartesian
-    representations of points"""
-    x = property(lambda self: self._x)
-    y = property(lambda self: self._y)
-    r = property(lambda self: self._r)
-    theta =  property(lambda self: self._theta)
-    
+    representations of points. Subclasses provide x, y, r and theta."""
+    __slots__ = ()
+
     def __unicode__(self): 
         return "x={0}, y={1}, r={2}, theta={3}".format(self.x, self.y, self.r, self.theta)
 
@@ -24,46 +224,100 @@ class Point(object):
 
     def distance_to_point(self, point):
         """ Returns the absolute distance from this point to a given point """
-        return math.sqrt((self.x - point.x)**2 + (self.y - point.y)**2)
+        x1, y1 = self.cartesian_pair()
+        x2, y2 = point.cartesian_pair()
+        return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
+
+    def __eq__(self, other):
+        # Points are equal if they are in the same place, however they were
+        # given
+        if not isinstance(other, Point):
+            return NotImplemented
+        return self.cartesian_pair() == other.cartesian_pair()
+
+    def __hash__(self):
+        return hash(self.cartesian_pair())
+
+    def bbox(self):
+        """ Returns the bounding box of the point, which is the point itself """
+        x, y = self.cartesian_pair()
+        return (x, y, x, y)
 
 
 class Polar(Point):
-    """Create a Point object given a radius 'r' and an angle 'theta'"""
+    """Create a Point object given a radius 'r' and an angle 'theta'. The
+    cartesian coordinates are worked out the first time they are needed and
+    kept from then on."""
+    __slots__ = ('r', 'theta', '_xy')
+
     def __init__(self, r, theta):
-        self._r = r
-        self._theta = theta
-    x = property(lambda self: self.r * math.cos(self.theta))
-    y = property(lambda self: self.r * math.sin(self.theta))
+        _set(self, 'r', r)
+        _set(self, 'theta', theta)
+        _set(self, '_xy', None)
+
+    def cartesian_pair(self):
+        """ Returns the x, y coordinates as a tuple """
+        xy = self._xy
+        if xy is None:
+            xy = (self.r * math.cos(self.theta), self.r * math.sin(self.theta))
+            _set(self, '_xy', xy)
+        return xy
+
+    x = property(lambda self: self.cartesian_pair()[0])
+    y = property(lambda self: self.cartesian_pair()[1])
 
 
 class Cartesian(Point):
-    """Create a Point object given x- and y-coordinates. """
+    """Create a Point object given x- and y-coordinates. The polar
+    coordinates are worked out the first time they are needed and kept from
+    then on."""
+    __slots__ = ('x', 'y', '_rt')
+
     def __init__(self, x, y):
-        self._x = x
-        self._y = y
-    r = property(lambda self: math.sqrt(self.x**2 + self.y**2))
-    theta = property(lambda self: math.atan2(self.y, self.x))
+        _set(self, 'x', x)
+        _set(self, 'y', y)
+        _set(self, '_rt', None)
+
+    def polar_pair(self):
+        """ Returns the r, theta polar coordinates as a tuple """
+        rt = self._rt
+        if rt is None:
+            rt = (math.sqrt(self.x**2 + self.y**2), math.atan2(self.y, self.x))
+            _set(self, '_rt', rt)
+        return rt
+
+    r = property(lambda self: self.polar_pair()[0])
+    theta = property(lambda self: self.polar_pair()[1])
 
 
-class Line(object):
+class Line(Immutable, Shape):
     """Base Line class that is the parent of LineByPoints and LineBySlope
     classes that are derived from it. All lines can be represented by a slope
     and a point."""
-    x = property(lambda self: self._x)
-    y = property(lambda self: self._y)
-    slope = property(lambda self: self._slope)
+    __slots__ = ('x', 'y', 'slope', '_bbox')
     y_intercept = property(lambda self: self.y_given_x(0))
 
-    def intersect(self, obj):
-        """ Determines whether given object and self intersect on a plane """
-        if isinstance(obj, LineSegment):
-            return line_linesegment_intersect(self, obj)
-        elif isinstance(obj, Line):
-            return line_line_intersect(self, obj)
-        elif isinstance(obj, Circle):
-            return line_circle_intersect(self, obj)
-        elif isinstance(obj, Polygon):
-            return line_polygon_intersect(self, obj)
+    def bbox(self):
+        """ Returns the bounding box (xmin, ymin, xmax, ymax) of the shape.
+        Lines extend infinitely, so their boxes are unbounded in at least one
+        direction. The box is worked out once and then reused."""
+        try:
+            return self._bbox
+        except AttributeError:
+            box = self._compute_bbox()
+            _set(self, '_bbox', box)
+            return box
+
+    def _compute_bbox(self):
+        if self.is_vertical():
+            return (self.x, -INF, self.x, INF)
+        elif self.slope == 0:
+            return (-INF, self.y, INF, self.y)
+        else:
+            return (-INF, -INF, INF, INF)
+
+    def _key(self):
+        return ('line', self.x, self.y, self.slope)
 
     def is_vertical(self):
         return self.slope == float('inf')
@@ -84,55 +338,52 @@ class Line(object):
             return (self.slope * (x - self.x)) + self.y
 
 class LineByPoints(Line):
+    __slots__ = ()
+
     def __init__(self, point1, point2):
         # In the case of a vertical line
         if point1.x == point2.x:
-            self._slope = float('inf')
-            self._x = point1.x
-            self._y = point1.y
+            _set(self, 'slope', float('inf'))
         else:
-            self._slope = (1.0 * (point2.y-point1.y)) / (point2.x-point1.x)
-            self._x = point1.x
-            self._y = point1.y
+            _set(self, 'slope', (1.0 * (point2.y-point1.y)) / (point2.x-point1.x))
+        _set(self, 'x', point1.x)
+        _set(self, 'y', point1.y)
 
 
 class LineBySlope(Line):
     """ Create a Line object when given a Point object and a slope"""
+    __slots__ = ()
+
     def __init__(self, point, slope):
-        self._x = point.x
-        self._y = point.y
-        self._slope = slope
+        _set(self, 'x', point.x)
+        _set(self, 'y', point.y)
+        _set(self, 'slope', slope)
 
 
 class LineSegment(Line):
     """ Define a LineSegment object that will make checking whether polygons
     intersect much easier."""
+    __slots__ = ('endpoint1', 'endpoint2')
+
     def __init__(self, point1, point2):
         # In the case of a vertical line
         if point1.x == point2.x:
-            self._slope = float('inf')
-            self._x = point1.x
-            self._y = point1.y
+            _set(self, 'slope', float('inf'))
         else:
-            self._slope = (1.0 * (point2.y-point1.y)) / (point2.x-point1.x)
-            self._x = point1.x
-            self._y = point1.y
-        self._endpoint1 = point1
-        self._endpoint2 = point2
+            _set(self, 'slope', (1.0 * (point2.y-point1.y)) / (point2.x-point1.x))
+        _set(self, 'x', point1.x)
+        _set(self, 'y', point1.y)
+        _set(self, 'endpoint1', point1)
+        _set(self, 'endpoint2', point2)
 
-    endpoint1 = property(lambda self: self._endpoint1)
-    endpoint2 = property(lambda self: self._endpoint2)
+    def _compute_bbox(self):
+        x1, y1 = self.endpoint1.cartesian_pair()
+        x2, y2 = self.endpoint2.cartesian_pair()
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
 
-    def intersect(self, obj):
-        """ Determines whether given object and self intersect on a plane """
-        if isinstance(obj, LineSegment):
-            return linesegment_linesegment_intersect(self, obj)
-        elif isinstance(obj, Line):
-            return line_linesegment_intersect(obj, self)
-        elif isinstance(obj, Circle):
-            return circle_linesegment_intersect(obj, self)
-        elif isinstance(obj, Polygon):
-            return linesegment_polygon_intersect(self, obj)
+    def _key(self):
+        return ('segment',) + self.endpoint1.cartesian_pair() + \
+                self.endpoint2.cartesian_pair()
 
     def length(self):
         return self.endpoint1.distance_to_point(self.endpoint2)
@@ -142,84 +393,211 @@ class LineSegment(Line):
         y- ranges of the LineSegment's endpoints. This is NOT a test for
         whether a given point is actually on the segment. Due to floating point
         equality testing that is problematic"""
+        return self._between_endpoints(point.x, point.y)
+
+    def _between_endpoints(self, x, y):
         if self.slope == float('inf'):
-            return point.y >= min(self.endpoint1.y, self.endpoint2.y) and \
-               point.y <= max(self.endpoint1.y, self.endpoint2.y)
+            return y >= min(self.endpoint1.y, self.endpoint2.y) and \
+               y <= max(self.endpoint1.y, self.endpoint2.y)
         else:
-            return point.x >= min(self.endpoint1.x, self.endpoint2.x) and \
-                   point.x <= max(self.endpoint1.x, self.endpoint2.x) and \
-                   point.y >= min(self.endpoint1.y, self.endpoint2.y) and \
-                   point.y <= max(self.endpoint1.y, self.endpoint2.y)
+            return x >= min(self.endpoint1.x, self.endpoint2.x) and \
+                   x <= max(self.endpoint1.x, self.endpoint2.x) and \
+                   y >= min(self.endpoint1.y, self.endpoint2.y) and \
+                   y <= max(self.endpoint1.y, self.endpoint2.y)
+
+
+class Polygon(Shape):
+    """Takes any number of Point objects, and returns a Polygon object.
+
+    The coordinates of the vertices are also kept in a flat array of floats,
+    x0, y0, x1, y1, ..., and the edges are built once, the first time they
+    are needed. Assigning a new sequence of points to vertices discards
+    everything derived from the old ones.
 
+    Polygons are equal when they have the same vertices in the same order.
+    Unlike the other shapes they can be changed, so don't change one that is
+    being used as a dict key or kept in a set."""
+    __slots__ = ('_vertices', '_coords', '_edges', '_bbox', '_hash', '_turn',
+                 '_simple', '_lod')
 
-class Polygon(object):
-    """Takes any number of Point objects, and returns a Polygon object."""
     def __init__(self, *args):
-        self.vertices = []
-        for point in args:
-            self.vertices.append(point)
+        self.vertices = args
+
+    def _get_vertices(self):
+        return self._vertices
+
+    def _set_vertices(self, points):
+        self._vertices = tuple(points)
+        coords = array('d')
+        for point in self._vertices:
+            coords.extend(point.cartesian_pair())
+        self._coords = coords
+        self._edges = None
+        self._bbox = None
+        self._hash = None
+        self._turn = None
+        self._simple = None
+        # The simplify.Pyramid, built when first asked for
+        self._lod = None
+
+    vertices = property(_get_vertices, _set_vertices)
+    coords = property(lambda self: self._coords)
+
+    def _key(self):
+        return ('polygon', tuple(self._coords))
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._key())
+        return self._hash
 
     def edges(self):
-        """Returns a list of LineSegment objects, one for each segment between
-        each vertex in vertices """
-        edges = []
-        if len(self.vertices) < 2:
-            return edges
-        else:
-            p0 = self.vertices[-1]
-            for vertex in self.vertices:
-               edges.append(LineSegment(p0, vertex))
-               p0 = vertex
-            return edges
+        """Returns a tuple of LineSegment objects, one for each segment between
+        each vertex in vertices. The tuple is cached, so calling this again
+        is free until the vertices change."""
+        if self._edges is None:
+            edges = []
+            if len(self._vertices) >= 2:
+                p0 = self._vertices[-1]
+                for vertex in self._vertices:
+                    edges.append(LineSegment(p0, vertex))
+                    p0 = vertex
+            self._edges = tuple(edges)
+        return self._edges
 
-    def intersect(self, obj):
-        """ Determines whether given object and self intersect on a plane """
-        if isinstance(obj, LineSegment):
-            return linesegment_polygon_intersect(obj, self)
-        elif isinstance(obj, Line):
-            return line_polygon_intersect(self, obj)
-        elif isinstance(obj, Circle):
-            return circle_polygon_intersect(obj, self)
-        elif isinstance(obj, Polygon):
-            return polygon_polygon_intersect(self, obj)
+    def bbox(self):
+        """ Returns the bounding box (xmin, ymin, xmax, ymax) of the polygon.
+        It is cached until the vertices change."""
+        if self._bbox is None:
+            xs = self._coords[0::2]
+            ys = self._coords[1::2]
+            if xs:
+                self._bbox = (min(xs), min(ys), max(xs), max(ys))
+            else:
+                # An empty box that overlaps nothing
+                self._bbox = (INF, INF, -INF, -INF)
+        return self._bbox
 
     def perimeter(self):
-        if len(self.vertices) < 2:
+        """ Returns the total length of the edges, including the one from the
+        last vertex back to the first """
+        coords = self._coords
+        if len(coords) < 4:
             return 0
-        else:
-            perimeter = 0
-            for edge in self.edges():
-                perimeter += edge.length
-            return perimeter
+        perimeter = 0.0
+        xj, yj = coords[-2], coords[-1]
+        for i in range(0, len(coords), 2):
+            xi, yi = coords[i], coords[i + 1]
+            perimeter += math.sqrt((xi - xj)**2 + (yi - yj)**2)
+            xj, yj = xi, yi
+        return perimeter
+
+    def _signed_area(self):
+        """ Returns the area, positive if the vertices run counter-clockwise
+        and negative if they run clockwise """
+        coords = self._coords
+        if not coords:
+            return 0.0
+        twice = 0.0
+        xj, yj = coords[-2], coords[-1]
+        for i in range(0, len(coords), 2):
+            xi, yi = coords[i], coords[i + 1]
+            twice += xj * yi - xi * yj
+            xj, yj = xi, yi
+        return twice / 2
+
+    def area(self):
+        """ Returns the area inside the polygon, whichever way round its
+        vertices run. Where a polygon crosses itself, the parts it winds
+        round in opposite directions count against each other."""
+        return abs(self._signed_area())
+
+    def centroid(self):
+        """ Returns the center of the area inside the polygon as a Cartesian
+        point. A polygon without any area, such as one whose vertices all lie
+        in a line, gives the mean of its vertices instead. Raises ValueError
+        if the polygon has no vertices."""
+        coords = self._coords
+        n = len(coords) // 2
+        if n == 0:
+            raise ValueError("A polygon without vertices has no centroid")
+        area = self._signed_area()
+        if area == 0:
+            return Cartesian(sum(coords[0::2]) / n, sum(coords[1::2]) / n)
+        cx = cy = 0.0
+        xj, yj = coords[-2], coords[-1]
+        for i in range(0, len(coords), 2):
+            xi, yi = coords[i], coords[i + 1]
+            cross = xj * yi - xi * yj
+            cx += (xj + xi) * cross
+            cy += (yj + yi) * cross
+            xj, yj = xi, yi
+        return Cartesian(cx / (6 * area), cy / (6 * area))
+
+    def contains(self, point):
+        """ Returns true if the point lies inside the polygon or on its
+        boundary. For many queries against the same polygon, a
+        locate.PolygonLocator is much faster."""
+        return point_in_polygon(point, self)
+
+    def is_convex(self):
+        """ Returns true if the polygon is convex: it doesn't cross itself and
+        turns the same way at every vertex. Vertices in a straight line with
+        their neighbours are allowed. The answer is cached until the vertices
+        change."""
+        return self._convex_turn() != 0
+
+    def _convex_turn(self):
+        """ Returns 1 for a convex polygon whose vertices run counter-
+        clockwise, -1 for a clockwise one and 0 if it isn't convex """
+        if self._turn is None:
+            self._turn = _convex_turn(self._coords)
+        return self._turn
 
+    def is_simple(self):
+        """ Returns true if the polygon doesn't cross or touch itself: only
+        neighbouring edges meet, at the vertex they share. The answer is
+        cached until the vertices change."""
+        if self._simple is None:
+            self._simple = not sweep.chain_crosses_itself(self.edges())
+        return self._simple
 
-class Circle(object):
+
+class Circle(Immutable, Shape):
     """ Circle objects are represented by a center Point object and a radius
     scalar. """
+    __slots__ = ('center', 'radius', '_bbox')
+
     def __init__(self, center, radius):
-        self._center = center
-        self._radius = radius
+        _set(self, 'center', center)
+        _set(self, 'radius', radius)
 
-    center = property(lambda self: self._center)
     x = property(lambda self: self.center.x)
     y = property(lambda self: self.center.y)
-    radius = property(lambda self: self._radius)
 
-    def intersect(self, obj):
-        """ Determines whether given object and self intersect on a plane """
-        if isinstance(obj, LineSegment):
-            return circle_linesegment_intersect(self, obj)
-        elif isinstance(obj, Line):
-            return line_circle_intersect(obj, self)
-        elif isinstance(obj, Circle):
-            return circle_circle_intersect(self, obj)
-        elif isinstance(obj, Polygon):
-            return circle_polygon_intersect(self, obj)
+    def bbox(self):
+        """ Returns the bounding box (xmin, ymin, xmax, ymax) of the circle.
+        The box is worked out once and then reused."""
+        try:
+            return self._bbox
+        except AttributeError:
+            x, y = self.center.cartesian_pair()
+            r = self.radius
+            box = (x - r, y - r, x + r, y + r)
+            _set(self, '_bbox', box)
+            return box
 
     def perimeter(self):
         """ returns the perimeter of the circle """
         return 2 * math.pi * self.radius
 
+    def area(self):
+        """ returns the area of the circle """
+        return math.pi * self.radius**2
+
+    def _key(self):
+        return ('circle',) + self.center.cartesian_pair() + (self.radius,)
+
     def point_in_circle(self, point):
         """ returns true if the given Point object lies on or within the
         perimeter of the Circle object """
@@ -234,6 +612,13 @@ class Circle(object):
 def line_line_intersection(line1, line2):
     """ Returns the point where two lines intersect. If there is no point of
     intersection, returns None"""
+    point = _line_line_point(line1, line2)
+    if point is None:
+        return None
+    return Cartesian(*point)
+
+def _line_line_point(line1, line2):
+    """ Returns the (x, y) coordinates where two lines intersect, or None """
     # If two lines have the same slope, they never intersect
     if line1.slope == line2.slope:
         return None
@@ -241,11 +626,11 @@ def line_line_intersection(line1, line2):
     elif line1.slope == float('inf'):
         x = line1.x
         y = line2.y_given_x(x)
-        return Cartesian(x, y)
+        return (x, y)
     elif line2.slope == float('inf'):
         x = line2.x
         y = line1.y_given_x(x)
-        return Cartesian(x, y)
+        return (x, y)
     else:
         # The general case
         a = line1.slope
@@ -255,7 +640,7 @@ def line_line_intersection(line1, line2):
 
         x = (d-c)/(a-b)
         y = a*((d-c)/(a-b)) + c
-        return Cartesian(x, y)
+        return (x, y)
          
 def line_line_intersect(line1, line2):
     """ Returns whether two lines intersect. Since the Line class extends 
@@ -288,7 +673,10 @@ def line_circle_intersect(line, circle):
         dx = line.x - new_x
         dy = line.y - new_y
         dr = math.sqrt(dx**2 + dy**2)
-        D = new_x*line.y - line.x*new_y
+        # The formula assumes a circle centered on the origin, so measure both
+        # points on the line relative to the circle's center
+        D = (new_x - circle.x)*(line.y - circle.y) - \
+                (line.x - circle.x)*(new_y - circle.y)
         discriminant = circle.radius**2 * dr**2 - D**2
 
         return discriminant >= 0
@@ -314,7 +702,10 @@ def circle_linesegment_intersect(circle, segment):
     #the line perpendicular to the given LineSegment that runs through the
     #center of the circle. With this line we find the intersection
 
-    slope = -1 / segment.slope
+    if segment.slope == 0:
+        slope = float('inf')
+    else:
+        slope = -1 / segment.slope
     perpendicular_line = LineBySlope(circle.center, slope)
 
     # Now we find the intersection between segment and perpendiculary line;
@@ -327,7 +718,7 @@ def circle_linesegment_intersect(circle, segment):
     # the segment. If the point is on or in the circle, then that means the
     # segment may intersect the circle
 
-    if circle.point_in_circle(lines_intersect):
+    if not circle.point_in_circle(lines_intersect):
         # The case where it is outside the circle
         return False
     else:
@@ -339,9 +730,24 @@ def circle_linesegment_intersect(circle, segment):
                 circle.point_in_circle(segment.endpoint2)
 
 def circle_polygon_intersect(circle, polygon):
-    """ This method returns whether a line segment intersects with a circle.
-    """
-    for edge in polygon.edges():
+    """ This method returns whether any edge of a polygon intersects with a
+    circle. For a convex polygon, only the edges whose boxes overlap the
+    circle's are tested, and when the circle's center is outside the polygon,
+    only those facing the center, since the nearest point is on one of them."""
+    edges = polygon.edges()
+    turn = polygon._convex_turn()
+    if turn:
+        x, y = circle.center.cartesian_pair()
+        coords = polygon.coords
+        box = circle.bbox()
+        outside = _locate_in_convex(coords, turn, x, y) < 0
+        # Edge k runs from vertex k - 1 to vertex k
+        edges = [edge for k, edge in enumerate(edges)
+                 if bboxes_overlap(box, edge.bbox()) and
+                 (not outside or turn * _orientation(coords[2 * k - 2], coords[2 * k - 1],
+                                                     coords[2 * k], coords[2 * k + 1],
+                                                     x, y) <= 0)]
+    for edge in edges:
         if circle_linesegment_intersect(circle, edge):
             return True
     return False
@@ -369,7 +775,17 @@ def linesegment_polygon_intersect(segment, polygon):
 def polygon_polygon_intersect(polygon1, polygon2):
     """Polygon - Polygon intersection is reduced to recursive segment - segment
     tests. This is true because if one polygon intersects another, at least one
-    of its edges must intersect at least one of the other polygon's segments."""
+    of its edges must intersect at least one of the other polygon's segments.
+    Convex polygons are compared with the separating axis test instead.
+    Other large polygons are handed to a sweep line when both are simple, as
+    the sweep needs; if either crosses itself, only the pairs of edges whose
+    x and y ranges overlap are tested."""
+    if polygon1._convex_turn() and polygon2._convex_turn():
+        return _convex_polygons_intersect(polygon1, polygon2)
+    if len(polygon1.vertices) * len(polygon2.vertices) > SWEEP_THRESHOLD:
+        if polygon1.is_simple() and polygon2.is_simple():
+            return sweep.segments_intersect(polygon1.edges(), polygon2.edges())
+        return bool(sweep.segment_intersections(polygon1.edges(), polygon2.edges()))
     for edge1 in polygon1.edges():
         for edge2 in polygon2.edges():
             if linesegment_linesegment_intersect(edge1, edge2):
@@ -377,3 +793,612 @@ def polygon_polygon_intersect(polygon1, polygon2):
     return False
 
 
+# The following functions return where two shapes meet rather than whether
+# they do. Each returns a tuple of (x, y) coordinate pairs, empty if there
+# are none. For circles and polygons these are the points where the outlines
+# cross, so a shape lying entirely inside a circle meets it nowhere even
+# though circle_circle_intersect counts it as intersecting. As with the tests
+# above, parallel lines and segments are never considered to meet.
+
+def _unique(points):
+    """ Returns the points as a tuple, dropping repeats such as the shared
+    vertex of two neighbouring edges """
+    seen = set()
+    unique = []
+    for point in points:
+        if point not in seen:
+            seen.add(point)
+            unique.append(point)
+    return tuple(unique)
+
+def _line_line_intersection(line1, line2):
+    """ Returns the point where two lines cross, if any """
+    point = _line_line_point(line1, line2)
+    return () if point is None else (point,)
+
+def line_linesegment_intersection(line, segment):
+    """ Returns the point where a line crosses a segment, if any """
+    point = _line_line_point(line, segment)
+    if point is not None and segment._between_endpoints(*point):
+        return (point,)
+    return ()
+
+def line_circle_intersection(line, circle):
+    """ Returns the points where a line crosses the outline of a circle: none,
+    one where the line is a tangent, or two """
+    if line.slope == float('inf'):
+        dx, dy = 0.0, 1.0
+    else:
+        norm = math.sqrt(1 + line.slope**2)
+        dx, dy = 1 / norm, line.slope / norm
+    cx, cy = circle.center.cartesian_pair()
+    # The point on the line nearest the center, and from there the distance
+    # along the line to where it meets the circle
+    t = (cx - line.x) * dx + (cy - line.y) * dy
+    fx, fy = line.x + t * dx, line.y + t * dy
+    h2 = circle.radius**2 - ((cx - fx)**2 + (cy - fy)**2)
+    if h2 < 0:
+        return ()
+    elif h2 == 0:
+        return ((fx, fy),)
+    h = math.sqrt(h2)
+    return ((fx - h * dx, fy - h * dy), (fx + h * dx, fy + h * dy))
+
+def line_polygon_intersection(line, polygon):
+    """ Returns the points where a line crosses the edges of a polygon """
+    points = []
+    for edge in polygon.edges():
+        points.extend(line_linesegment_intersection(line, edge))
+    return _unique(points)
+
+def circle_circle_intersection(circle1, circle2):
+    """ Returns the points where the outlines of two circles cross. Circles
+    that are apart, nested or identical have none."""
+    x1, y1 = circle1.center.cartesian_pair()
+    x2, y2 = circle2.center.cartesian_pair()
+    r1, r2 = circle1.radius, circle2.radius
+    d = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    if d == 0 or d > r1 + r2 or d < abs(r1 - r2):
+        return ()
+    # a is the distance from the first center to the chord joining the two
+    # points, and h is half the length of that chord
+    a = (r1**2 - r2**2 + d**2) / (2 * d)
+    h = math.sqrt(max(r1**2 - a**2, 0.0))
+    ux, uy = (x2 - x1) / d, (y2 - y1) / d
+    mx, my = x1 + a * ux, y1 + a * uy
+    if h == 0:
+        return ((mx, my),)
+    return ((mx - h * uy, my + h * ux), (mx + h * uy, my - h * ux))
+
+def circle_linesegment_intersection(circle, segment):
+    """ Returns the points where a segment crosses the outline of a circle """
+    return tuple(point for point in line_circle_intersection(segment, circle)
+                 if segment._between_endpoints(*point))
+
+def circle_polygon_intersection(circle, polygon):
+    """ Returns the points where the edges of a polygon cross the outline of
+    a circle """
+    points = []
+    for edge in polygon.edges():
+        points.extend(circle_linesegment_intersection(circle, edge))
+    return _unique(points)
+
+def linesegment_linesegment_intersection(segment1, segment2):
+    """ Returns the point where two segments cross, if any """
+    point = _line_line_point(segment1, segment2)
+    if point is not None and segment1._between_endpoints(*point) and \
+            segment2._between_endpoints(*point):
+        return (point,)
+    return ()
+
+def linesegment_polygon_intersection(segment, polygon):
+    """ Returns the points where a segment crosses the edges of a polygon """
+    points = []
+    for edge in polygon.edges():
+        points.extend(linesegment_linesegment_intersection(edge, segment))
+    return _unique(points)
+
+def polygon_polygon_intersection(polygon1, polygon2):
+    """ Returns the points where the edges of two polygons cross. Large
+    polygons are handed to a sweep line, as in polygon_polygon_intersect."""
+    if len(polygon1.vertices) * len(polygon2.vertices) > SWEEP_THRESHOLD:
+        crossings = sweep.segment_intersections(polygon1.edges(), polygon2.edges())
+        return _unique(point for i, j, point in crossings)
+    points = []
+    for edge1 in polygon1.edges():
+        for edge2 in polygon2.edges():
+            points.extend(linesegment_linesegment_intersection(edge1, edge2))
+    return _unique(points)
+
+
+# Containment. The intersection tests above only look at where outlines
+# cross, so a shape lying wholly inside a polygon does not intersect it. These
+# functions answer whether one shape is inside another instead. Points on the
+# boundary count as inside, as they do for Circle.point_in_circle.
+
+def _point_segment_distance(x, y, x1, y1, x2, y2):
+    """ Returns the distance from (x, y) to the segment (x1, y1)-(x2, y2) """
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        t = 0.0
+    else:
+        t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length2))
+    return math.sqrt((x - (x1 + t * dx))**2 + (y - (y1 + t * dy))**2)
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    """ Returns the sign of the turn a -> b -> c: 1 for counter-clockwise,
+    -1 for clockwise and 0 for collinear """
+    cross = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (cross > 0) - (cross < 0)
+
+def xy_in_polygon(x, y, coords):
+    """ Returns true if (x, y) lies inside or on the boundary of the polygon
+    whose vertices are laid out in coords as x0, y0, x1, y1, ... The test
+    counts how many edges a ray running to the right of the point crosses."""
+    n = len(coords) // 2
+    if n == 0:
+        return False
+    inside = False
+    xj, yj = coords[-2], coords[-1]
+    for i in range(0, 2 * n, 2):
+        xi, yi = coords[i], coords[i + 1]
+        # Points on an edge are inside
+        if min(xi, xj) <= x <= max(xi, xj) and min(yi, yj) <= y <= max(yi, yj) \
+                and (xj - xi) * (y - yi) == (yj - yi) * (x - xi):
+            return True
+        if (yi > y) != (yj > y):
+            if x < xi + (y - yi) * (xj - xi) / (yj - yi):
+                inside = not inside
+        xj, yj = xi, yi
+    return inside
+
+def point_in_polygon(point, polygon):
+    """ Returns true if the given Point object lies inside the polygon or on
+    its boundary """
+    x, y = point.cartesian_pair()
+    box = polygon.bbox()
+    if x < box[0] or x > box[2] or y < box[1] or y > box[3]:
+        return False
+    turn = polygon._convex_turn()
+    if turn:
+        return _locate_in_convex(polygon.coords, turn, x, y) >= 0
+    return xy_in_polygon(x, y, polygon.coords)
+
+def circle_in_polygon(circle, polygon):
+    """ Returns true if the whole circle lies inside the polygon, touching its
+    boundary at most """
+    x, y = circle.center.cartesian_pair()
+    if not point_in_polygon(circle.center, polygon):
+        return False
+    coords = polygon.coords
+    xj, yj = coords[-2], coords[-1]
+    for i in range(0, len(coords), 2):
+        xi, yi = coords[i], coords[i + 1]
+        if _point_segment_distance(x, y, xj, yj, xi, yi) < circle.radius:
+            return False
+        xj, yj = xi, yi
+    return True
+
+def _convex_turn(coords):
+    """ Returns the direction a polygon turns in if it is convex, 1 for
+    counter-clockwise and -1 for clockwise, and 0 otherwise """
+    n = len(coords) // 2
+    if n < 3:
+        return 0
+    turn = 0
+    # A convex polygon turns the same way at every vertex, and goes around
+    # only once, so its edges run left and right (and up and down) in at
+    # most two runs each
+    x_changes = y_changes = 0
+    x_dir = y_dir = 0
+    for i in range(n):
+        x0, y0 = coords[2 * i - 4], coords[2 * i - 3]
+        x1, y1 = coords[2 * i - 2], coords[2 * i - 1]
+        x2, y2 = coords[2 * i], coords[2 * i + 1]
+        side = _orientation(x0, y0, x1, y1, x2, y2)
+        if side:
+            if turn and side != turn:
+                return 0
+            turn = side
+        dx, dy = (x2 > x1) - (x2 < x1), (y2 > y1) - (y2 < y1)
+        if dx:
+            if x_dir and dx != x_dir:
+                x_changes += 1
+            x_dir = dx
+        if dy:
+            if y_dir and dy != y_dir:
+                y_changes += 1
+            y_dir = dy
+    # The run the loop started in is counted again if it wraps around
+    if x_changes > 2 or y_changes > 2:
+        return 0
+    return turn
+
+def convex_hull(points):
+    """ Returns the convex hull of the given Point objects as a Polygon with
+    counter-clockwise vertices, leaving out points in a straight line with
+    their neighbours """
+    pairs = sorted(set(point.cartesian_pair() for point in points))
+    if len(pairs) < 3:
+        return Polygon(*[Cartesian(x, y) for x, y in pairs])
+
+    def chain(pairs):
+        hull = []
+        for x, y in pairs:
+            while len(hull) >= 2 and _orientation(hull[-2][0], hull[-2][1],
+                                                  hull[-1][0], hull[-1][1],
+                                                  x, y) <= 0:
+                hull.pop()
+            hull.append((x, y))
+        return hull
+    lower = chain(pairs)
+    upper = chain(reversed(pairs))
+    return Polygon(*[Cartesian(x, y) for x, y in lower[:-1] + upper[:-1]])
+
+def _locate_in_convex(coords, turn, x, y):
+    """ Returns 1 if (x, y) is inside the convex polygon with the given
+    coordinates and direction of turn, 0 if it is on the boundary and -1 if
+    it is outside. The vertices seen from the first one split the polygon
+    into triangles, and a binary search finds the one to test."""
+    n = len(coords) // 2
+    x0, y0 = coords[0], coords[1]
+    first = turn * _orientation(x0, y0, coords[2], coords[3], x, y)
+    last = turn * _orientation(x0, y0, coords[-2], coords[-1], x, y)
+    if first < 0 or last > 0:
+        return -1
+    lo, hi = 1, n - 1
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if turn * _orientation(x0, y0, coords[2 * mid], coords[2 * mid + 1], x, y) >= 0:
+            lo = mid
+        else:
+            hi = mid
+    side = turn * _orientation(coords[2 * lo], coords[2 * lo + 1],
+                               coords[2 * hi], coords[2 * hi + 1], x, y)
+    if side < 0:
+        return -1
+    if side == 0 or first == 0 or last == 0:
+        return 0
+    return 1
+
+def _separated(coords1, turn1, coords2, turn2):
+    """ Returns true if one of the edges of the first convex polygon has the
+    whole of the second one strictly outside it. The vertex of the second
+    polygon furthest behind each edge only moves forward as the edges turn,
+    so the search for it picks up where the last one left off. The search
+    only picks which vertices to look at; whether they are outside is decided
+    by _orientation, which is exact under robust.robust_mode()."""
+    n, m = len(coords1) // 2, len(coords2) // 2
+    step = turn1 * turn2
+    j = None
+    xj, yj = coords1[-2], coords1[-1]
+    for i in range(n):
+        xi, yi = coords1[2 * i], coords1[2 * i + 1]
+        # The outward normal of the edge from (xj, yj) to (xi, yi)
+        nx, ny = turn1 * (yi - yj), turn1 * (xj - xi)
+        if j is None:
+            j = min(range(m), key=lambda k: nx * coords2[2 * k] + ny * coords2[2 * k + 1])
+            best = nx * coords2[2 * j] + ny * coords2[2 * j + 1]
+        else:
+            best = nx * coords2[2 * j] + ny * coords2[2 * j + 1]
+            for _ in range(m):
+                k = (j + step) % m
+                value = nx * coords2[2 * k] + ny * coords2[2 * k + 1]
+                if value >= best:
+                    break
+                j, best = k, value
+        # Rounding can stop the search at the wrong vertex. If that vertex
+        # isn't outside the edge, the edge doesn't separate the polygons;
+        # if it is, every other vertex has to be outside as well.
+        if turn1 * _orientation(xj, yj, xi, yi, coords2[2 * j], coords2[2 * j + 1]) < 0 \
+                and all(turn1 * _orientation(xj, yj, xi, yi,
+                                             coords2[2 * k], coords2[2 * k + 1]) < 0
+                        for k in range(m)):
+            return True
+        xj, yj = xi, yi
+    return False
+
+def _strictly_inside_convex(coords, outer_coords, outer_turn):
+    for i in range(0, len(coords), 2):
+        if _locate_in_convex(outer_coords, outer_turn, coords[i], coords[i + 1]) != 1:
+            return False
+    return True
+
+def _convex_polygons_intersect(polygon1, polygon2):
+    """ polygon_polygon_intersect for two convex polygons, using the
+    separating axis test. Convex polygons whose areas overlap have crossing
+    edges unless one lies wholly inside the other. """
+    coords1, turn1 = polygon1.coords, polygon1._convex_turn()
+    coords2, turn2 = polygon2.coords, polygon2._convex_turn()
+    if _separated(coords1, turn1, coords2, turn2) or \
+            _separated(coords2, turn2, coords1, turn1):
+        return False
+    return not _strictly_inside_convex(coords1, coords2, turn2) and \
+           not _strictly_inside_convex(coords2, coords1, turn1)
+
+def circle_convex_polygon_overlap(circle, polygon):
+    """ Returns true if a circle and a convex polygon have any point in
+    common, including when one lies inside the other. This is a test of
+    areas, unlike circle_polygon_intersect, which only looks at the edges.
+    A circle whose center is inside the polygon is found with a binary
+    search; otherwise only the edges facing the center are measured."""
+    x, y = circle.center.cartesian_pair()
+    turn = polygon._convex_turn()
+    if turn == 0:
+        raise ValueError("The polygon is not convex")
+    if not bboxes_overlap(circle.bbox(), polygon.bbox()):
+        return False
+    coords = polygon.coords
+    if _locate_in_convex(coords, turn, x, y) >= 0:
+        return True
+    xj, yj = coords[-2], coords[-1]
+    for i in range(0, len(coords), 2):
+        xi, yi = coords[i], coords[i + 1]
+        # The center is outside, so the nearest point is on an edge with
+        # the center on its outer side
+        if turn * _orientation(xj, yj, xi, yi, x, y) < 0 and \
+                _point_segment_distance(x, y, xj, yj, xi, yi) <= circle.radius:
+            return True
+        xj, yj = xi, yi
+    return False
+
+def _segments_cross(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    """ Returns true if two segments cross at a point inside both of them,
+    rather than just touching """
+    return _orientation(ax1, ay1, ax2, ay2, bx1, by1) * \
+           _orientation(ax1, ay1, ax2, ay2, bx2, by2) < 0 and \
+           _orientation(bx1, by1, bx2, by2, ax1, ay1) * \
+           _orientation(bx1, by1, bx2, by2, ax2, ay2) < 0
+
+def polygon_in_polygon(inner, outer):
+    """ Returns true if the whole of inner lies inside outer, touching its
+    boundary at most. No edge of inner may cross an edge of outer, and every
+    vertex of inner must be inside outer. So must the middle of every edge,
+    or, where vertices of outer lie on an edge, the middle of every piece
+    they cut it into: outer can touch an edge and still cut into inner
+    between those points."""
+    box1, box2 = inner.bbox(), outer.bbox()
+    if not inner.vertices or box1[0] < box2[0] or box1[1] < box2[1] or \
+            box1[2] > box2[2] or box1[3] > box2[3]:
+        return False
+    coords1, coords2 = inner.coords, outer.coords
+    turn = outer._convex_turn()
+    if turn:
+        # A convex polygon holds everything between any of its points
+        return all(_locate_in_convex(coords2, turn, coords1[i], coords1[i + 1]) >= 0
+                   for i in range(0, len(coords1), 2))
+    x1, y1 = coords1[-2], coords1[-1]
+    for i in range(0, len(coords1), 2):
+        x2, y2 = coords1[i], coords1[i + 1]
+        if not xy_in_polygon(x2, y2, coords2):
+            return False
+        # Where the vertices of outer lying on the edge are along it
+        cuts = [0.0, 1.0]
+        dx, dy = x2 - x1, y2 - y1
+        length2 = dx * dx + dy * dy
+        x3, y3 = coords2[-2], coords2[-1]
+        for j in range(0, len(coords2), 2):
+            x4, y4 = coords2[j], coords2[j + 1]
+            if _segments_cross(x1, y1, x2, y2, x3, y3, x4, y4):
+                return False
+            if length2 and _orientation(x1, y1, x2, y2, x4, y4) == 0 and \
+                    min(x1, x2) <= x4 <= max(x1, x2) and \
+                    min(y1, y2) <= y4 <= max(y1, y2):
+                cuts.append(((x4 - x1) * dx + (y4 - y1) * dy) / length2)
+            x3, y3 = x4, y4
+        cuts.sort()
+        for t1, t2 in zip(cuts, cuts[1:]):
+            t = (t1 + t2) / 2
+            if t1 < t2 and not xy_in_polygon(x1 + t * dx, y1 + t * dy, coords2):
+                return False
+        x1, y1 = x2, y2
+    return True
+
+
+
+# Distances. Circles and polygons are measured as the areas inside them, so
+# anything inside one is at distance 0 from it, while lines extend forever.
+# Every function returns INF for a polygon without vertices.
+
+def _segment_distance(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    """ Returns the distance between two segments """
+    if _segments_cross(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+        return 0.0
+    return min(_point_segment_distance(ax1, ay1, bx1, by1, bx2, by2),
+               _point_segment_distance(ax2, ay2, bx1, by1, bx2, by2),
+               _point_segment_distance(bx1, by1, ax1, ay1, ax2, ay2),
+               _point_segment_distance(bx2, by2, ax1, ay1, ax2, ay2))
+
+def _boundary_distance(x, y, coords):
+    """ Returns the distance from (x, y) to the nearest edge of the polygon
+    whose vertices are laid out in coords as x0, y0, x1, y1, ... """
+    distance = INF
+    if not coords:
+        return distance
+    xj, yj = coords[-2], coords[-1]
+    for i in range(0, len(coords), 2):
+        xi, yi = coords[i], coords[i + 1]
+        d = _point_segment_distance(x, y, xj, yj, xi, yi)
+        if d < distance:
+            distance = d
+        xj, yj = xi, yi
+    return distance
+
+def _line_offset(line, x, y):
+    """ Returns the signed distance from the line to (x, y), positive on the
+    side above the line, or to the right of a vertical one """
+    if line.is_vertical():
+        return x - line.x
+    return (y - line.y - line.slope * (x - line.x)) / math.sqrt(1 + line.slope**2)
+
+def _line_coords_distance(line, coords):
+    """ Returns the distance from the line to the nearest of the points laid
+    out in coords, or 0 if they lie on both sides of it """
+    above = below = False
+    nearest = INF
+    for i in range(0, len(coords), 2):
+        offset = _line_offset(line, coords[i], coords[i + 1])
+        if offset >= 0:
+            above = True
+        if offset <= 0:
+            below = True
+        nearest = min(nearest, abs(offset))
+    return 0.0 if above and below else nearest
+
+def point_point_distance(point1, point2):
+    """ Returns the distance between two points """
+    return point1.distance_to_point(point2)
+
+def point_line_distance(point, line):
+    """ Returns the distance from the point to the nearest point on the line """
+    return abs(_line_offset(line, *point.cartesian_pair()))
+
+def point_linesegment_distance(point, segment):
+    """ Returns the distance from the point to the nearest point on the
+    segment """
+    x, y = point.cartesian_pair()
+    return _point_segment_distance(x, y, *(segment.endpoint1.cartesian_pair() +
+                                           segment.endpoint2.cartesian_pair()))
+
+def point_circle_distance(point, circle):
+    """ Returns how far the point is outside the circle, or 0 if it is in it """
+    return max(0.0, point.distance_to_point(circle.center) - circle.radius)
+
+def point_polygon_distance(point, polygon):
+    """ Returns how far the point is outside the polygon, or 0 if it is inside
+    the polygon or on its boundary """
+    if point_in_polygon(point, polygon):
+        return 0.0
+    x, y = point.cartesian_pair()
+    return _boundary_distance(x, y, polygon.coords)
+
+def line_line_distance(line1, line2):
+    """ Returns the distance between two parallel lines, or 0 if they aren't
+    parallel and so cross somewhere """
+    if line1.slope != line2.slope:
+        return 0.0
+    return abs(_line_offset(line1, line2.x, line2.y))
+
+def line_linesegment_distance(line, segment):
+    """ Returns 0 if the segment touches or crosses the line, and otherwise
+    the distance to its nearer end """
+    return _line_coords_distance(line, segment.endpoint1.cartesian_pair() +
+                                 segment.endpoint2.cartesian_pair())
+
+def line_circle_distance(line, circle):
+    """ Returns how far the line passes outside the circle, or 0 if it cuts
+    it """
+    return max(0.0, point_line_distance(circle.center, line) - circle.radius)
+
+def line_polygon_distance(line, polygon):
+    """ Returns 0 if the line cuts or touches the polygon, and otherwise the
+    distance to its nearest vertex """
+    return _line_coords_distance(line, polygon.coords)
+
+def circle_circle_distance(circle1, circle2):
+    """ Returns the gap between two circles, or 0 if they overlap """
+    return max(0.0, circle1.center.distance_to_point(circle2.center) -
+                    circle1.radius - circle2.radius)
+
+def circle_linesegment_distance(circle, segment):
+    """ Returns the gap between the circle and the segment, or 0 if they
+    overlap """
+    return max(0.0, point_linesegment_distance(circle.center, segment) -
+                    circle.radius)
+
+def circle_polygon_distance(circle, polygon):
+    """ Returns the gap between the circle and the polygon, or 0 if they
+    overlap """
+    return max(0.0, point_polygon_distance(circle.center, polygon) -
+                    circle.radius)
+
+def linesegment_linesegment_distance(segment1, segment2):
+    """ Returns the distance between the nearest points of two segments """
+    return _segment_distance(*(segment1.endpoint1.cartesian_pair() +
+                               segment1.endpoint2.cartesian_pair() +
+                               segment2.endpoint1.cartesian_pair() +
+                               segment2.endpoint2.cartesian_pair()))
+
+def linesegment_polygon_distance(segment, polygon):
+    """ Returns the gap between the segment and the polygon, or 0 if any of
+    the segment is inside the polygon or on its boundary """
+    if point_in_polygon(segment.endpoint1, polygon):
+        return 0.0
+    ax, ay = segment.endpoint1.cartesian_pair()
+    bx, by = segment.endpoint2.cartesian_pair()
+    coords = polygon.coords
+    distance = INF
+    if coords:
+        xj, yj = coords[-2], coords[-1]
+        for i in range(0, len(coords), 2):
+            xi, yi = coords[i], coords[i + 1]
+            distance = min(distance, _segment_distance(ax, ay, bx, by, xj, yj, xi, yi))
+            xj, yj = xi, yi
+    return distance
+
+def polygon_polygon_distance(polygon1, polygon2):
+    """ Returns the gap between two polygons, or 0 if they overlap or one
+    holds the other """
+    coords1, coords2 = polygon1.coords, polygon2.coords
+    if not coords1 or not coords2:
+        return INF
+    if point_in_polygon(polygon1.vertices[0], polygon2) or \
+            point_in_polygon(polygon2.vertices[0], polygon1):
+        return 0.0
+    # Any other overlap has edges crossing, at distance 0
+    distance = INF
+    x1, y1 = coords1[-2], coords1[-1]
+    for i in range(0, len(coords1), 2):
+        x2, y2 = coords1[i], coords1[i + 1]
+        x3, y3 = coords2[-2], coords2[-1]
+        for j in range(0, len(coords2), 2):
+            x4, y4 = coords2[j], coords2[j + 1]
+            # Edges whose boxes are further apart than the nearest pair so
+            # far can't be any nearer
+            if max(min(x1, x2) - max(x3, x4), min(x3, x4) - max(x1, x2),
+                   min(y1, y2) - max(y3, y4), min(y3, y4) - max(y1, y2)) < distance:
+                d = _segment_distance(x1, y1, x2, y2, x3, y3, x4, y4)
+                if d < distance:
+                    distance = d
+            x3, y3 = x4, y4
+        x1, y1 = x2, y2
+    return distance
+
+register_intersect(Line, Line, line_line_intersect)
+register_intersect(Line, LineSegment, line_linesegment_intersect)
+register_intersect(Line, Circle, line_circle_intersect)
+register_intersect(Line, Polygon, line_polygon_intersect)
+register_intersect(Circle, Circle, circle_circle_intersect)
+register_intersect(Circle, LineSegment, circle_linesegment_intersect)
+register_intersect(Circle, Polygon, circle_polygon_intersect)
+register_intersect(LineSegment, LineSegment, linesegment_linesegment_intersect)
+register_intersect(LineSegment, Polygon, linesegment_polygon_intersect)
+register_intersect(Polygon, Polygon, polygon_polygon_intersect)
+
+register_intersection(Line, Line, _line_line_intersection)
+register_intersection(Line, LineSegment, line_linesegment_intersection)
+register_intersection(Line, Circle, line_circle_intersection)
+register_intersection(Line, Polygon, line_polygon_intersection)
+register_intersection(Circle, Circle, circle_circle_intersection)
+register_intersection(Circle, LineSegment, circle_linesegment_intersection)
+register_intersection(Circle, Polygon, circle_polygon_intersection)
+register_intersection(LineSegment, LineSegment, linesegment_linesegment_intersection)
+register_intersection(LineSegment, Polygon, linesegment_polygon_intersection)
+register_intersection(Polygon, Polygon, polygon_polygon_intersection)
+
+register_distance(Point, Point, point_point_distance)
+register_distance(Point, Line, point_line_distance)
+register_distance(Point, LineSegment, point_linesegment_distance)
+register_distance(Point, Circle, point_circle_distance)
+register_distance(Point, Polygon, point_polygon_distance)
+register_distance(Line, Line, line_line_distance)
+register_distance(Line, LineSegment, line_linesegment_distance)
+register_distance(Line, Circle, line_circle_distance)
+register_distance(Line, Polygon, line_polygon_distance)
+register_distance(Circle, Circle, circle_circle_distance)
+register_distance(Circle, LineSegment, circle_linesegment_distance)
+register_distance(Circle, Polygon, circle_polygon_distance)
+register_distance(LineSegment, LineSegment, linesegment_linesegment_distance)
+register_distance(LineSegment, Polygon, linesegment_polygon_distance)
+register_distance(Polygon, Polygon, polygon_polygon_distance)
@@ -0,0 +1,266 @@
+"""Simpler versions of polygons with many vertices, and intersection tests
+that use them.
+
+douglas_peucker() and visvalingam() drop the vertices that add the least to
+a polygon's shape. Both work out once how important each vertex is, so a
+polygon can be simplified to any tolerance from the same ranking.
+
+A Pyramid holds a polygon at several levels of detail, each keeping about a
+quarter of the vertices of the one below it, down to the original polygon.
+The coarser levels keep a subset of the original vertices, so every coarse
+edge stands in for a run of original edges, and the pyramid records how far
+the furthest of those strays from it. Those bounds are exact: every part of
+the original boundary lies within its coarse edge's bound of that edge,
+since the region within a given distance of a segment is convex.
+
+polygons_intersect() uses the pyramids of two polygons to answer the same
+question as polygon_polygon_intersect. It accepts straight away when a
+vertex of one polygon is clearly inside the other's coarsest level and
+another clearly outside it, and otherwise walks down both pyramids together,
+dropping every pair of edges that are further apart than their bounds allow,
+so only the original edges near a possible crossing are tested.
+
+pyramid() caches the pyramid on the polygon until its vertices change."""
+import heapq
+from array import array
+
+import shapes
+from shapes import INF, Polygon, bboxes_overlap, xy_in_polygon, \
+        _boundary_distance, _point_segment_distance, _segment_distance
+
+# Each level of a pyramid keeps about 1/LEVEL_RATIO of the vertices of the
+# level below it, and the coarsest level has no more than COARSEST vertices
+LEVEL_RATIO = 4
+COARSEST = 16
+
+
+def _douglas_peucker_ranks(coords):
+    """ Returns, for each vertex, the largest tolerance at which the
+    Douglas-Peucker algorithm keeps it. The polygon is cut into two chains
+    at the first vertex and the vertex furthest from it, which are always
+    kept. """
+    n = len(coords) // 2
+    ranks = [0.0] * n
+    if n == 0:
+        return ranks
+    x0, y0 = coords[0], coords[1]
+    far = max(range(n), key=lambda i: (coords[2 * i] - x0)**2 +
+                                      (coords[2 * i + 1] - y0)**2)
+    ranks[0] = ranks[far] = INF
+    # Chains run from vertex i to vertex j, where j == n stands for vertex 0.
+    # A vertex is kept only while the split that found it is, so its rank is
+    # capped by the rank of that split.
+    stack = [(0, far, INF), (far, n, INF)]
+    while stack:
+        i, j, limit = stack.pop()
+        if j - i < 2:
+            continue
+        x1, y1 = coords[2 * i], coords[2 * i + 1]
+        x2, y2 = coords[2 * (j % n)], coords[2 * (j % n) + 1]
+        furthest, k = -1.0, None
+        for m in range(i + 1, j):
+            d = _point_segment_distance(coords[2 * m], coords[2 * m + 1],
+                                        x1, y1, x2, y2)
+            if d > furthest:
+                furthest, k = d, m
+        ranks[k] = min(furthest, limit)
+        stack.append((i, k, ranks[k]))
+        stack.append((k, j, ranks[k]))
+    return ranks
+
+def _visvalingam_ranks(coords):
+    """ Returns, for each vertex, the area of the triangle it made with its
+    neighbours when Visvalingam's algorithm removed it. The first vertex and
+    the last three left are never removed. """
+    n = len(coords) // 2
+    ranks = [INF] * n
+    if n <= 3:
+        return ranks
+    previous = [(i - 1) % n for i in range(n)]
+    following = [(i + 1) % n for i in range(n)]
+
+    def area(i):
+        ax, ay = coords[2 * previous[i]], coords[2 * previous[i] + 1]
+        bx, by = coords[2 * i], coords[2 * i + 1]
+        cx, cy = coords[2 * following[i]], coords[2 * following[i] + 1]
+        return abs((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) / 2
+
+    areas = [area(i) for i in range(n)]
+    areas[0] = INF
+    heap = [(areas[i], i) for i in range(1, n)]
+    heapq.heapify(heap)
+    left = n
+    floor = 0.0
+    while left > 3:
+        a, i = heapq.heappop(heap)
+        if a != areas[i] or ranks[i] != INF:
+            # Stale: the vertex's area changed after this entry was pushed
+            continue
+        # Removing a vertex can shrink its neighbours' triangles below the
+        # one just removed; they still count as at least as important
+        floor = max(floor, a)
+        ranks[i] = floor
+        left -= 1
+        p, q = previous[i], following[i]
+        following[p], previous[q] = q, p
+        for j in (p, q):
+            if j != 0:
+                areas[j] = area(j)
+                heapq.heappush(heap, (areas[j], j))
+    return ranks
+
+def _kept(polygon, ranks, tolerance):
+    return Polygon(*[vertex for vertex, rank in zip(polygon.vertices, ranks)
+                     if rank > tolerance])
+
+def douglas_peucker(polygon, tolerance):
+    """ Returns a copy of the polygon keeping only the vertices that the
+    Douglas-Peucker algorithm needs to stay within tolerance of every
+    vertex it drops. At least two vertices are kept. """
+    return _kept(polygon, _douglas_peucker_ranks(polygon.coords), tolerance)
+
+def visvalingam(polygon, min_area):
+    """ Returns a copy of the polygon without the vertices that Visvalingam's
+    algorithm finds make triangles with their neighbours smaller than
+    min_area. At least three vertices are kept. """
+    return _kept(polygon, _visvalingam_ranks(polygon.coords), min_area)
+
+
+class Level(object):
+    """One level of a Pyramid. Edge k runs from original vertex indices[k]
+    to indices[k + 1], the last one back to indices[0], which is always 0.
+    errors[k] bounds how far the original edges it replaces stray from it,
+    and down[k] is where indices[k] is in the next finer level."""
+    __slots__ = ('indices', 'coords', 'errors', 'down', 'error')
+
+    def __init__(self, indices, coords, finer=None):
+        self.indices = indices
+        self.coords = array('d')
+        for i in indices:
+            self.coords.extend((coords[2 * i], coords[2 * i + 1]))
+        self.errors = array('d', [0.0] * len(indices))
+        self.down = None
+        if finer is not None:
+            position = dict((i, k) for k, i in enumerate(finer.indices))
+            self.down = array('l', [position[i] for i in indices])
+            n = len(coords) // 2
+            for k in range(len(indices)):
+                start = indices[k]
+                end = indices[k + 1] if k + 1 < len(indices) else n
+                x1, y1 = coords[2 * start], coords[2 * start + 1]
+                x2, y2 = coords[2 * (end % n)], coords[2 * (end % n) + 1]
+                worst = 0.0
+                for m in range(start + 1, end):
+                    d = _point_segment_distance(coords[2 * m], coords[2 * m + 1],
+                                                x1, y1, x2, y2)
+                    if d > worst:
+                        worst = d
+                self.errors[k] = worst
+        self.error = max(self.errors) if len(indices) else 0.0
+
+    def children(self, k, finer):
+        """ Returns the range of edges in the finer level that edge k
+        replaces """
+        end = self.down[k + 1] if k + 1 < len(self.down) else len(finer.indices)
+        return range(self.down[k], end)
+
+
+class Pyramid(object):
+    """A polygon at several levels of detail. levels[0] is the polygon
+    itself and each later level is coarser, ranked by Visvalingam's
+    algorithm."""
+    def __init__(self, polygon):
+        coords = polygon.coords
+        n = len(coords) // 2
+        self.polygon = polygon
+        self.levels = [Level(array('l', range(n)), coords)]
+        ranks = _visvalingam_ranks(coords)
+        order = sorted(range(n), key=lambda i: -ranks[i])
+        size = n
+        while size > COARSEST:
+            size = max(size // LEVEL_RATIO, COARSEST)
+            indices = array('l', sorted(order[:size]))
+            self.levels.append(Level(indices, coords, self.levels[-1]))
+
+    def simplified(self, tolerance):
+        """ Returns the coarsest level whose boundary stays within tolerance
+        of the original polygon's, as a Polygon """
+        for level in reversed(self.levels):
+            if level.error <= tolerance:
+                vertices = self.polygon.vertices
+                return Polygon(*[vertices[i] for i in level.indices])
+        return self.polygon
+
+def pyramid(polygon):
+    """ Returns the polygon's Pyramid, building it the first time """
+    if polygon._lod is None:
+        polygon._lod = Pyramid(polygon)
+    return polygon._lod
+
+
+def _straddles(lod1, lod2, slack):
+    """ Returns true if some vertices of the second polygon are certainly
+    inside the first and some certainly outside, in which case their
+    boundaries must cross. A point further from a coarse level than its
+    error bound is inside the coarse level exactly when it is inside the
+    original polygon. """
+    level = lod1.levels[-1]
+    coords = level.coords
+    margin = level.error + slack
+    seen = set()
+    other = lod2.levels[-1].coords
+    for i in range(0, len(other), 2):
+        x, y = other[i], other[i + 1]
+        if _boundary_distance(x, y, coords) > margin:
+            seen.add(xy_in_polygon(x, y, coords))
+            if len(seen) == 2:
+                return True
+    return False
+
+def polygons_intersect(polygon1, polygon2):
+    """ Returns true if an edge of polygon1 intersects an edge of polygon2,
+    the same answer as testing every pair of edges, using both polygons'
+    pyramids to skip the pairs that can't. """
+    box1, box2 = polygon1.bbox(), polygon2.bbox()
+    if len(polygon1.vertices) < 2 or len(polygon2.vertices) < 2 or \
+            not bboxes_overlap(box1, box2):
+        return False
+    # Room for rounding in the distances, relative to the size of the numbers
+    slack = 1e-9 * max(abs(v) for v in box1 + box2)
+    lod1, lod2 = pyramid(polygon1), pyramid(polygon2)
+    if _straddles(lod1, lod2, slack) or _straddles(lod2, lod1, slack):
+        return True
+
+    levels1, levels2 = lod1.levels, lod2.levels
+    edges1, edges2 = polygon1.edges(), polygon2.edges()
+    top1, top2 = len(levels1) - 1, len(levels2) - 1
+    stack = [(top1, k1, top2, k2) for k1 in range(len(levels1[top1].indices))
+             for k2 in range(len(levels2[top2].indices))]
+    while stack:
+        l1, k1, l2, k2 = stack.pop()
+        level1, level2 = levels1[l1], levels2[l2]
+        c1, c2 = level1.coords, level2.coords
+        j1 = (k1 + 1) % len(level1.indices)
+        j2 = (k2 + 1) % len(level2.indices)
+        error1, error2 = level1.errors[k1], level2.errors[k2]
+        margin = error1 + error2 + slack
+        ax1, ay1, ax2, ay2 = c1[2 * k1], c1[2 * k1 + 1], c1[2 * j1], c1[2 * j1 + 1]
+        bx1, by1, bx2, by2 = c2[2 * k2], c2[2 * k2 + 1], c2[2 * j2], c2[2 * j2 + 1]
+        if min(ax1, ax2) - max(bx1, bx2) > margin or \
+                min(bx1, bx2) - max(ax1, ax2) > margin or \
+                min(ay1, ay2) - max(by1, by2) > margin or \
+                min(by1, by2) - max(ay1, ay2) > margin or \
+                _segment_distance(ax1, ay1, ax2, ay2,
+                                  bx1, by1, bx2, by2) > margin:
+            continue
+        if l1 == 0 and l2 == 0:
+            # Edge k of the original polygon is edges()[k + 1]
+            if shapes.linesegment_linesegment_intersect(edges1[j1], edges2[j2]):
+                return True
+        elif l2 == 0 or (l1 > 0 and error1 >= error2):
+            for child in level1.children(k1, levels1[l1 - 1]):
+                stack.append((l1 - 1, child, l2, k2))
+        else:
+            for child in level2.children(k2, levels2[l2 - 1]):
+                stack.append((l1, k1, l2 - 1, child))
+    return False
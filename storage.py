@@ -0,0 +1,127 @@
+"""A compact binary file format for shapes, loaded through mmap.
+
+The file holds the three arrays from codec.pack() behind a fixed header,
+all little-endian:
+
+    header   magic b'PYSHAPES', format version (uint32), record count and
+             coordinate count (uint64 each)
+    kinds    one uint8 kind code per record, padded to a multiple of 8 bytes
+    offsets  record count + 1 int64 offsets into the coordinate block
+    coords   the float64 coordinates of every record back to back
+
+ShapeFile maps the file into memory and reads the arrays in place through
+memoryviews, so opening a file costs the same no matter how big it is.
+Shape objects are only built when a record is asked for."""
+import mmap
+import struct
+import sys
+
+import codec
+
+MAGIC = b'PYSHAPES'
+VERSION = 1
+_HEADER = struct.Struct('<8sIxxxxQQ')
+
+
+def _padded(n, size=8):
+    return (n + size - 1) // size * size
+
+def _little_endian(arr):
+    if sys.byteorder != 'little':
+        arr = arr[:]
+        arr.byteswap()
+    return arr
+
+
+def write_shapes(path, shapes):
+    """ Writes the shapes to a new file at path """
+    kinds, offsets, coords = codec.pack(shapes)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(kinds), len(coords)))
+        f.write(kinds.tobytes())
+        f.write(b'\0' * (_padded(len(kinds)) - len(kinds)))
+        f.write(_little_endian(offsets).tobytes())
+        f.write(_little_endian(coords).tobytes())
+
+
+class ShapeFile(object):
+    """A read-only view of a shape file. It behaves like a sequence of shapes,
+    building each one from the mapped coordinates when it is indexed.
+    kinds, offsets and coords are memoryviews straight onto the file.
+
+    Close the file when done with it, or use it as a context manager."""
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise NotImplementedError("Shape files can only be mapped on "
+                                      "little-endian machines")
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError("{0} is not a shape file".format(path))
+        magic, version, count, ncoords = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError("{0} is not a shape file".format(path))
+        if version != VERSION:
+            self._map.close()
+            raise ValueError("Unsupported shape file version {0}".format(version))
+
+        expected = _HEADER.size + _padded(count) + 8 * (count + 1) + 8 * ncoords
+        if len(self._map) != expected:
+            self._map.close()
+            raise ValueError("{0} should hold {1} bytes but holds {2}; it may "
+                             "have been cut short".format(path, expected,
+                                                          len(self._map)))
+        self._count = count
+        self._ncoords = ncoords
+        self._views()
+
+    def _views(self):
+        view = memoryview(self._map)
+        count, start = self._count, _HEADER.size
+        self.kinds = view[start:start + count]
+        start += _padded(count)
+        self.offsets = view[start:start + 8 * (count + 1)].cast('q')
+        start += 8 * (count + 1)
+        self.coords = view[start:start + 8 * self._ncoords].cast('d')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("shape index out of range")
+        return codec.decode(self.kinds[i], self.record_coords(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def record_coords(self, i):
+        """ Returns a memoryview of the coordinates of record i, without
+        copying them """
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    def close(self):
+        """ Releases the memory map. Every view taken from the file, such as
+        those returned by record_coords(), has to be released first;
+        otherwise BufferError is raised and the file stays open and usable."""
+        if self._map is not None:
+            for view in (self.kinds, self.offsets, self.coords):
+                view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                self._views()
+                raise BufferError("Can't close the shape file while views "
+                                  "taken from it are still in use")
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,89 @@
+"""Lazily tests a stream of shapes against a fixed set of reference shapes.
+
+stream_intersections pulls one shape at a time from any iterable, so the
+input can be far bigger than memory: only the reference shapes, held in a
+ShapeIndex, are ever kept around. Shapes can be read lazily from a text
+file with one record per line:
+
+    <id> <kind> <coordinate> <coordinate> ...
+
+where kind is one of circle, segment, line or polygon and the coordinates
+are laid out as described in codec.py; a polygon needs at least one
+vertex. Blank lines and lines starting with '#' are skipped, and any other
+line that doesn't fit this layout raises ValueError."""
+import codec
+from index import ShapeIndex
+
+KIND_NAMES = {
+    codec.CIRCLE: 'circle',
+    codec.SEGMENT: 'segment',
+    codec.LINE: 'line',
+    codec.POLYGON: 'polygon',
+}
+KINDS = dict((name, kind) for kind, name in KIND_NAMES.items())
+# How many coordinates each kind of record has; polygons have two per vertex
+COORD_COUNTS = {
+    codec.CIRCLE: 3,
+    codec.SEGMENT: 4,
+    codec.LINE: 3,
+}
+
+
+def stream_intersections(records, reference, cell_size=None):
+    """ Yields (id, j) for every shape in records that intersects reference
+    shape j. records is an iterable of (id, shape) pairs, which is consumed
+    one pair at a time. reference is either a ShapeIndex or a sequence of
+    shapes to build one from."""
+    if not isinstance(reference, ShapeIndex):
+        reference = ShapeIndex(reference, cell_size)
+    for record_id, shape in records:
+        for j in reference.query(shape):
+            yield record_id, j
+
+
+def parse_record(line):
+    """ Returns the (id, shape) pair described by one line of a record file """
+    fields = line.split()
+    if len(fields) < 2:
+        raise ValueError("Malformed shape record: {0!r}".format(line))
+    try:
+        kind = KINDS[fields[1]]
+    except KeyError:
+        raise ValueError("Unknown shape kind {0!r}".format(fields[1]))
+    coords = [float(v) for v in fields[2:]]
+    if kind == codec.POLYGON:
+        malformed = len(coords) < 2 or len(coords) % 2
+    else:
+        malformed = len(coords) != COORD_COUNTS[kind]
+    if malformed:
+        raise ValueError("Malformed shape record: {0!r}".format(line))
+    return fields[0], codec.decode(kind, coords)
+
+def format_record(record_id, shape):
+    """ Returns the line of a record file describing a shape """
+    kind, coords = codec.encode(shape)
+    return " ".join([str(record_id), KIND_NAMES[kind]] +
+                    [repr(float(v)) for v in coords])
+
+def read_records(source):
+    """ Yields (id, shape) pairs from a record file, given either its path or
+    an open file. Ids are returned as strings."""
+    if isinstance(source, str):
+        with open(source) as f:
+            for record in read_records(f):
+                yield record
+        return
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield parse_record(line)
+
+def write_records(target, records):
+    """ Writes (id, shape) pairs to a record file, given either its path or an
+    open file """
+    if isinstance(target, str):
+        with open(target, 'w') as f:
+            write_records(f, records)
+        return
+    for record_id, shape in records:
+        target.write(format_record(record_id, shape) + "\n")
@@ -0,0 +1,191 @@
+"""Sweep-line intersection tests for large sets of line segments.
+
+Testing every segment against every other segment is quadratic, which is
+far too slow for polygons with thousands of vertices. segments_intersect
+runs the Shamos-Hoey sweep instead: a vertical line sweeps from left to
+right, keeping the segments it currently crosses sorted by height. Two
+segments can only be the leftmost crossing if they are neighbours in that
+order at some point, so only neighbours ever need an exact test. This
+answers "is there any crossing?" in O(n log n).
+
+segments_intersect and segment_intersections take an optional second list
+of segments. When given, only crossings between a segment from the first
+list and one from the second are counted, which is what polygon-polygon
+tests need: the edges of a polygon always touch their neighbours at the
+shared vertices. chain_crosses_itself runs the same sweep over the edges of
+a single polygon, leaving out neighbours that only meet where they join, to
+tell whether the polygon is simple."""
+import shapes
+
+INF = float('inf')
+
+# Event kinds, in the order they are processed at the same x-coordinate.
+# Segments that start at x go in first and segments that end at x come out
+# last, so that segments touching at x are in the sweep together.
+_START, _VERTICAL, _END = 0, 1, 2
+
+
+class _Segment(object):
+    """The coordinates of a segment ordered from left to right, along with
+    the list it came from"""
+    def __init__(self, segment, color, number):
+        p = segment.endpoint1.cartesian_pair()
+        q = segment.endpoint2.cartesian_pair()
+        if q < p:
+            p, q = q, p
+        self.x1, self.y1 = p
+        self.x2, self.y2 = q
+        self.slope = segment.slope
+        self.segment = segment
+        self.color = color
+        self.number = number
+
+    def y_at(self, x):
+        """ Returns the height of the segment where it crosses x """
+        if x == self.x1 or self.slope == INF:
+            return self.y1
+        elif x == self.x2:
+            return self.y2
+        return self.y1 + self.slope * (x - self.x1)
+
+
+def _prepare(segments, others):
+    prepared = [_Segment(s, 0, i) for i, s in enumerate(segments)]
+    if others is not None:
+        prepared.extend(_Segment(s, 1, i) for i, s in enumerate(others))
+    return prepared
+
+def _counts(a, b, two_lists):
+    """ Returns whether a crossing between a and b should be counted """
+    return not two_lists or a.color != b.color
+
+def _crosses(a, b, two_lists):
+    return _counts(a, b, two_lists) and \
+            shapes.linesegment_linesegment_intersect(a.segment, b.segment)
+
+def _events(prepared):
+    events = []
+    for seg in prepared:
+        if seg.x1 == seg.x2:
+            events.append((seg.x1, _VERTICAL, seg.y1, seg))
+        else:
+            events.append((seg.x1, _START, seg.y1, seg))
+            events.append((seg.x2, _END, seg.y2, seg))
+    events.sort(key=lambda event: event[:3])
+    return events
+
+def _lower_bound(status, x, key):
+    """ Returns the first position in the sweep status whose (height, slope)
+    at x is not less than key """
+    lo, hi = 0, len(status)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        seg = status[mid]
+        if (seg.y_at(x), seg.slope) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _sweep(prepared, crosses):
+    """ Runs the Shamos-Hoey sweep over the prepared segments, returning
+    True as soon as crosses(a, b) does for two neighbours in the sweep """
+    status = []
+    for x, kind, y, seg in _events(prepared):
+        if kind == _START:
+            pos = _lower_bound(status, x, (y, seg.slope))
+            status.insert(pos, seg)
+            if pos > 0 and crosses(status[pos - 1], seg):
+                return True
+            if pos + 1 < len(status) and crosses(seg, status[pos + 1]):
+                return True
+        elif kind == _VERTICAL:
+            # A vertical segment can cross any run of segments in the sweep,
+            # so test all those whose height at x falls in its range
+            pos = _lower_bound(status, x, (seg.y1, -INF))
+            while pos < len(status) and status[pos].y_at(x) <= seg.y2:
+                if crosses(seg, status[pos]):
+                    return True
+                pos += 1
+        else:
+            pos = status.index(seg)
+            del status[pos]
+            if 0 < pos < len(status) and crosses(status[pos - 1], status[pos]):
+                return True
+    return False
+
+def segments_intersect(segments, others=None):
+    """ Returns True if any two of the given LineSegments intersect. If others
+    is given, returns True if any segment in segments intersects any segment
+    in others. Segments are compared with linesegment_linesegment_intersect.
+
+    The sweep relies on the segments that are tested against each other not
+    crossing before the first crossing it reports, so when others is given,
+    neither list may cross itself (the edges of a simple polygon are fine)."""
+    two_lists = others is not None
+    return _sweep(_prepare(segments, others),
+                  lambda a, b: _crosses(a, b, two_lists))
+
+def _neighbours_overlap(a, b):
+    """ Returns true if two segments sharing an endpoint run along each other
+    beyond it, rather than meeting only there """
+    for vx, vy, px, py in ((a.x1, a.y1, a.x2, a.y2), (a.x2, a.y2, a.x1, a.y1)):
+        for wx, wy, qx, qy in ((b.x1, b.y1, b.x2, b.y2), (b.x2, b.y2, b.x1, b.y1)):
+            if vx == wx and vy == wy:
+                return shapes._orientation(vx, vy, px, py, qx, qy) == 0 and \
+                        (px - vx) * (qx - vx) + (py - vy) * (qy - vy) > 0
+    return False
+
+def chain_crosses_itself(segments):
+    """ Returns True if the given LineSegments, each one running on from the
+    one before and the last back to the first, like the edges of a polygon,
+    meet anywhere other than where neighbours join. This is the same sweep
+    as segments_intersect, so a polygon can be checked for being simple in
+    O(n log n)."""
+    n = len(segments)
+    def crosses(a, b):
+        if (a.number - b.number) % n in (1, n - 1):
+            return _neighbours_overlap(a, b)
+        return shapes.linesegment_linesegment_intersect(a.segment, b.segment)
+    return _sweep(_prepare(segments, None), crosses)
+
+def segment_intersections(segments, others=None):
+    """ Returns a list of (i, j, (x, y)) tuples, one for every pair of
+    intersecting segments, where i and j are positions in the given lists
+    and (x, y) is the crossing point, or for segments lying along each other
+    (which only robust mode counts as meeting) the leftmost point they share.
+    Without others, each pair is reported once with i < j; with others, i
+    indexes segments and j indexes others.
+
+    Reporting every crossing cannot stay O(n log n) when there are many of
+    them, so this sweeps over x keeping only the segments whose x-ranges
+    overlap the sweep line, and only tests those whose y-ranges overlap too.
+    """
+    two_lists = others is not None
+    prepared = _prepare(segments, others)
+    prepared.sort(key=lambda seg: seg.x1)
+    active = []
+    found = []
+    for seg in prepared:
+        active = [other for other in active if other.x2 >= seg.x1]
+        ylo, yhi = min(seg.y1, seg.y2), max(seg.y1, seg.y2)
+        for other in active:
+            if max(other.y1, other.y2) < ylo or min(other.y1, other.y2) > yhi:
+                continue
+            if not _crosses(seg, other, two_lists):
+                continue
+            a, b = (other, seg) if (other.color, other.number) < \
+                    (seg.color, seg.number) else (seg, other)
+            point = shapes.line_line_intersection(a.segment, b.segment)
+            if point is None:
+                # Only the exact tests in robust.py count segments lying
+                # along each other as meeting; report where the overlap
+                # starts, the later of their left ends
+                found.append((a.number, b.number,
+                              max((a.x1, a.y1), (b.x1, b.y1))))
+            else:
+                found.append((a.number, b.number, point.cartesian_pair()))
+        active.append(seg)
+    found.sort(key=lambda item: item[:2])
+    return found
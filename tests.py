@@ -1,12 +1,58 @@
+import asyncio
+import copy
+import io
+import math
+import json
+import pickle
+import os
+import random
+import shutil
+import tempfile
+from fractions import Fraction
 import unittest
 from math import pi
 from shapes import Cartesian, Polar, Line, LineByPoints, LineBySlope, LineSegment
-from shapes import Circle, Polygon
+from shapes import Circle, Polygon, bbox_stats, reset_bbox_stats
+from shapes import Shape, intersect, register_intersect, register_intersection, \
+        intersect_function
 from shapes import line_line_intersect, line_line_intersection, line_linesegment_intersect, \
         line_circle_intersect, line_polygon_intersect, circle_circle_intersect, \
         circle_linesegment_intersect, circle_polygon_intersect, \
         linesegment_linesegment_intersect, linesegment_polygon_intersect, \
         polygon_polygon_intersect
+from shapes import line_linesegment_intersection, line_circle_intersection, \
+        line_polygon_intersection, circle_circle_intersection, \
+        circle_linesegment_intersection, circle_polygon_intersection, \
+        linesegment_linesegment_intersection, linesegment_polygon_intersection, \
+        polygon_polygon_intersection
+from shapes import point_in_polygon, circle_in_polygon, polygon_in_polygon, \
+        xy_in_polygon, convex_hull, circle_convex_polygon_overlap
+from shapes import distance, register_distance
+
+import codec
+from index import ShapeIndex
+import locate
+from locate import PolygonLocator
+import instrument
+from memo import PairCache
+from nearest import NearestIndex
+import shapes
+import parallel
+import polar
+import robust
+from scene import Scene, translated, scaled
+from service import IntersectionService
+import simplify
+import storage
+import stream
+import sweep
+
+try:
+    import numpy
+    import batch
+    import benchmarks
+except ImportError:
+    numpy = None
 
 
 class PolarPointsTestCases(unittest.TestCase):
@@ -50,6 +96,89 @@ class CartesianPointsTestCases(unittest.TestCase):
     def test_number_on_the_positive_y_axis_is_half_pi(self):
         self.assertAlmostEqual(self.cart3.theta, pi/2)
 
+    def test_cartesian_keeps_its_conversion(self):
+        self.assertIs(self.cart5.polar_pair(), self.cart5.polar_pair())
+        self.assertAlmostEqual(self.cart5.r, math.sqrt(13))
+        self.assertEqual(self.cart5.theta, math.atan2(2, -3))
+
+
+class PolarPredicatesTestCases(unittest.TestCase):
+    def setUp(self):
+        self.points = [Polar(5, pi/4), Polar(-5, pi/4), Cartesian(3, 4),
+                       Polar(0, 1), Polar(2, 3 * pi/2)]
+
+    def test_distance(self):
+        for p in self.points:
+            for q in self.points:
+                self.assertAlmostEqual(polar.distance(p, q), p.distance_to_point(q))
+        self.assertEqual(polar.polar_distance(3, 1, 3, 1), 0)
+        self.assertAlmostEqual(polar.polar_distance(3, 0, 4, pi/2), 5)
+
+    def test_annulus(self):
+        self.assertEqual([polar.in_annulus(p, 2, 5) for p in self.points],
+                         [True, True, True, False, True])
+        self.assertFalse(polar.in_annulus(Polar(5.5, 0), 2, 5))
+
+    def test_sector(self):
+        # A sector wrapping past theta = pi, from north-west round to south
+        start, end = 3 * pi/4, 3 * pi/2
+        self.assertEqual([polar.in_sector(p, start, end) for p in self.points],
+                         [False, True, False, True, True])
+        self.assertFalse(polar.in_sector(Polar(-5, pi/4), start, end, r_max=4))
+        self.assertFalse(polar.in_sector(Polar(0, 1), start, end, r_min=1))
+        self.assertTrue(polar.in_sector(Polar(1, 0.1), 0, 2 * pi))
+        self.assertTrue(polar.in_sector(Polar(1, -0.1), 3 * pi/2, pi/4))
+        self.assertFalse(polar.in_sector(Polar(1, pi), 3 * pi/2, pi/4))
+
+    def test_in_circle_matches_point_in_circle(self):
+        rng = random.Random(21)
+        for i in range(200):
+            point = Polar(rng.uniform(-10, 10), rng.uniform(-pi, pi))
+            circle = Circle(Cartesian(rng.uniform(-10, 10), rng.uniform(-10, 10)),
+                            rng.uniform(1, 5))
+            self.assertEqual(polar.in_circle(point, circle),
+                             circle.point_in_circle(point))
+
+
+class CompactShapesTestCases(unittest.TestCase):
+    """Shapes use __slots__ and can't be changed once created"""
+    def setUp(self):
+        self.segment = LineSegment(Cartesian(0, 0), Cartesian(3, 4))
+        self.circle = Circle(Polar(2, pi/2), 3)
+
+    def test_no_instance_dict(self):
+        for obj in (Cartesian(1, 2), Polar(1, 2), self.segment, self.circle,
+                    LineBySlope(Cartesian(0, 0), 2), Polygon(Cartesian(0, 0))):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_attributes_cant_be_set(self):
+        point = Cartesian(1, 2)
+        with self.assertRaises(AttributeError):
+            point.x = 5
+        with self.assertRaises(AttributeError):
+            self.segment.endpoint1 = point
+        with self.assertRaises(AttributeError):
+            self.circle.radius = 1
+        with self.assertRaises(AttributeError):
+            del self.circle.center
+        self.assertEqual(point.x, 1)
+
+    def test_polar_keeps_its_conversion(self):
+        point = self.circle.center
+        self.assertIs(point.cartesian_pair(), point.cartesian_pair())
+        self.assertAlmostEqual(point.x, 0)
+        self.assertAlmostEqual(point.y, 2)
+
+    def test_pickle_and_copy(self):
+        for obj in (self.segment, self.circle):
+            for clone in (pickle.loads(pickle.dumps(obj)), copy.deepcopy(obj)):
+                self.assertIsNot(clone, obj)
+                self.assertEqual(clone.x, obj.x)
+                self.assertEqual(clone.y, obj.y)
+        clone = pickle.loads(pickle.dumps(self.segment))
+        self.assertEqual(clone.endpoint2.cartesian_pair(), (3, 4))
+        self.assertEqual(clone.slope, self.segment.slope)
+
 
 class LinesTestCases(unittest.TestCase):
     """Test cases with only lines"""
@@ -98,6 +227,9 @@ class CirclesTestCases(unittest.TestCase):
     def test_perimeter(self):
         self.assertAlmostEqual(self.circ1.perimeter(), 2*pi)
 
+    def test_area(self):
+        self.assertAlmostEqual(self.circ.area(), 25 * pi)
+
     def test_edge_of_circle_in_circle(self):
         test_point = Cartesian(5, 0)
         self.assertTrue(self.circ.point_in_circle(test_point))
@@ -166,6 +298,31 @@ class PolygonTestCases(unittest.TestCase):
                         self.p11,
                         self.p12)
 
+    def test_perimeter(self):
+        self.assertEqual(self.poly1.perimeter(), 8)
+        self.assertAlmostEqual(self.poly2.perimeter(), 6 * math.sqrt(2))
+        self.assertEqual(Polygon(self.p1).perimeter(), 0)
+        self.assertEqual(Polygon(self.p1, self.p2).perimeter(), 4)
+
+    def test_area(self):
+        self.assertEqual(self.poly1.area(), 4)
+        self.assertEqual(self.poly3.area(), 6)
+        self.assertEqual(Polygon(*reversed(self.poly3.vertices)).area(), 6)
+        self.assertEqual(self.poly2.area(), 4)
+        self.assertEqual(Polygon(self.p1, self.p2).area(), 0)
+        self.assertEqual(Polygon().area(), 0)
+
+    def test_centroid(self):
+        self.assertEqual(self.poly1.centroid(), Cartesian(2, 1))
+        self.assertEqual(self.poly3.centroid(), Cartesian(0.5, 0))
+        # An L shape, whose centroid is pulled towards its larger arm
+        ell = Polygon(Cartesian(0, 0), Cartesian(4, 0), Cartesian(4, 1),
+                      Cartesian(1, 1), Cartesian(1, 2), Cartesian(0, 2))
+        self.assertAlmostEqual(ell.centroid().x, 1.7)
+        self.assertAlmostEqual(ell.centroid().y, 0.7)
+        self.assertEqual(Polygon(self.p1, self.p2).centroid(), Cartesian(1, 1))
+        self.assertRaises(ValueError, Polygon().centroid)
+
     def test_poly1_poly2_intersect(self):
         self.assertTrue(self.poly1.intersect(self.poly2))
         self.assertTrue(self.poly2.intersect(self.poly1))
@@ -178,6 +335,21 @@ class PolygonTestCases(unittest.TestCase):
         self.assertFalse(self.poly2.intersect(self.poly3))
         self.assertFalse(self.poly3.intersect(self.poly2))
 
+    def test_coords_are_flat(self):
+        self.assertEqual(list(self.poly1.coords), [1, 0, 1, 2, 3, 2, 3, 0])
+
+    def test_edges_are_cached(self):
+        edges = self.poly1.edges()
+        self.assertEqual(len(edges), 4)
+        self.assertIs(self.poly1.edges(), edges)
+
+    def test_new_vertices_discard_cached_edges(self):
+        edges = self.poly1.edges()
+        self.poly1.vertices = [self.p1, self.p2, self.p3]
+        self.assertEqual(len(self.poly1.edges()), 3)
+        self.assertEqual(list(self.poly1.coords), [1, 0, 1, 2, 3, 2])
+        self.assertEqual(self.poly1.edges()[0].endpoint1, self.p3)
+
 
 class DifferentObjectsTests(unittest.TestCase):
     def setUp(self):
@@ -206,13 +378,1494 @@ class DifferentObjectsTests(unittest.TestCase):
                         self.p12)
 
     def test_circle_overlapping_polygon_intersect(self):
-        self.assertTrue(self.poly2.intersect(self.circ1))
-        self.assertTrue(self.circ1.intersect(self.poly2))
+        # circ1 stops sqrt(2) - 1 short of poly2's nearest edge
+        self.assertFalse(self.poly2.intersect(self.circ1))
+        self.assertFalse(self.circ1.intersect(self.poly2))
+        bigger = Circle(self.p1, 1.5)
+        self.assertTrue(self.poly2.intersect(bigger))
+        self.assertTrue(bigger.intersect(self.poly2))
+
+    def test_circle_linesegment_intersect(self):
+        segment = LineSegment(Cartesian(-10, 1), Cartesian(10, 2))
+        self.assertTrue(self.circ.intersect(segment))
+        self.assertTrue(segment.intersect(self.circ))
+        self.assertEqual(len(self.circ.intersection(segment)), 2)
+        self.assertEqual(distance(self.circ, segment), 0)
+        self.assertFalse(self.circ2.intersect(segment))
+        # Near the circle's line, but stopping short of the circle
+        self.assertFalse(self.circ.intersect(LineSegment(Cartesian(6, 1),
+                                                         Cartesian(10, 2))))
 
     def test_circle_not_overlapping_polygon_dont_intersect(self):
         self.assertFalse(self.poly2.intersect(self.circ2))
         self.assertFalse(self.circ2.intersect(self.poly2))
 
 
+def random_scene(rng, n, extent=50):
+    """Returns a list of small random segments, quadrilaterals and circles"""
+    def point(x, y, size):
+        return Cartesian(x + rng.uniform(-size, size), y + rng.uniform(-size, size))
+    scene = []
+    for i in range(n):
+        x, y = rng.uniform(-extent, extent), rng.uniform(-extent, extent)
+        kind = i % 3
+        if kind == 0:
+            scene.append(LineSegment(point(x, y, 4), point(x, y, 4)))
+        elif kind == 1:
+            scene.append(Polygon(point(x - 2, y - 2, 1), point(x - 2, y + 2, 1),
+                                 point(x + 2, y + 2, 1), point(x + 2, y - 2, 1)))
+        else:
+            scene.append(Circle(Cartesian(x, y), rng.uniform(0.5, 3)))
+    return scene
+
+
+class IntersectionPointsTestCases(unittest.TestCase):
+    def setUp(self):
+        self.square = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(2, 2),
+                              Cartesian(2, 0))
+        self.unit = Circle(Cartesian(0, 0), 1)
+
+    def assertPointsAlmostEqual(self, points, expected):
+        self.assertEqual(len(points), len(expected))
+        for (x, y), (ex, ey) in zip(sorted(points), sorted(expected)):
+            self.assertAlmostEqual(x, ex)
+            self.assertAlmostEqual(y, ey)
+
+    def test_line_linesegment(self):
+        segment = LineSegment(Cartesian(0, -1), Cartesian(0, 1))
+        self.assertEqual(line_linesegment_intersection(
+            LineBySlope(Cartesian(-1, 0), 0), segment), ((0, 0),))
+        self.assertEqual(line_linesegment_intersection(
+            LineBySlope(Cartesian(-1, 5), 0), segment), ())
+
+    def test_line_circle(self):
+        self.assertPointsAlmostEqual(line_circle_intersection(
+            LineBySlope(Cartesian(5, 0), 0), self.unit), [(-1, 0), (1, 0)])
+        self.assertPointsAlmostEqual(line_circle_intersection(
+            LineByPoints(Cartesian(1, 0), Cartesian(1, 3)), self.unit), [(1, 0)])
+        self.assertEqual(line_circle_intersection(
+            LineBySlope(Cartesian(0, 3), 1), self.unit), ())
+
+    def test_circle_circle(self):
+        self.assertPointsAlmostEqual(circle_circle_intersection(
+            self.unit, Circle(Cartesian(1, 0), 1)),
+            [(0.5, 3**0.5 / 2), (0.5, -3**0.5 / 2)])
+        self.assertPointsAlmostEqual(circle_circle_intersection(
+            self.unit, Circle(Cartesian(3, 0), 2)), [(1, 0)])
+        # Nested circles intersect, but their outlines never meet
+        nested = Circle(Cartesian(0.1, 0), 0.2)
+        self.assertTrue(circle_circle_intersect(self.unit, nested))
+        self.assertEqual(circle_circle_intersection(self.unit, nested), ())
+
+    def test_circle_linesegment(self):
+        segment = LineSegment(Cartesian(0, 0), Cartesian(3, 0))
+        self.assertPointsAlmostEqual(circle_linesegment_intersection(
+            self.unit, segment), [(1, 0)])
+
+    def test_polygons(self):
+        self.assertEqual(sorted(line_polygon_intersection(
+            LineBySlope(Cartesian(0, 0), 1), self.square)), [(0, 0), (2, 2)])
+        self.assertEqual(sorted(linesegment_polygon_intersection(
+            LineSegment(Cartesian(1, 1), Cartesian(1, 5)), self.square)), [(1, 2)])
+        self.assertPointsAlmostEqual(circle_polygon_intersection(
+            Circle(Cartesian(0, 0), 1), self.square), [(0, 1), (1, 0)])
+        other = Polygon(Cartesian(1, 1), Cartesian(1, 3), Cartesian(3, 3),
+                        Cartesian(3, 1))
+        self.assertEqual(sorted(polygon_polygon_intersection(self.square, other)),
+                         [(1, 2), (2, 1)])
+
+    def test_large_polygons_use_the_sweep(self):
+        rng = random.Random(233)
+        poly1 = random_star_polygon(rng, 30, 0, 0, 10)
+        poly2 = random_star_polygon(rng, 30, 8, 0, 10)
+        expected = set()
+        for e1 in poly1.edges():
+            for e2 in poly2.edges():
+                expected.update(linesegment_linesegment_intersection(e1, e2))
+        self.assertEqual(set(polygon_polygon_intersection(poly1, poly2)), expected)
+
+    def test_methods_dispatch(self):
+        segment = LineSegment(Cartesian(-2, 0.5), Cartesian(5, 0.5))
+        self.assertEqual(len(self.unit.intersection(segment)), 2)
+        self.assertEqual(len(segment.intersection(self.unit)), 2)
+        self.assertEqual(self.square.intersection(segment),
+                         segment.intersection(self.square))
+        self.assertEqual(LineBySlope(Cartesian(0, 0), 1).intersection(
+            LineBySlope(Cartesian(0, 2), -1)), ((1, 1),))
+        self.assertEqual(self.unit.intersection(Circle(Cartesian(9, 9), 1)), ())
+
+
+class Dot(Shape):
+    """A third-party shape type used to test registering new predicates"""
+    __slots__ = ('point',)
+
+    def __init__(self, point):
+        self.point = point
+
+    def bbox(self):
+        return self.point.bbox()
+
+def dot_circle_intersect(dot, circle):
+    return circle.point_in_circle(dot.point)
+
+
+class DispatchTestCases(unittest.TestCase):
+    def setUp(self):
+        register_intersect(Dot, Circle, dot_circle_intersect)
+        register_intersection(Dot, Circle,
+                lambda dot, circle: (dot.point.cartesian_pair(),)
+                if dot_circle_intersect(dot, circle) else ())
+        self.circle = Circle(Cartesian(0, 0), 2)
+
+    def test_registered_pairs_work_both_ways(self):
+        dot = Dot(Cartesian(1, 1))
+        self.assertTrue(dot.intersect(self.circle))
+        self.assertTrue(self.circle.intersect(dot))
+        self.assertTrue(intersect(self.circle, dot))
+        self.assertEqual(self.circle.intersection(dot), ((1, 1),))
+        self.assertFalse(Dot(Cartesian(1.5, 1.5)).intersect(self.circle))
+
+    def test_unregistered_pairs(self):
+        self.assertRaises(TypeError, Dot(Cartesian(0, 0)).intersect,
+                          Polygon(Cartesian(0, 0), Cartesian(1, 1)))
+
+    def test_subclasses_use_their_bases_functions(self):
+        line = LineByPoints(Cartesian(0, 0), Cartesian(1, 1))
+        segment = LineSegment(Cartesian(0, 1), Cartesian(1, 0))
+        self.assertIs(intersect_function(LineSegment, LineSegment),
+                      linesegment_linesegment_intersect)
+        self.assertIs(intersect_function(LineByPoints, LineBySlope),
+                      line_line_intersect)
+        self.assertTrue(line.intersect(segment))
+        self.assertTrue(segment.intersect(line))
+
+    def test_polygon_and_line(self):
+        square = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(2, 2),
+                         Cartesian(2, 0))
+        line = LineBySlope(Cartesian(0, 1), 0.5)
+        self.assertTrue(square.intersect(line))
+        self.assertTrue(line.intersect(square))
+        self.assertEqual(square.intersection(line), line.intersection(square))
+
+
+class BoundingBoxTestCases(unittest.TestCase):
+    def setUp(self):
+        reset_bbox_stats()
+
+    def test_bounding_boxes(self):
+        self.assertEqual(Circle(Cartesian(1, 2), 3).bbox(), (-2, -1, 4, 5))
+        self.assertEqual(LineSegment(Cartesian(3, -1), Cartesian(1, 2)).bbox(),
+                         (1, -1, 3, 2))
+        self.assertEqual(LineByPoints(Cartesian(2, 0), Cartesian(2, 1)).bbox(),
+                         (2, float('-inf'), 2, float('inf')))
+        self.assertEqual(Polygon(Cartesian(1, 0), Cartesian(3, 2), Cartesian(0, 1)).bbox(),
+                         (0, 0, 3, 2))
+        self.assertEqual(Cartesian(4, 5).bbox(), (4, 5, 4, 5))
+
+    def test_bbox_is_cached(self):
+        circle = Circle(Cartesian(1, 2), 3)
+        self.assertIs(circle.bbox(), circle.bbox())
+
+    def test_polygon_bbox_follows_vertices(self):
+        poly = Polygon(Cartesian(1, 0), Cartesian(3, 2))
+        poly.bbox()
+        poly.vertices = [Cartesian(5, 5), Cartesian(6, 7)]
+        self.assertEqual(poly.bbox(), (5, 5, 6, 7))
+
+    def test_distant_shapes_are_rejected_early(self):
+        circle = Circle(Cartesian(0, 0), 1)
+        square = Polygon(Cartesian(10, 10), Cartesian(10, 12), Cartesian(12, 12),
+                         Cartesian(12, 10))
+        self.assertFalse(circle.intersect(square))
+        self.assertFalse(square.intersect(circle))
+        self.assertEqual(bbox_stats, {'checks': 2, 'rejects': 2})
+        self.assertTrue(circle.intersect(Circle(Cartesian(1, 1), 1)))
+        self.assertEqual(bbox_stats, {'checks': 3, 'rejects': 2})
+
+    def test_parallel_horizontal_lines(self):
+        line1 = LineBySlope(Cartesian(0, 0), 0)
+        line2 = LineBySlope(Cartesian(0, 1), 0)
+        self.assertFalse(line1.intersect(line2))
+        self.assertEqual(bbox_stats['rejects'], 1)
+
+
+class InstrumentTestCases(unittest.TestCase):
+    def setUp(self):
+        # Not convex, so testing it against other goes through the edges
+        self.notched = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(1, 1.5),
+                              Cartesian(2, 2), Cartesian(2, 0))
+        self.other = Polygon(Cartesian(1, 1), Cartesian(1, 3), Cartesian(3, 3),
+                             Cartesian(3, 1))
+        self.circle = Circle(Cartesian(5, 5), 1)
+
+    def test_records_calls_per_pair(self):
+        with instrument.profiling() as profile:
+            self.assertTrue(intersect(self.notched, self.other))
+            self.assertFalse(intersect(self.circle, Circle(Cartesian(9, 5), 1)))
+            self.assertEqual(len(self.notched.intersection(self.other)), 2)
+            shapes.polygon_polygon_intersect(self.notched, self.other)
+        stats = profile.stats[('intersect', 'Polygon', 'Polygon')]
+        self.assertEqual(stats.calls, 2)
+        self.assertTrue(stats.edge_tests > 0)
+        self.assertEqual(sum(stats.histogram.values()), 2)
+        self.assertTrue(0 < stats.percentile(0.5) <= stats.percentile(0.99))
+        self.assertEqual(profile.stats[('intersection', 'Polygon', 'Polygon')].calls, 1)
+        # The circles' bounding boxes are apart, so no predicate ran
+        self.assertFalse(('intersect', 'Circle', 'Circle') in profile.stats)
+
+        rows = profile.as_dict()
+        self.assertEqual(json.loads(json.dumps(rows)), rows)
+        self.assertEqual([row['operation'] for row in rows],
+                         ['intersect', 'intersection'])
+        self.assertTrue('Polygon-Polygon' in profile.report())
+
+    def test_off_restores_the_originals(self):
+        registry = dict(shapes._intersect_registry)
+        predicate = shapes.polygon_polygon_intersect
+        with instrument.profiling():
+            self.assertNotEqual(shapes.polygon_polygon_intersect, predicate)
+            self.assertRaises(RuntimeError, instrument.enable)
+        self.assertEqual(shapes._intersect_registry, registry)
+        self.assertEqual(shapes.polygon_polygon_intersect, predicate)
+        self.assertEqual(instrument.disable(), None)
+        self.assertTrue(intersect(self.notched, self.other))
+
+    def test_registering_while_profiling(self):
+        with instrument.profiling() as profile:
+            shapes.register_intersect(Dot, Circle, dot_circle_intersect)
+            shapes.register_intersection(Dot, Circle, lambda dot, circle: ())
+            self.assertTrue(intersect(Dot(Cartesian(5, 5)), self.circle))
+        self.assertIs(shapes.register_intersect, register_intersect)
+        self.assertEqual(profile.stats, {})
+
+
+class ValueEqualityTestCases(unittest.TestCase):
+    def test_equal_shapes_hash_equal(self):
+        pairs = [
+            (Cartesian(1, 2), Cartesian(1.0, 2.0)),
+            (Polar(1, 0), Cartesian(1, 0)),
+            (Circle(Cartesian(1, 2), 3), Circle(Cartesian(1, 2), 3)),
+            (LineSegment(Cartesian(0, 0), Cartesian(1, 1)),
+             LineSegment(Cartesian(0, 0), Cartesian(1, 1))),
+            (LineBySlope(Cartesian(0, 0), 1),
+             LineByPoints(Cartesian(0, 0), Cartesian(1, 1))),
+            (Polygon(Cartesian(0, 0), Cartesian(1, 1), Cartesian(1, 0)),
+             Polygon(Cartesian(0, 0), Cartesian(1, 1), Cartesian(1, 0))),
+        ]
+        for a, b in pairs:
+            self.assertEqual(a, b)
+            self.assertEqual(hash(a), hash(b))
+            self.assertEqual(len(set([a, b])), 1)
+
+    def test_different_shapes_are_unequal(self):
+        segment = LineSegment(Cartesian(0, 0), Cartesian(1, 1))
+        self.assertNotEqual(segment, LineSegment(Cartesian(1, 1), Cartesian(0, 0)))
+        self.assertNotEqual(segment, LineBySlope(Cartesian(0, 0), 1))
+        self.assertNotEqual(Circle(Cartesian(0, 0), 1), Circle(Cartesian(0, 0), 2))
+        self.assertNotEqual(Cartesian(0, 0), (0, 0))
+        dot = Dot(Cartesian(0, 0))
+        self.assertEqual(dot, dot)
+        self.assertNotEqual(dot, Dot(Cartesian(0, 0)))
+
+    def test_changing_a_polygon_changes_its_hash(self):
+        polygon = Polygon(Cartesian(0, 0), Cartesian(1, 1), Cartesian(1, 0))
+        before = hash(polygon)
+        polygon.vertices = [Cartesian(0, 0), Cartesian(2, 2), Cartesian(2, 0)]
+        self.assertNotEqual(hash(polygon), before)
+        self.assertEqual(hash(polygon), hash(Polygon(*polygon.vertices)))
+
+
+class PairCacheTestCases(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        def func(shape1, shape2):
+            self.calls.append((shape1, shape2))
+            return intersect(shape1, shape2)
+        self.cache = PairCache(func, maxsize=2)
+        self.a = Circle(Cartesian(0, 0), 1)
+        self.b = Circle(Cartesian(1, 0), 1)
+        self.c = Circle(Cartesian(9, 0), 1)
+
+    def test_hits_and_misses(self):
+        self.assertTrue(self.cache(self.a, self.b))
+        # An equal pair of new shapes is a hit
+        self.assertTrue(self.cache(Circle(Cartesian(0, 0), 1),
+                                   Circle(Cartesian(1, 0), 1)))
+        self.assertEqual(len(self.calls), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache(self.a, self.b)
+        self.cache(self.a, self.c)
+        self.cache(self.a, self.b)
+        self.cache(self.b, self.c)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertTrue((self.a, self.b) in self.cache)
+        self.assertFalse((self.a, self.c) in self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_invalidate(self):
+        self.cache(self.a, self.b)
+        self.cache(self.b, self.c)
+        self.assertEqual(self.cache.invalidate(Circle(Cartesian(9, 0), 1)), 1)
+        self.assertEqual(self.cache.invalidate(self.c), 0)
+        self.assertEqual(len(self.cache), 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.cache(self.a, self.b)
+        self.assertEqual(len(self.calls), 3)
+        self.assertRaises(ValueError, PairCache, intersect, 0)
+
+    def test_changed_polygons_miss(self):
+        cache = PairCache(intersect)
+        polygon = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(2, 2),
+                          Cartesian(2, 0))
+        self.assertTrue(cache(polygon, self.a))
+        polygon.vertices = [Cartesian(5, 5), Cartesian(5, 6), Cartesian(6, 6)]
+        self.assertFalse(cache(polygon, self.a))
+        self.assertEqual(cache.stats()['misses'], 2)
+
+
+class RobustTestCases(unittest.TestCase):
+    def exact_orientation(self, *coords):
+        ax, ay, bx, by, cx, cy = [Fraction(v) for v in coords]
+        det = (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+        return (det > 0) - (det < 0)
+
+    def test_orient2d_is_exact(self):
+        rng = random.Random(5)
+        robust.reset_filter_stats()
+        for i in range(2000):
+            ax, ay, bx, by = [rng.random() for j in range(4)]
+            t = rng.random()
+            # Nearly collinear points, which floating point often gets wrong
+            coords = (ax, ay, bx, by, ax + t * (bx - ax), ay + t * (by - ay))
+            self.assertEqual(robust.orient2d(*coords), self.exact_orientation(*coords))
+        self.assertTrue(robust.filter_stats['exact'] > 0)
+        robust.reset_filter_stats()
+        for i in range(2000):
+            coords = [rng.uniform(-10, 10) for j in range(6)]
+            self.assertEqual(robust.orient2d(*coords), self.exact_orientation(*coords))
+        self.assertEqual(robust.filter_stats['exact'], 0)
+
+    def test_segments(self):
+        rng = random.Random(6)
+        for i in range(500):
+            a, b, c = [Cartesian(rng.random(), rng.random()) for j in range(3)]
+            # Segments sharing an endpoint always meet
+            self.assertTrue(robust.linesegment_linesegment_intersect(
+                LineSegment(a, b), LineSegment(b, c)))
+        overlapping = (LineSegment(Cartesian(0, 0), Cartesian(2, 2)),
+                       LineSegment(Cartesian(1, 1), Cartesian(3, 3)))
+        self.assertFalse(linesegment_linesegment_intersect(*overlapping))
+        self.assertTrue(robust.linesegment_linesegment_intersect(*overlapping))
+        self.assertFalse(robust.linesegment_linesegment_intersect(
+            LineSegment(Cartesian(0, 0), Cartesian(1, 1)),
+            LineSegment(Cartesian(2, 2), Cartesian(3, 3))))
+        self.assertTrue(robust.line_linesegment_intersect(
+            LineBySlope(Cartesian(0, 0), float('inf')),
+            LineSegment(Cartesian(0, 5), Cartesian(3, 5))))
+        self.assertFalse(robust.line_linesegment_intersect(
+            LineBySlope(Cartesian(0, 0), 1),
+            LineSegment(Cartesian(1, 0), Cartesian(3, 2))))
+
+    def test_circles(self):
+        unit = Circle(Cartesian(0, 0), 1)
+        self.assertTrue(robust.circle_circle_intersect(unit, Circle(Cartesian(2, 0), 1)))
+        self.assertFalse(robust.circle_circle_intersect(unit, Circle(Cartesian(2, 0), 0.5)))
+        self.assertTrue(robust.line_circle_intersect(LineBySlope(Cartesian(0, 1), 0), unit))
+        self.assertFalse(robust.line_circle_intersect(LineBySlope(Cartesian(0, 2), 1), unit))
+        self.assertTrue(robust.line_circle_intersect(
+            LineBySlope(Cartesian(-1, 5), float('inf')), unit))
+        chord = LineSegment(Cartesian(-2, 0.5), Cartesian(2, 0.5))
+        self.assertTrue(robust.circle_linesegment_intersect(unit, chord))
+        self.assertTrue(robust.circle_linesegment_intersect(
+            unit, LineSegment(Cartesian(1, 0), Cartesian(5, 0))))
+        self.assertFalse(robust.circle_linesegment_intersect(
+            unit, LineSegment(Cartesian(2, -1), Cartesian(2, 1))))
+        self.assertFalse(robust.circle_linesegment_intersect(
+            unit, LineSegment(Cartesian(1, 1), Cartesian(3, 3))))
+
+    def test_point_in_polygon(self):
+        cup = Polygon(Cartesian(0, 0), Cartesian(0, 4), Cartesian(1, 4),
+                      Cartesian(1, 1), Cartesian(3, 1), Cartesian(3, 4),
+                      Cartesian(4, 4), Cartesian(4, 0))
+        rng = random.Random(7)
+        for i in range(500):
+            point = Cartesian(rng.uniform(-1, 5), rng.uniform(-1, 5))
+            self.assertEqual(robust.point_in_polygon(point, cup),
+                             point_in_polygon(point, cup))
+        for vertex in cup.vertices:
+            self.assertTrue(robust.point_in_polygon(vertex, cup))
+        self.assertTrue(robust.point_in_polygon(Cartesian(2, 1), cup))
+
+    def test_robust_mode(self):
+        unit = Circle(Cartesian(0, 0), 1)
+        chord = LineSegment(Cartesian(-2, 0.5), Cartesian(2, 0.5))
+        square = Polygon(Cartesian(-2, 0.5), Cartesian(-2, 3), Cartesian(2, 3),
+                         Cartesian(2, 0.5))
+        before = intersect(unit, chord)
+        with robust.robust_mode():
+            self.assertTrue(intersect(unit, chord))
+            self.assertTrue(chord.intersect(unit))
+            self.assertTrue(intersect(square, unit))
+            self.assertTrue(shapes.linesegment_linesegment_intersect(
+                LineSegment(Cartesian(0, 0), Cartesian(2, 2)),
+                LineSegment(Cartesian(1, 1), Cartesian(3, 3))))
+            self.assertRaises(RuntimeError, robust.enable)
+        self.assertEqual(intersect(unit, chord), before)
+        self.assertEqual(shapes.linesegment_linesegment_intersect,
+                         linesegment_linesegment_intersect)
+        self.assertEqual(shapes.intersect_function(Circle, LineSegment),
+                         circle_linesegment_intersect)
+
+    def test_large_polygons_with_collinear_vertices(self):
+        # Both bottoms run along y = 0 through several vertices, and the
+        # first polygon crosses itself, so the sweep can't be used
+        first = Polygon(*[Cartesian(x, y) for x, y in
+                          ((0, 0), (2, 0), (4, 0), (6, 0), (8, 0), (8, 6),
+                           (2, 3), (6, 3), (0, 6))])
+        second = Polygon(*[Cartesian(x, y) for x, y in
+                           ((5, 0), (9, 0), (11, 0), (13, 0), (14, -1),
+                            (12, -2), (10, -2), (8, -2), (6, -1))])
+        with robust.robust_mode():
+            self.assertFalse(first.is_simple())
+            self.assertTrue(polygon_polygon_intersect(first, second))
+            self.assertIn((6, 0), shapes.polygon_polygon_intersection(first, second))
+            rng = random.Random(10)
+            for i in range(40):
+                polygons = []
+                for j in range(2):
+                    star = random_star_polygon(rng, 6, rng.uniform(0, 5), 0, 4)
+                    vertices = []
+                    # Put a vertex half way along every edge
+                    for edge in star.edges():
+                        (x1, y1), (x2, y2) = [p.cartesian_pair() for p in
+                                              (edge.endpoint1, edge.endpoint2)]
+                        vertices.extend((Cartesian((x1 + x2) / 2, (y1 + y2) / 2),
+                                         edge.endpoint2))
+                    if j:
+                        vertices[0], vertices[5] = vertices[5], vertices[0]
+                    polygons.append(Polygon(*vertices))
+                expected = any(robust.linesegment_linesegment_intersect(e1, e2)
+                               for e1 in polygons[0].edges()
+                               for e2 in polygons[1].edges())
+                self.assertEqual(polygon_polygon_intersect(*polygons), expected)
+                self.assertEqual(bool(shapes.polygon_polygon_intersection(*polygons)),
+                                 expected)
+
+    def test_convex_polygons_touching_at_a_vertex(self):
+        rng = random.Random(8)
+        with robust.robust_mode():
+            for i in range(500):
+                corner = (rng.random(), rng.random())
+                a, b = [(rng.random(), rng.random()) for j in range(2)]
+                # Mirrored through the shared corner, the second triangle
+                # meets the first there and nowhere else
+                c, d = [(2 * corner[0] - x - rng.random() * 0.1,
+                         2 * corner[1] - y - rng.random() * 0.1) for x, y in (a, b)]
+                first = Polygon(*[Cartesian(*xy) for xy in (corner, a, b)])
+                second = Polygon(*[Cartesian(*xy) for xy in (corner, c, d)])
+                if not (first.is_convex() and second.is_convex()):
+                    continue
+                expected = any(robust.linesegment_linesegment_intersect(e1, e2)
+                               for e1 in first.edges() for e2 in second.edges())
+                self.assertTrue(expected)
+                self.assertEqual(intersect(first, second), expected)
+                self.assertEqual(intersect(second, first), expected)
+
+
+class ShapeIndexTestCases(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(233)
+        self.scene = random_scene(rng, 300)
+
+    def brute_force_pairs(self, shapes):
+        return [(i, j) for i in range(len(shapes)) for j in range(i + 1, len(shapes))
+                if shapes[i].intersect(shapes[j])]
+
+    def test_pairs_match_brute_force(self):
+        index = ShapeIndex(self.scene)
+        self.assertEqual(index.pairs(), self.brute_force_pairs(self.scene))
+
+    def test_small_cells(self):
+        index = ShapeIndex(self.scene, cell_size=0.5)
+        self.assertEqual(index.pairs(), self.brute_force_pairs(self.scene))
+
+    def test_query_matches_brute_force(self):
+        index = ShapeIndex(self.scene)
+        probe = Polygon(Cartesian(-10, -10), Cartesian(-10, 10), Cartesian(10, 10))
+        expected = [i for i, s in enumerate(self.scene) if probe.intersect(s)]
+        self.assertEqual(index.query(probe), expected)
+
+    def test_query_with_line(self):
+        index = ShapeIndex([LineSegment(Cartesian(0, -1), Cartesian(0, 1)),
+                            LineSegment(Cartesian(5, 5), Cartesian(6, 6)),
+                            Circle(Cartesian(0, 10), 1)])
+        self.assertEqual(index.query(LineBySlope(Cartesian(0, 0), 0)), [0])
+        self.assertEqual(index.query(LineByPoints(Cartesian(0.5, 0), Cartesian(0.5, 1))),
+                         [2])
+
+    def test_lines_in_index(self):
+        index = ShapeIndex([Polygon(Cartesian(1, 0), Cartesian(1, 2), Cartesian(3, 2)),
+                            LineBySlope(Cartesian(0, 1), 0),
+                            LineSegment(Cartesian(5, 5), Cartesian(6, 6))])
+        self.assertEqual(index.pairs(), [(0, 1)])
+
+
+class SceneTestCases(unittest.TestCase):
+    def brute_force_pairs(self, scene):
+        keys = list(scene)
+        return [(a, b) for n, a in enumerate(keys) for b in keys[n + 1:]
+                if intersect(scene[a], scene[b])]
+
+    def test_translated_and_scaled(self):
+        circle = translated(Circle(Cartesian(1, 2), 3), 1, -1)
+        self.assertEqual((circle.x, circle.y, circle.radius), (2, 1, 3))
+        square = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(2, 2),
+                         Cartesian(2, 0))
+        self.assertEqual(translated(square, 1, 1).bbox(), (1, 1, 3, 3))
+        self.assertEqual(scaled(square, 2).bbox(), (-1, -1, 3, 3))
+        self.assertEqual(scaled(circle, 0.5).radius, 1.5)
+        self.assertRaises(TypeError, scaled, LineBySlope(Cartesian(0, 0), 1), 2)
+
+    def test_tick_reports_changes(self):
+        scene = Scene([Circle(Cartesian(0, 0), 1), Circle(Cartesian(5, 0), 1)])
+        self.assertEqual(scene.tick(), ([], []))
+        scene.move(1, -3.5, 0)
+        self.assertEqual(scene.tick(), ([(0, 1)], []))
+        self.assertEqual(scene.pairs(), [(0, 1)])
+        self.assertEqual(scene.tick(), ([], []))
+        scene.resize(1, 0.1)
+        self.assertEqual(scene.tick(), ([], [(0, 1)]))
+        key = scene.add(Circle(Cartesian(0, 1.5), 1))
+        self.assertEqual(key, 2)
+        self.assertEqual(scene.tick(), ([(0, 2)], []))
+        scene.remove(0)
+        self.assertEqual(scene.tick(), ([], [(0, 2)]))
+        self.assertEqual(len(scene), 2)
+        self.assertFalse(0 in scene)
+        self.assertRaises(KeyError, scene.update, 0, Circle(Cartesian(0, 0), 1))
+
+    def test_matches_brute_force_while_moving(self):
+        rng = random.Random(13)
+        scene = Scene(random_scene(rng, 60, extent=20))
+        scene.tick()
+        self.assertEqual(scene.pairs(), self.brute_force_pairs(scene))
+        for step in range(20):
+            previous = set(scene.pairs())
+            for key in rng.sample(list(scene), 10):
+                action = rng.random()
+                if action < 0.7:
+                    scene.move(key, rng.uniform(-3, 3), rng.uniform(-3, 3))
+                elif action < 0.85:
+                    scene.resize(key, rng.uniform(0.5, 1.5))
+                else:
+                    scene.remove(key)
+                    scene.add(random_scene(rng, 1, extent=20)[0])
+            started, stopped = scene.tick()
+            current = self.brute_force_pairs(scene)
+            self.assertEqual(scene.pairs(), current)
+            self.assertEqual(started, sorted(set(current) - previous))
+            self.assertEqual(stopped, sorted(previous - set(current)))
+
+    def test_moves_further_than_the_shapes_are_wide(self):
+        scene = Scene([Circle(Cartesian(0.5, 0), 0.5), Circle(Cartesian(3, 0), 2.6)])
+        scene.move(0, 10, 0)
+        for items in scene._axes:
+            values = [(e.value, e.is_max) for e in items]
+            self.assertEqual(values, sorted(values))
+        rng = random.Random(31)
+        for run in range(40):
+            scene = Scene(random_scene(rng, 15, extent=10))
+            scene.tick()
+            for step in range(5):
+                for key in rng.sample(list(scene), 5):
+                    scene.move(key, rng.uniform(-8, 8), rng.uniform(-8, 8))
+                scene.tick()
+                self.assertEqual(scene.pairs(), self.brute_force_pairs(scene))
+
+
+class CodecTestCases(unittest.TestCase):
+    def test_round_trip(self):
+        shapes = [Circle(Cartesian(1, 2), 3),
+                  LineSegment(Cartesian(0, 1), Cartesian(2, 3)),
+                  LineByPoints(Cartesian(1, 0), Cartesian(1, 5)),
+                  Polygon(Cartesian(0, 0), Cartesian(0, 1), Cartesian(1, 0))]
+        kinds, offsets, coords = codec.pack(shapes)
+        self.assertEqual(list(kinds), [codec.CIRCLE, codec.SEGMENT, codec.LINE,
+                                       codec.POLYGON])
+        self.assertEqual(list(offsets), [0, 3, 7, 10, 16])
+        circle, segment, line, polygon = codec.unpack(kinds, offsets, coords)
+        self.assertEqual((circle.x, circle.y, circle.radius), (1, 2, 3))
+        self.assertEqual(segment.endpoint2.cartesian_pair(), (2, 3))
+        self.assertTrue(line.is_vertical())
+        self.assertEqual(line.x, 1)
+        self.assertEqual(list(polygon.coords), [0, 0, 0, 1, 1, 0])
+
+    def test_unknown_shapes(self):
+        self.assertRaises(TypeError, codec.encode, Cartesian(0, 0))
+        self.assertRaises(ValueError, codec.decode, 99, ())
+
+
+class ParallelTestCases(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(233)
+        self.scene = random_scene(rng, 200)
+        self.others = random_scene(rng, 50)
+
+    def test_self_join_matches_index(self):
+        pairs = parallel.intersecting_pairs(self.scene, workers=2, chunk_size=30)
+        self.assertEqual(pairs, ShapeIndex(self.scene).pairs())
+
+    def test_two_collections(self):
+        pairs = parallel.intersecting_pairs(self.scene, self.others, workers=2,
+                                            chunk_size=64)
+        expected = [(i, j) for i, a in enumerate(self.scene)
+                    for j, b in enumerate(self.others) if a.intersect(b)]
+        self.assertEqual(pairs, expected)
+
+    def test_bad_chunk_size(self):
+        self.assertRaises(ValueError, parallel.intersecting_pairs, self.scene,
+                          chunk_size=0)
+
+
+class StreamTestCases(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(233)
+        self.reference = random_scene(rng, 60)
+        self.incoming = random_scene(rng, 40)
+
+    def test_matches_brute_force(self):
+        found = list(stream.stream_intersections(enumerate(self.incoming),
+                                                 self.reference))
+        expected = [(i, j) for i, a in enumerate(self.incoming)
+                    for j, b in enumerate(self.reference) if a.intersect(b)]
+        self.assertEqual(found, expected)
+
+    def test_input_is_consumed_lazily(self):
+        consumed = []
+        def records():
+            for i, shape in enumerate(self.incoming):
+                consumed.append(i)
+                yield i, shape
+        results = stream.stream_intersections(records(), ShapeIndex(self.reference))
+        self.assertEqual(consumed, [])
+        first = next(results)
+        self.assertEqual(consumed[-1], first[0])
+
+    def test_record_files(self):
+        f = io.StringIO()
+        stream.write_records(f, [('a', Circle(Cartesian(0, 0), 2)),
+                                 ('b', Polygon(Cartesian(5, 5), Cartesian(5, 6),
+                                               Cartesian(6, 6)))])
+        f.write("# comment\n\nc segment 4 1 6 1\n")
+        f.seek(0)
+        records = list(stream.read_records(f))
+        self.assertEqual([r[0] for r in records], ['a', 'b', 'c'])
+        self.assertEqual(records[0][1].radius, 2)
+        self.assertEqual(list(records[1][1].coords), [5, 5, 5, 6, 6, 6])
+        found = list(stream.stream_intersections(
+            records, [Circle(Cartesian(2, 2), 1),
+                      LineSegment(Cartesian(5, 0), Cartesian(5, 10))]))
+        self.assertEqual(found, [('a', 0), ('b', 1), ('c', 1)])
+
+    def test_bad_records(self):
+        self.assertRaises(ValueError, stream.parse_record, "x")
+        self.assertRaises(ValueError, stream.parse_record, "x blob 1 2")
+        # Too few or too many coordinates for the kind of shape
+        for line in ("a circle 1 2", "a circle 1 2 3 4", "b segment 1 2 3",
+                     "c line 1 2", "d polygon", "d polygon 1 2 3"):
+            self.assertRaises(ValueError, stream.parse_record, line)
+        self.assertEqual(stream.parse_record("d polygon 1 2")[1].vertices,
+                         (Cartesian(1, 2),))
+
+
+class StorageTestCases(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'scene.shapes')
+        self.shapes = random_scene(random.Random(233), 30) + \
+                [LineByPoints(Cartesian(1, 0), Cartesian(1, 5))]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        storage.write_shapes(self.path, self.shapes)
+        with storage.ShapeFile(self.path) as f:
+            self.assertEqual(len(f), len(self.shapes))
+            for original, loaded in zip(self.shapes, f):
+                self.assertEqual(codec.encode(loaded)[0], codec.encode(original)[0])
+                self.assertEqual(list(codec.encode(loaded)[1]),
+                                 list(codec.encode(original)[1]))
+            self.assertTrue(f[-1].is_vertical())
+
+    def test_records_are_views(self):
+        storage.write_shapes(self.path, self.shapes)
+        f = storage.ShapeFile(self.path)
+        coords = f.record_coords(1)
+        self.assertIsInstance(coords, memoryview)
+        self.assertEqual(list(coords), list(self.shapes[1].coords))
+        self.assertRaises(IndexError, f.__getitem__, len(self.shapes))
+        coords.release()
+        f.close()
+
+    def test_empty_file(self):
+        storage.write_shapes(self.path, [])
+        with storage.ShapeFile(self.path) as f:
+            self.assertEqual(list(f), [])
+
+    def test_not_a_shape_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'x' * 64)
+        self.assertRaises(ValueError, storage.ShapeFile, self.path)
+
+    def test_truncated_file(self):
+        storage.write_shapes(self.path, self.shapes)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for cut in (16, 3, len(data) - storage._HEADER.size - 1):
+            with open(self.path, 'wb') as f:
+                f.write(data[:-cut])
+            self.assertRaises(ValueError, storage.ShapeFile, self.path)
+        with open(self.path, 'wb') as f:
+            f.write(data + b'\0' * 8)
+        self.assertRaises(ValueError, storage.ShapeFile, self.path)
+
+    def test_close_with_views_in_use(self):
+        storage.write_shapes(self.path, self.shapes)
+        f = storage.ShapeFile(self.path)
+        coords = f.record_coords(1)
+        self.assertRaises(BufferError, f.close)
+        # Still open and whole
+        self.assertEqual(len(f), len(self.shapes))
+        self.assertEqual(list(f.record_coords(1)), list(coords))
+        coords.release()
+        f.close()
+
+
+def random_star_polygon(rng, n, cx, cy, radius):
+    """Returns a simple polygon with n vertices around the given center"""
+    angles = sorted(rng.uniform(0, 2 * pi) for i in range(n))
+    points = [Polar(radius * rng.uniform(0.5, 1), angle) for angle in angles]
+    return Polygon(*[Cartesian(cx + p.x, cy + p.y) for p in points])
+
+
+class ContainmentTestCases(unittest.TestCase):
+    def setUp(self):
+        self.square = Polygon(Cartesian(0, 0), Cartesian(0, 4), Cartesian(4, 4),
+                              Cartesian(4, 0))
+        # A U shape, open at the top
+        self.cup = Polygon(Cartesian(0, 0), Cartesian(0, 4), Cartesian(1, 4),
+                           Cartesian(1, 1), Cartesian(3, 1), Cartesian(3, 4),
+                           Cartesian(4, 4), Cartesian(4, 0))
+
+    def test_point_in_polygon(self):
+        self.assertTrue(point_in_polygon(Cartesian(2, 2), self.square))
+        self.assertTrue(self.square.contains(Cartesian(2, 2)))
+        self.assertFalse(point_in_polygon(Cartesian(5, 2), self.square))
+        # The boundary counts as inside
+        self.assertTrue(point_in_polygon(Cartesian(0, 2), self.square))
+        self.assertTrue(point_in_polygon(Cartesian(4, 4), self.square))
+        self.assertTrue(point_in_polygon(Cartesian(0.5, 3), self.cup))
+        self.assertFalse(point_in_polygon(Cartesian(2, 3), self.cup))
+        self.assertFalse(point_in_polygon(Cartesian(0, 0), Polygon()))
+
+    def test_circle_in_polygon(self):
+        self.assertTrue(circle_in_polygon(Circle(Cartesian(2, 2), 1), self.square))
+        self.assertTrue(circle_in_polygon(Circle(Cartesian(2, 2), 2), self.square))
+        self.assertFalse(circle_in_polygon(Circle(Cartesian(2, 2), 3), self.square))
+        self.assertFalse(circle_in_polygon(Circle(Cartesian(9, 9), 1), self.square))
+        self.assertFalse(circle_in_polygon(Circle(Cartesian(2, 0.5), 1), self.cup))
+
+    def test_polygon_in_polygon(self):
+        inner = Polygon(Cartesian(1, 1), Cartesian(1, 3), Cartesian(3, 3),
+                        Cartesian(3, 1))
+        self.assertTrue(polygon_in_polygon(inner, self.square))
+        self.assertTrue(polygon_in_polygon(self.square, self.square))
+        self.assertFalse(polygon_in_polygon(self.square, inner))
+        # Contained shapes don't intersect, since their edges never cross
+        self.assertFalse(polygon_polygon_intersect(inner, self.square))
+        # Every vertex of the bar is inside the cup, but its middle is not
+        bar = Polygon(Cartesian(0.5, 2), Cartesian(0.5, 3), Cartesian(3.5, 3),
+                      Cartesian(3.5, 2))
+        self.assertFalse(polygon_in_polygon(bar, self.cup))
+        base = Polygon(Cartesian(0.5, 0.25), Cartesian(0.5, 0.75),
+                       Cartesian(3.5, 0.75), Cartesian(3.5, 0.25))
+        self.assertTrue(polygon_in_polygon(base, self.cup))
+        # A notch in the top of outer cuts into inner, touching its top edge
+        # only at the notch's corners
+        notched = Polygon(Cartesian(0, 0), Cartesian(10, 0), Cartesian(10, 10),
+                          Cartesian(8, 10), Cartesian(7.5, 5), Cartesian(7, 10),
+                          Cartesian(0, 10))
+        inner = Polygon(Cartesian(1, 1), Cartesian(9, 1), Cartesian(9, 10),
+                        Cartesian(1, 10))
+        self.assertFalse(polygon_in_polygon(inner, notched))
+        below = Polygon(Cartesian(1, 1), Cartesian(9, 1), Cartesian(9, 5),
+                        Cartesian(1, 5))
+        self.assertTrue(polygon_in_polygon(below, notched))
+        # Likewise when the notch reaches right down to inner's bottom edge
+        notched.vertices = [Cartesian(7.5, 1) if v == Cartesian(7.5, 5) else v
+                            for v in notched.vertices]
+        self.assertFalse(polygon_in_polygon(inner, notched))
+
+    def test_locator_matches_point_in_polygon(self):
+        rng = random.Random(17)
+        polygons = [self.square, self.cup, random_star_polygon(rng, 200, 0, 0, 10)]
+        for polygon in polygons:
+            box = polygon.bbox()
+            points = [Cartesian(rng.uniform(box[0] - 1, box[2] + 1),
+                                rng.uniform(box[1] - 1, box[3] + 1))
+                      for _ in range(500)]
+            points.extend(polygon.vertices)
+            expected = [point_in_polygon(p, polygon) for p in points]
+            for bands in (None, 1, 7):
+                locator = PolygonLocator(polygon, bands)
+                self.assertEqual(locator.contains_many(points), expected)
+        self.assertTrue(PolygonLocator(self.cup).contains(Cartesian(2, 0.5)))
+
+    def test_locator_with_long_edges(self):
+        # Every other vertex is at the tip of a long spike, so almost every
+        # edge spans a good part of the polygon's height
+        n = 400
+        spiky = Polygon(*[Polar(10 if i % 2 else 0.5, 2 * pi * i / n) for i in range(n)])
+        locator = PolygonLocator(spiky)
+        filed = sum(len(edges) for edges in locator._edges) // 4
+        self.assertTrue(filed <= locate.FILED_PER_EDGE * n)
+        self.assertTrue(locator.bands < 10)
+        rng = random.Random(18)
+        points = [Cartesian(rng.uniform(-11, 11), rng.uniform(-11, 11))
+                  for _ in range(500)]
+        self.assertEqual(locator.contains_many(points),
+                         [point_in_polygon(p, spiky) for p in points])
+        # Polygons without long edges still get a band per edge
+        self.assertEqual(PolygonLocator(self.square).bands, 4)
+        star = random_star_polygon(rng, 200, 0, 0, 10)
+        self.assertTrue(PolygonLocator(star).bands > 20)
+
+    def test_locator_edge_cases(self):
+        self.assertFalse(PolygonLocator(Polygon()).contains_xy(0, 0))
+        flat = Polygon(Cartesian(0, 1), Cartesian(4, 1))
+        self.assertTrue(PolygonLocator(flat).contains_xy(2, 1))
+        self.assertFalse(PolygonLocator(flat).contains_xy(2, 2))
+        self.assertRaises(ValueError, PolygonLocator, self.square, 0)
+
+
+def random_convex_polygon(rng, n, cx, cy, radius):
+    return convex_hull([Cartesian(cx + rng.uniform(-radius, radius),
+                                  cy + rng.uniform(-radius, radius))
+                        for i in range(n)])
+
+
+class ConvexTestCases(unittest.TestCase):
+    def setUp(self):
+        self.square = Polygon(Cartesian(0, 0), Cartesian(4, 0), Cartesian(4, 4),
+                              Cartesian(0, 4))
+
+    def test_convex_hull(self):
+        points = [Cartesian(0, 0), Cartesian(4, 0), Cartesian(4, 4), Cartesian(0, 4),
+                  Cartesian(2, 0), Cartesian(2, 2), Cartesian(1, 3), Cartesian(0, 0)]
+        hull = convex_hull(points)
+        self.assertEqual(hull, self.square)
+        rng = random.Random(18)
+        points = [Cartesian(rng.gauss(0, 1), rng.gauss(0, 1)) for i in range(200)]
+        hull = convex_hull(points)
+        self.assertTrue(hull.is_convex())
+        self.assertEqual(hull._convex_turn(), 1)
+        for point in points:
+            self.assertTrue(point_in_polygon(point, hull))
+            self.assertTrue(xy_in_polygon(point.x, point.y, hull.coords))
+        self.assertEqual(len(convex_hull(points[:2]).vertices), 2)
+
+    def test_is_convex(self):
+        self.assertTrue(self.square.is_convex())
+        clockwise = Polygon(*reversed(self.square.vertices))
+        self.assertEqual(clockwise._convex_turn(), -1)
+        self.assertTrue(Polygon(Cartesian(0, 0), Cartesian(2, 0), Cartesian(4, 0),
+                                Cartesian(4, 4)).is_convex())
+        cup = Polygon(Cartesian(0, 0), Cartesian(0, 4), Cartesian(1, 4),
+                      Cartesian(1, 1), Cartesian(3, 1), Cartesian(3, 4),
+                      Cartesian(4, 4), Cartesian(4, 0))
+        self.assertFalse(cup.is_convex())
+        star = Polygon(*[Cartesian(math.cos(4 * pi * i / 5), math.sin(4 * pi * i / 5))
+                         for i in range(5)])
+        self.assertFalse(star.is_convex())
+        self.assertFalse(Polygon(Cartesian(0, 0), Cartesian(1, 1)).is_convex())
+        self.assertFalse(Polygon(Cartesian(0, 0), Cartesian(1, 1),
+                                 Cartesian(2, 2)).is_convex())
+        cup.vertices = self.square.vertices
+        self.assertTrue(cup.is_convex())
+
+    def test_point_in_convex_polygon(self):
+        rng = random.Random(19)
+        for i in range(20):
+            polygon = random_convex_polygon(rng, 30, 0, 0, 10)
+            for polygon in (polygon, Polygon(*reversed(polygon.vertices))):
+                points = [Cartesian(rng.uniform(-11, 11), rng.uniform(-11, 11))
+                          for j in range(50)]
+                for point in points + list(polygon.vertices):
+                    self.assertEqual(point_in_polygon(point, polygon),
+                                     xy_in_polygon(point.x, point.y, polygon.coords))
+        self.assertTrue(self.square.contains(Cartesian(2, 0)))
+        self.assertTrue(self.square.contains(Cartesian(0, 2)))
+        self.assertFalse(self.square.contains(Cartesian(5, 0)))
+
+    def test_convex_polygon_polygon(self):
+        rng = random.Random(20)
+        for i in range(200):
+            poly1 = random_convex_polygon(rng, rng.randint(3, 12), 0, 0, 5)
+            poly2 = random_convex_polygon(rng, rng.randint(3, 12),
+                                          rng.uniform(-10, 10), rng.uniform(-10, 10),
+                                          rng.uniform(0.5, 8))
+            expected = any(linesegment_linesegment_intersect(e1, e2)
+                           for e1 in poly1.edges() for e2 in poly2.edges())
+            self.assertEqual(polygon_polygon_intersect(poly1, poly2), expected)
+            self.assertEqual(polygon_polygon_intersect(poly2, poly1), expected)
+        inner = Polygon(Cartesian(1, 1), Cartesian(3, 1), Cartesian(3, 3),
+                        Cartesian(1, 3))
+        self.assertFalse(polygon_polygon_intersect(inner, self.square))
+        self.assertFalse(polygon_polygon_intersect(self.square, inner))
+        self.assertTrue(polygon_in_polygon(inner, self.square))
+        self.assertFalse(polygon_in_polygon(self.square, inner))
+
+    def test_circle_convex_polygon_overlap(self):
+        self.assertTrue(circle_convex_polygon_overlap(Circle(Cartesian(2, 2), 1),
+                                                      self.square))
+        self.assertTrue(circle_convex_polygon_overlap(Circle(Cartesian(2, 2), 9),
+                                                      self.square))
+        self.assertTrue(circle_convex_polygon_overlap(Circle(Cartesian(5, 2), 1),
+                                                      self.square))
+        self.assertFalse(circle_convex_polygon_overlap(Circle(Cartesian(5, 5), 1),
+                                                       self.square))
+        rng = random.Random(21)
+        polygon = random_convex_polygon(rng, 20, 0, 0, 5)
+        coords = polygon.coords
+        for i in range(300):
+            circle = Circle(Cartesian(rng.uniform(-8, 8), rng.uniform(-8, 8)),
+                            rng.uniform(0.1, 3))
+            x, y = circle.center.cartesian_pair()
+            nearest = min(shapes._point_segment_distance(
+                x, y, coords[j - 2], coords[j - 1], coords[j], coords[j + 1])
+                for j in range(0, len(coords), 2))
+            expected = xy_in_polygon(x, y, coords) or nearest <= circle.radius
+            self.assertEqual(circle_convex_polygon_overlap(circle, polygon), expected)
+        cup = Polygon(Cartesian(0, 0), Cartesian(0, 4), Cartesian(1, 1),
+                      Cartesian(4, 0))
+        self.assertRaises(ValueError, circle_convex_polygon_overlap,
+                          Circle(Cartesian(0, 0), 1), cup)
+
+    def test_circle_convex_polygon_intersect_matches_edges(self):
+        rng = random.Random(33)
+        for i in range(20):
+            polygon = random_convex_polygon(rng, 20, 0, 0, 5)
+            polygon.vertices = polygon.vertices[::rng.choice((1, -1))]
+            for j in range(30):
+                circle = Circle(Cartesian(rng.uniform(-8, 8), rng.uniform(-8, 8)),
+                                rng.uniform(0.1, 3))
+                expected = any(circle_linesegment_intersect(circle, edge)
+                               for edge in polygon.edges())
+                self.assertEqual(intersect(circle, polygon), expected)
+                self.assertEqual(polygon.intersect(circle), expected)
+        # Inside the polygon and clear of its edges
+        self.assertFalse(intersect(Circle(Cartesian(2, 2), 1), self.square))
+
+
+class ServiceTestCases(unittest.TestCase):
+    def setUp(self):
+        random.seed(19)
+        self.pairs = [(LineSegment(Cartesian(random.uniform(0, 10), random.uniform(0, 10)),
+                                   Cartesian(random.uniform(0, 10), random.uniform(0, 10))),
+                       Circle(Cartesian(random.uniform(0, 10), random.uniform(0, 10)),
+                              random.uniform(0.5, 2)))
+                      for _ in range(50)]
+
+    def test_answers_match_direct_calls(self):
+        async def run():
+            async with IntersectionService(max_batch=8, max_delay=0.01) as service:
+                hits = await asyncio.gather(*[service.intersect(a, b)
+                                              for a, b in self.pairs])
+                points = await asyncio.gather(*[service.intersection(a, b)
+                                                for a, b in self.pairs])
+            return hits, points, service.stats()
+        hits, points, stats = asyncio.run(run())
+        self.assertEqual(hits, [intersect(a, b) for a, b in self.pairs])
+        self.assertEqual(points, [a.intersection(b) for a, b in self.pairs])
+        self.assertEqual(stats['requests'], 100)
+        self.assertLessEqual(stats['largest_batch'], 8)
+        self.assertLess(stats['batches'], 100)
+
+    def test_delay_sends_partial_batches(self):
+        async def run():
+            async with IntersectionService(max_batch=100, max_delay=0) as service:
+                await service.intersect(*self.pairs[0])
+                await service.intersect(*self.pairs[1])
+            return service.stats()
+        self.assertEqual(asyncio.run(run())['batches'], 2)
+
+    def test_errors_reach_only_their_own_caller(self):
+        polygon = Polygon(Cartesian(0, 0), Cartesian(1, 1), Cartesian(1, 0))
+        async def run():
+            async with IntersectionService() as service:
+                return await asyncio.gather(
+                    service.intersect(*self.pairs[0]),
+                    service.intersect(Dot(Cartesian(0, 0)), polygon),
+                    service.intersect(*self.pairs[1]),
+                    return_exceptions=True)
+        first, error, last = asyncio.run(run())
+        self.assertIsInstance(error, TypeError)
+        self.assertEqual([first, last], [intersect(*self.pairs[0]),
+                                         intersect(*self.pairs[1])])
+
+    def test_closed_service(self):
+        async def run():
+            service = IntersectionService()
+            await service.close()
+            await service.intersect(*self.pairs[0])
+        self.assertRaises(RuntimeError, asyncio.run, run())
+        self.assertRaises(ValueError, IntersectionService, max_batch=0)
+        self.assertRaises(ValueError, IntersectionService, max_delay=-1)
+
+
+class SimplifyTestCases(unittest.TestCase):
+    def setUp(self):
+        # A square with a slightly bent point along each edge
+        self.square = Polygon(Cartesian(0, 0), Cartesian(2, 0.1), Cartesian(4, 0),
+                              Cartesian(3.9, 2), Cartesian(4, 4), Cartesian(2, 4),
+                              Cartesian(0, 4), Cartesian(0.2, 2))
+
+    def test_douglas_peucker(self):
+        # (2, 4) is on the line between its neighbours, so it adds nothing
+        self.assertEqual(len(simplify.douglas_peucker(self.square, 0).vertices), 7)
+        simpler = simplify.douglas_peucker(self.square, 0.15)
+        self.assertEqual(simpler, Polygon(Cartesian(0, 0), Cartesian(4, 0),
+                                          Cartesian(4, 4), Cartesian(0, 4),
+                                          Cartesian(0.2, 2)))
+        self.assertEqual(len(simplify.douglas_peucker(self.square, 100).vertices), 2)
+
+    def test_visvalingam(self):
+        simpler = simplify.visvalingam(self.square, 0.3)
+        self.assertEqual(simpler, Polygon(Cartesian(0, 0), Cartesian(4, 0),
+                                          Cartesian(4, 4), Cartesian(0, 4),
+                                          Cartesian(0.2, 2)))
+        self.assertEqual(len(simplify.visvalingam(self.square, 0.5).vertices), 4)
+        self.assertEqual(len(simplify.visvalingam(self.square, 100).vertices), 3)
+
+    def test_pyramid_bounds(self):
+        rng = random.Random(20)
+        polygon = random_star_polygon(rng, 500, 0, 0, 10)
+        lod = simplify.pyramid(polygon)
+        self.assertIs(simplify.pyramid(polygon), lod)
+        self.assertEqual([len(level.indices) for level in lod.levels],
+                         [500, 125, 31, 16])
+        coords = polygon.coords
+        for level in lod.levels[1:]:
+            self.assertEqual(level.indices[0], 0)
+            for k, start in enumerate(level.indices):
+                end = level.indices[k + 1] if k + 1 < len(level.indices) else 500
+                x1, y1, x2, y2 = coords[2 * start], coords[2 * start + 1], \
+                        coords[2 * (end % 500)], coords[2 * (end % 500) + 1]
+                for m in range(start, end):
+                    self.assertLessEqual(shapes._point_segment_distance(
+                        coords[2 * m], coords[2 * m + 1], x1, y1, x2, y2),
+                        level.errors[k])
+        self.assertEqual(len(lod.simplified(0).vertices), 500)
+        self.assertEqual(len(lod.simplified(float('inf')).vertices), 16)
+        polygon.vertices = polygon.vertices[:100]
+        self.assertEqual(len(simplify.pyramid(polygon).levels[0].indices), 100)
+
+    def test_polygons_intersect_matches_every_edge_pair(self):
+        rng = random.Random(20)
+        for i in range(100):
+            polygon1 = random_star_polygon(rng, rng.choice((4, 30, 150)),
+                                           rng.uniform(-5, 5), 0, rng.uniform(1, 8))
+            polygon2 = random_star_polygon(rng, rng.choice((4, 30, 150)),
+                                           rng.uniform(-5, 5), 0, rng.uniform(1, 8))
+            expected = any(linesegment_linesegment_intersect(e1, e2)
+                           for e1 in polygon1.edges() for e2 in polygon2.edges())
+            self.assertEqual(simplify.polygons_intersect(polygon1, polygon2), expected)
+        self.assertFalse(simplify.polygons_intersect(Polygon(Cartesian(0, 0)),
+                                                     self.square))
+
+
+class DistanceTestCases(unittest.TestCase):
+    def setUp(self):
+        self.square = Polygon(Cartesian(0, 0), Cartesian(4, 0), Cartesian(4, 4),
+                              Cartesian(0, 4))
+        self.circle = Circle(Cartesian(10, 2), 1)
+        self.segment = LineSegment(Cartesian(6, 0), Cartesian(6, 4))
+        self.line = LineByPoints(Cartesian(0, 6), Cartesian(1, 7))
+
+    def test_points(self):
+        self.assertEqual(distance(Cartesian(0, 0), Cartesian(3, 4)), 5)
+        self.assertEqual(distance(Cartesian(2, 2), self.square), 0)
+        self.assertEqual(distance(Cartesian(4, 2), self.square), 0)
+        self.assertEqual(distance(Cartesian(7, 8), self.square), 5)
+        self.assertEqual(distance(Cartesian(2, 2), self.circle), 7)
+        self.assertEqual(distance(Cartesian(10, 2.5), self.circle), 0)
+        self.assertEqual(distance(Cartesian(8, 6), self.segment), math.sqrt(8))
+        self.assertAlmostEqual(distance(Cartesian(0, 0), self.line), math.sqrt(18))
+        self.assertEqual(distance(Cartesian(3, 9), LineByPoints(Cartesian(1, 0),
+                                                                Cartesian(1, 5))), 2)
+        # Points work either way round, and as Polar points
+        self.assertAlmostEqual(distance(self.circle, Polar(2 * math.sqrt(2), pi/4)), 7)
+
+    def test_shapes(self):
+        self.assertEqual(distance(self.square, self.segment), 2)
+        self.assertEqual(distance(self.square, self.circle), 5)
+        self.assertEqual(distance(self.circle, self.segment), 3)
+        self.assertAlmostEqual(distance(self.square, self.line), math.sqrt(2))
+        self.assertEqual(distance(self.square, Polygon(Cartesian(1, 1), Cartesian(2, 1),
+                                                       Cartesian(2, 2))), 0)
+        self.assertEqual(distance(self.square, Polygon(Cartesian(5, 5), Cartesian(6, 5),
+                                                       Cartesian(6, 6))), math.sqrt(2))
+        self.assertEqual(distance(Circle(Cartesian(0, 0), 5), Circle(Cartesian(1, 0), 1)), 0)
+        self.assertEqual(distance(self.segment, LineSegment(Cartesian(0, 5), Cartesian(9, 5))), 1)
+        self.assertEqual(distance(self.segment, LineSegment(Cartesian(0, 2), Cartesian(9, 2))), 0)
+        self.assertAlmostEqual(distance(self.line, LineBySlope(Cartesian(0, 4), 1)), math.sqrt(2))
+        self.assertEqual(distance(self.line, LineBySlope(Cartesian(0, 4), 2)), 0)
+        self.assertAlmostEqual(distance(self.line, self.segment), math.sqrt(32))
+        self.assertEqual(distance(self.line, LineSegment(Cartesian(0, 0), Cartesian(0, 10))), 0)
+        self.assertEqual(self.square.distance(Polygon()), float('inf'))
+
+    def test_unregistered_pairs(self):
+        self.assertRaises(TypeError, distance, Dot(Cartesian(0, 0)), self.square)
+        register_distance(Dot, Polygon, lambda dot, polygon: distance(dot.point, polygon))
+        self.assertEqual(distance(self.square, Dot(Cartesian(0, 7))), 3)
+
+
+class NearestTestCases(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(23)
+        def point():
+            return Cartesian(rng.uniform(-50, 50), rng.uniform(-50, 50))
+        self.shapes = [point() for i in range(100)] + \
+                [Circle(point(), rng.uniform(0.5, 3)) for i in range(100)] + \
+                [LineSegment(point(), point()) for i in range(20)] + \
+                [random_star_polygon(rng, 6, rng.uniform(-50, 50),
+                                     rng.uniform(-50, 50), 3) for i in range(50)] + \
+                [LineBySlope(point(), 0.5)]
+        self.queries = [point() for i in range(30)] + \
+                [Circle(point(), 2) for i in range(10)]
+        self.index = NearestIndex(self.shapes, leaf_size=4)
+
+    def brute_force(self, query):
+        return sorted((distance(query, shape), i) for i, shape in enumerate(self.shapes))
+
+    def test_nearest_matches_brute_force(self):
+        for query in self.queries:
+            expected = self.brute_force(query)
+            self.assertEqual(self.index.nearest(query), expected[:1])
+            self.assertEqual(self.index.nearest(query, k=7), expected[:7])
+        self.assertEqual(len(self.index.nearest(self.queries[0], k=1000)), len(self.shapes))
+
+    def test_within_matches_brute_force(self):
+        for query in self.queries:
+            for radius in (0, 5, 20):
+                self.assertEqual(self.index.within(query, radius),
+                                 [pair for pair in self.brute_force(query)
+                                  if pair[0] <= radius])
+
+    def test_edge_cases(self):
+        self.assertEqual(NearestIndex([]).nearest(Cartesian(0, 0)), [])
+        self.assertEqual(NearestIndex([]).within(Cartesian(0, 0), 10), [])
+        self.assertRaises(ValueError, self.index.nearest, Cartesian(0, 0), k=0)
+        self.assertRaises(ValueError, NearestIndex, self.shapes, leaf_size=0)
+
+
+class SweepTestCases(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(233)
+
+    def random_segments(self, n):
+        rng = self.rng
+        return [LineSegment(Cartesian(rng.uniform(0, 100), rng.uniform(0, 100)),
+                            Cartesian(rng.uniform(0, 100), rng.uniform(0, 100)))
+                for i in range(n)]
+
+    def test_any_crossing_matches_brute_force(self):
+        for n in (2, 5, 10, 20):
+            for trial in range(20):
+                segments = self.random_segments(n)
+                expected = any(linesegment_linesegment_intersect(a, b)
+                               for i, a in enumerate(segments)
+                               for b in segments[i + 1:])
+                self.assertEqual(sweep.segments_intersect(segments), expected)
+
+    def test_vertical_segment_crossing(self):
+        segments = [LineSegment(Cartesian(0, 0), Cartesian(10, 1)),
+                    LineSegment(Cartesian(0, 5), Cartesian(10, 6)),
+                    LineSegment(Cartesian(4, 2), Cartesian(4, 8))]
+        self.assertTrue(sweep.segments_intersect(segments))
+        self.assertFalse(sweep.segments_intersect(segments[:2]))
+
+    def test_polygon_edges_dont_count_as_crossing_themselves(self):
+        square = Polygon(Cartesian(0, 0), Cartesian(0, 1), Cartesian(1, 1), Cartesian(1, 0))
+        far = Polygon(Cartesian(5, 5), Cartesian(5, 6), Cartesian(6, 6))
+        self.assertTrue(sweep.segments_intersect(square.edges()))
+        self.assertFalse(sweep.segments_intersect(square.edges(), far.edges()))
+
+    def test_all_crossings_match_brute_force(self):
+        segments = self.random_segments(40)
+        expected = [(i, j) for i in range(40) for j in range(i + 1, 40)
+                    if linesegment_linesegment_intersect(segments[i], segments[j])]
+        found = sweep.segment_intersections(segments)
+        self.assertEqual([(i, j) for i, j, point in found], expected)
+        for i, j, (x, y) in found:
+            self.assertTrue(segments[i].point_between_endpoints(Cartesian(x, y)))
+            self.assertTrue(segments[j].point_between_endpoints(Cartesian(x, y)))
+
+    def test_crossings_between_two_lists(self):
+        square = Polygon(Cartesian(0, 0), Cartesian(0, 2), Cartesian(2, 2), Cartesian(2, 0))
+        bar = [LineSegment(Cartesian(-1, 1), Cartesian(3, 1))]
+        found = sweep.segment_intersections(bar, square.edges())
+        self.assertEqual([(i, j) for i, j, point in found], [(0, 1), (0, 3)])
+        self.assertEqual(sorted(point for i, j, point in found), [(0, 1), (2, 1)])
+
+    def test_large_polygons_match_edge_by_edge_test(self):
+        for trial in range(30):
+            poly1 = random_star_polygon(self.rng, 40, 0, 0, 10)
+            poly2 = random_star_polygon(self.rng, 30, self.rng.uniform(5, 25), 0, 10)
+            expected = any(linesegment_linesegment_intersect(e1, e2)
+                           for e1 in poly1.edges() for e2 in poly2.edges())
+            self.assertEqual(polygon_polygon_intersect(poly1, poly2), expected)
+            self.assertEqual(poly2.intersect(poly1), expected)
+
+    def test_large_polygons_that_cross_themselves(self):
+        rng = self.rng
+        for trial in range(200):
+            # Vertices in no particular order, so the edges cross each other
+            poly1 = Polygon(*[Cartesian(rng.uniform(0, 10), rng.uniform(0, 10))
+                              for i in range(12)])
+            poly2 = random_star_polygon(rng, 12, rng.uniform(0, 10), rng.uniform(0, 10), 3)
+            self.assertFalse(poly1.is_simple())
+            self.assertTrue(poly2.is_simple())
+            expected = any(linesegment_linesegment_intersect(e1, e2)
+                           for e1 in poly1.edges() for e2 in poly2.edges())
+            self.assertEqual(polygon_polygon_intersect(poly1, poly2), expected)
+            self.assertEqual(polygon_polygon_intersect(poly2, poly1), expected)
+            self.assertEqual(polygon_polygon_intersect(poly1, poly1), True)
+
+    def test_chain_crosses_itself_matches_brute_force(self):
+        rng = self.rng
+        for trial in range(300):
+            n = rng.choice((3, 4, 6, 10, 20))
+            polygon = random_star_polygon(rng, n, 0, 0, 10)
+            if trial % 2:
+                vertices = list(polygon.vertices)
+                i, j = rng.randrange(n), rng.randrange(n)
+                vertices[i], vertices[j] = vertices[j], vertices[i]
+                polygon = Polygon(*vertices)
+            edges = polygon.edges()
+            expected = any(linesegment_linesegment_intersect(edges[i], edges[j])
+                           for i in range(n) for j in range(i + 2, n)
+                           if (i, j) != (0, n - 1))
+            self.assertEqual(sweep.chain_crosses_itself(edges), expected)
+        # Neighbours doubling back along each other overlap
+        spike = Polygon(Cartesian(0, 0), Cartesian(4, 0), Cartesian(2, 0),
+                        Cartesian(2, 3))
+        self.assertTrue(sweep.chain_crosses_itself(spike.edges()))
+
+    def test_is_simple(self):
+        square = Polygon(Cartesian(0, 0), Cartesian(0, 1), Cartesian(1, 1), Cartesian(1, 0))
+        bowtie = Polygon(Cartesian(0, 0), Cartesian(1, 1), Cartesian(1, 0), Cartesian(0, 1))
+        self.assertTrue(square.is_simple())
+        self.assertFalse(bowtie.is_simple())
+        # Two squares joined at a corner touch themselves there
+        self.assertFalse(Polygon(Cartesian(0, 0), Cartesian(1, 0), Cartesian(1, 1),
+                                 Cartesian(2, 1), Cartesian(2, 2), Cartesian(1, 2),
+                                 Cartesian(1, 1), Cartesian(0, 1)).is_simple())
+        bowtie.vertices = square.vertices
+        self.assertTrue(bowtie.is_simple())
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class BatchTestCases(unittest.TestCase):
+    """The vectorized tests must agree with the scalar ones pair by pair"""
+    def setUp(self):
+        rng = random.Random(233)
+        def point():
+            # Small integer coordinates give plenty of vertical, horizontal
+            # and parallel cases
+            return Cartesian(rng.randint(-5, 5), rng.randint(-5, 5))
+        self.segments1 = [LineSegment(point(), point()) for i in range(500)]
+        self.segments2 = [LineSegment(point(), point()) for i in range(500)]
+        self.circles1 = [Circle(point(), rng.randint(1, 3)) for i in range(500)]
+        self.circles2 = [Circle(point(), rng.randint(1, 3)) for i in range(500)]
+
+    def test_pack_circles(self):
+        centers, radii = batch.pack_circles(self.circles1[:3])
+        self.assertEqual(centers.shape, (3, 2))
+        self.assertEqual(list(radii), [c.radius for c in self.circles1[:3]])
+
+    def test_polar_conversions(self):
+        rng = random.Random(21)
+        points = [Polar(rng.uniform(-10, 10), rng.uniform(-pi, pi)) for i in range(100)]
+        r, theta = batch.pack_polar_points(points)
+        xy = batch.polar_to_cartesian(r, theta)
+        self.assertTrue(numpy.allclose(xy, [p.cartesian_pair() for p in points]))
+        r2, theta2 = batch.cartesian_to_polar(xy)
+        self.assertTrue(numpy.allclose(batch.polar_to_cartesian(r2, theta2), xy))
+        self.assertTrue(numpy.allclose(batch.polar_distance(r[:-1], theta[:-1],
+                                                            r[1:], theta[1:]),
+                        [p.distance_to_point(q) for p, q in zip(points, points[1:])]))
+        starts = numpy.array([rng.uniform(-pi, pi) for p in points])
+        ends = starts + numpy.array([rng.uniform(0, 2 * pi) for p in points])
+        self.assertEqual(list(batch.points_in_sectors(r, theta, starts, ends, 1, 8)),
+                         [polar.in_sector(p, start, end, 1, 8)
+                          for p, start, end in zip(points, starts, ends)])
+
+    def test_polygon_metrics(self):
+        rng = random.Random(22)
+        polygons = [random_star_polygon(rng, rng.randint(3, 12), rng.uniform(-9, 9),
+                                        rng.uniform(-9, 9), rng.uniform(1, 5))
+                    for i in range(200)]
+        polygons += [Polygon(), Polygon(Cartesian(1, 2)),
+                     Polygon(Cartesian(0, 0), Cartesian(3, 4))]
+        coords, offsets = batch.pack_polygons(polygons)
+        self.assertEqual(coords.shape, (sum(len(p.vertices) for p in polygons), 2))
+        self.assertEqual(list(offsets[-4:]), [len(coords) - 3, len(coords) - 3,
+                                              len(coords) - 2, len(coords)])
+        self.assertTrue(numpy.allclose(batch.polygon_perimeters(coords, offsets),
+                                       [p.perimeter() for p in polygons]))
+        self.assertTrue(numpy.allclose(batch.polygon_areas(coords, offsets),
+                                       [p.area() for p in polygons]))
+        centroids = batch.polygon_centroids(coords, offsets)
+        self.assertTrue(numpy.isnan(centroids[-3]).all())
+        self.assertTrue(numpy.allclose(numpy.delete(centroids, -3, axis=0),
+                                       [p.centroid().cartesian_pair()
+                                        for p in polygons if p.vertices]))
+        perimeters, areas, centroids2 = batch.polygon_metrics(coords, offsets)
+        self.assertTrue(numpy.array_equal(perimeters,
+                                          batch.polygon_perimeters(coords, offsets)))
+        self.assertTrue(numpy.array_equal(areas, batch.polygon_areas(coords, offsets)))
+        self.assertTrue(numpy.array_equal(centroids2, centroids, equal_nan=True))
+
+    def test_circle_circle_matches_scalar(self):
+        mask = batch.circle_circle_intersect(
+            *(batch.pack_circles(self.circles1) + batch.pack_circles(self.circles2)))
+        expected = [circle_circle_intersect(c1, c2)
+                    for c1, c2 in zip(self.circles1, self.circles2)]
+        self.assertEqual(list(mask), expected)
+
+    def test_linesegment_linesegment_matches_scalar(self):
+        mask = batch.linesegment_linesegment_intersect(
+            *(batch.pack_segments(self.segments1) + batch.pack_segments(self.segments2)))
+        expected = [linesegment_linesegment_intersect(s1, s2)
+                    for s1, s2 in zip(self.segments1, self.segments2)]
+        self.assertEqual(list(mask), expected)
+
+    def test_line_linesegment_matches_scalar(self):
+        mask = batch.line_linesegment_intersect(
+            *(batch.pack_lines(self.segments1) + batch.pack_segments(self.segments2)))
+        expected = [bool(line_linesegment_intersect(l, s))
+                    for l, s in zip(self.segments1, self.segments2)]
+        self.assertEqual(list(mask), expected)
+
+    def test_line_circle_matches_scalar(self):
+        mask = batch.line_circle_intersect(
+            *(batch.pack_lines(self.segments1) + batch.pack_circles(self.circles1)))
+        expected = [line_circle_intersect(l, c)
+                    for l, c in zip(self.segments1, self.circles1)]
+        self.assertEqual(list(mask), expected)
+
+    def test_circle_linesegment_matches_scalar(self):
+        mask = batch.circle_linesegment_intersect(
+            *(batch.pack_circles(self.circles1) + batch.pack_segments(self.segments1)))
+        expected = [circle_linesegment_intersect(c, s)
+                    for c, s in zip(self.circles1, self.segments1)]
+        self.assertEqual(list(mask), expected)
+        self.assertTrue(any(expected) and not all(expected))
+
+    def assertPointsMatch(self, points, counts, scalar_results):
+        for k, expected in enumerate(scalar_results):
+            self.assertEqual(counts[k], len(expected))
+            for n, (x, y) in enumerate(expected):
+                self.assertAlmostEqual(points[k, n, 0], x)
+                self.assertAlmostEqual(points[k, n, 1], y)
+            self.assertTrue(numpy.isnan(points[k, len(expected):]).all())
+
+    def test_circle_circle_points_match_scalar(self):
+        points, counts = batch.circle_circle_intersection(
+            *(batch.pack_circles(self.circles1) + batch.pack_circles(self.circles2)))
+        self.assertPointsMatch(points, counts,
+                [circle_circle_intersection(c1, c2)
+                 for c1, c2 in zip(self.circles1, self.circles2)])
+
+    def test_line_circle_points_match_scalar(self):
+        points, counts = batch.line_circle_intersection(
+            *(batch.pack_lines(self.segments1) + batch.pack_circles(self.circles1)))
+        self.assertPointsMatch(points, counts,
+                [line_circle_intersection(l, c)
+                 for l, c in zip(self.segments1, self.circles1)])
+
+    def test_circle_linesegment_points_match_scalar(self):
+        points, counts = batch.circle_linesegment_intersection(
+            *(batch.pack_circles(self.circles1) + batch.pack_segments(self.segments1)))
+        self.assertPointsMatch(points, counts,
+                [circle_linesegment_intersection(c, s)
+                 for c, s in zip(self.circles1, self.segments1)])
+
+    def test_linesegment_linesegment_points_match_scalar(self):
+        points = batch.linesegment_linesegment_intersection(
+            *(batch.pack_segments(self.segments1) + batch.pack_segments(self.segments2)))
+        self.assertPointsMatch(points[:, None], [int(not numpy.isnan(p[0])) for p in points],
+                [linesegment_linesegment_intersection(s1, s2)
+                 for s1, s2 in zip(self.segments1, self.segments2)])
+
+    def test_broadcasting_gives_all_pairs(self):
+        centers1, radii1 = batch.pack_circles(self.circles1[:20])
+        centers2, radii2 = batch.pack_circles(self.circles2[:30])
+        mask = batch.circle_circle_intersect(centers1[:, None], radii1[:, None],
+                                             centers2, radii2)
+        self.assertEqual(mask.shape, (20, 30))
+        self.assertEqual(mask[4, 7],
+                circle_circle_intersect(self.circles1[4], self.circles2[7]))
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class BenchmarkSuiteTestCases(unittest.TestCase):
+    def test_suite_covers_shapes(self):
+        self.assertEqual(benchmarks.uncovered(), [])
+
+    def test_run_and_compare(self):
+        names = ['circle_circle_intersect', 'intersect', 'Polygon.edges']
+        old = benchmarks.run_suite(sizes=[5], names=names, repeat=1)
+        self.assertEqual([(r['name'], r['n']) for r in old['results']],
+                         [('Polygon.edges', 5), ('circle_circle_intersect', 5),
+                          ('intersect', 5)])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'old.json')
+        self.assertEqual(benchmarks.main(['run', '--sizes', '5', '--repeat', '1',
+                                          '--output', path] + names[:1]), 0)
+        with open(path) as f:
+            self.assertEqual(len(json.load(f)['results']), 1)
+
+        new = copy.deepcopy(old)
+        new['results'][0]['seconds'] *= 2
+        new['results'][1]['seconds'] /= 2
+        verdicts = [row[4] for row in benchmarks.compare_runs(old, new)]
+        self.assertEqual(verdicts, ['slower', 'faster', ''])
+        new_path = os.path.join(directory, 'new.json')
+        with open(new_path, 'w') as f:
+            json.dump(new, f)
+        self.assertEqual(benchmarks.main(['compare', path, new_path]), 0)
+        with open(path, 'w') as f:
+            json.dump(old, f)
+        self.assertEqual(benchmarks.main(['compare', path, new_path]), 1)
+
+    def test_load_test(self):
+        out = io.StringIO()
+        results = benchmarks.load_test(requests=200, clients=10, out=out)
+        self.assertEqual([name for name, _, latencies, _ in results],
+                         ['direct', 'service'])
+        self.assertTrue(all(len(latencies) == 200
+                            for _, _, latencies, _ in results))
+        self.assertIn('mean batch', out.getvalue())
+
+
 if __name__ == '__main__':
     unittest.main()